@@ -0,0 +1,226 @@
+import argparse
+import mmap
+import re
+import struct
+
+from profileparser import ProfileParser, paused_gc, finalize_consumer
+
+# Note: the first bytes of every binary profile file
+MAGIC = 'PROFBIN\x00'
+VERSION = 2
+
+# header: <magic> <version> <number of records> <offset of string table> <number of strings>
+_HEADER = struct.Struct('<8sIQQI')
+
+# every record has the same fixed width layout: <record type> <pad> <a> <b> <c>
+#   T: a = thread id,  b = label index
+#   F: a = thread id,  b = function id,  c = label index
+#   S: a = thread id,  b = function id,  c = time
+#   E: a = thread id,  b = function id,  c = time
+#   V: a = thread id,  b = event id,     c = label index
+#   Y: a = thread id,  b = event id,     c = time
+#   C: a = counter id, b = label index
+#   D: a = counter id, b = value,        c = time
+#  - b is 64 bits, so that counter values past 32 bits fit
+_RECORD_FORMAT = 'cxHqq'
+RECORD_SIZE = struct.calcsize('<' + _RECORD_FORMAT)
+
+_STRING_LENGTH = struct.Struct('<I')
+
+# Note: number of records packed / unpacked at a time
+RECORDS_PER_BLOCK = 64 * 1024
+
+# a run of records that can be passed to a consumer in one call
+_RUN_PATTERN = re.compile(r'[SE]+|Y+|D+|.', re.S)
+
+_block_structs = {}
+
+def _get_records_struct(num_records):
+	""" get the struct that packs / unpacks num_records consecutive records """
+	records_struct = _block_structs.get(num_records)
+	if not records_struct:
+		records_struct = struct.Struct('<' + (_RECORD_FORMAT * num_records))
+		if num_records == RECORDS_PER_BLOCK:
+			_block_structs[num_records] = records_struct
+	return records_struct
+
+def is_binary_profile(filename):
+	with open(filename, "rb") as file:
+		return file.read(len(MAGIC)) == MAGIC
+
+class ProfileBinaryWriter:
+	""" consumer for ProfileParser, that writes each record to a binary profile file
+	     - file can be any seekable binary file object """
+
+	def __init__(self, file):
+		self._file = file
+		self._start_offset = file.tell()
+		self._num_records = 0
+		self._strings = []
+
+		# placeholder, until finish() knows the number of records
+		self._file.write(_HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+	def finish(self):
+		""" write the string table, and the final header """
+		strings_offset = self._file.tell() - self._start_offset
+		for string in self._strings:
+			self._file.write(_STRING_LENGTH.pack(len(string)))
+			self._file.write(string)
+
+		end_offset = self._file.tell()
+		self._file.seek(self._start_offset)
+		self._file.write(_HEADER.pack(MAGIC, VERSION, self._num_records, strings_offset, len(self._strings)))
+		self._file.seek(end_offset)
+
+	def _add_string(self, string):
+		self._strings.append(string)
+		return len(self._strings) - 1
+
+	def _write_record(self, record_type, a, b, c):
+		self._file.write(struct.pack('<' + _RECORD_FORMAT, record_type, a, b, c))
+		self._num_records += 1
+
+	def _write_records(self, record_types, a, b, c):
+		num_records = len(record_types)
+		for first in xrange(0, num_records, RECORDS_PER_BLOCK):
+			last = min(num_records, first + RECORDS_PER_BLOCK)
+
+			values = [None] * (4 * (last-first))
+			values[0::4] = record_types[first:last]
+			values[1::4] = a[first:last]
+			values[2::4] = b[first:last]
+			values[3::4] = c[first:last]
+
+			self._file.write(_get_records_struct(last-first).pack(*values))
+
+		self._num_records += num_records
+
+	def on_thread(self, thread_id, thread_label):
+		self._write_record('T', thread_id, self._add_string(thread_label), 0)
+
+	def on_function(self, thread_id, function_id, function_label):
+		self._write_record('F', thread_id, function_id, self._add_string(function_label))
+
+	def on_sample_start(self, thread_id, function_id, start_time):
+		self._write_record('S', thread_id, function_id, start_time)
+
+	def on_sample_finish(self, thread_id, function_id, finish_time):
+		self._write_record('E', thread_id, function_id, finish_time)
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		self._write_records(record_types, thread_ids, function_ids, times)
+
+	def on_event(self, thread_id, event_id, event_label):
+		self._write_record('V', thread_id, event_id, self._add_string(event_label))
+
+	def on_event_emit(self, thread_id, event_id, time):
+		self._write_record('Y', thread_id, event_id, time)
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		self._write_records(['Y'] * len(thread_ids), thread_ids, event_ids, times)
+
+	def on_counter(self, counter_id, counter_label):
+		self._write_record('C', counter_id, self._add_string(counter_label), 0)
+
+	def on_counter_value(self, counter_id, time, counter_value):
+		self._write_record('D', counter_id, counter_value, time)
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		self._write_records(['D'] * len(counter_ids), counter_ids, counter_values, times)
+
+class ProfileBinaryLoader:
+	""" load a binary profile file into a consumer, with the same interface as ProfileParser """
+
+	def __init__(self, consumer):
+		self._consumer = consumer
+
+	def load_file(self, filename):
+		with open(filename, "rb") as file:
+			buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				with paused_gc():
+					self.load_buffer(buffer)
+					finalize_consumer(self._consumer)
+			finally:
+				buffer.close()
+
+	def load_buffer(self, buffer):
+		""" load the binary profile in buffer, which can be a string or a memory mapped file """
+		for run in self.load_runs(buffer):
+			pass
+
+	def load_runs(self, buffer):
+		""" a generator that loads the binary profile in buffer one run of records at a time, i.e. to merge it with other profiles
+		     - each step passes one run of records to the consumer, with a single consumer call """
+		(magic, version, num_records, strings_offset, num_strings) = _HEADER.unpack_from(buffer, 0)
+		if magic != MAGIC:
+			raise ValueError("not a binary profile file")
+		if version != VERSION:
+			raise ValueError("unsupported binary profile version %d" % version)
+
+		strings = self._load_strings(buffer, strings_offset, num_strings)
+
+		for first in xrange(0, num_records, RECORDS_PER_BLOCK):
+			num_block_records = min(RECORDS_PER_BLOCK, num_records - first)
+			start = _HEADER.size + (first * RECORD_SIZE)
+			end = start + (num_block_records * RECORD_SIZE)
+
+			# the record types are read straight out of the mapped file, as a string with one character per record
+			record_types = buffer[start:end:RECORD_SIZE]
+			values = _get_records_struct(num_block_records).unpack_from(buffer, start)
+
+			for match in _RUN_PATTERN.finditer(record_types):
+				self._load_run(record_types, values, match.start(), match.end(), strings)
+				yield
+
+	def _load_strings(self, buffer, offset, num_strings):
+		strings = []
+		for i in xrange(num_strings):
+			(length,) = _STRING_LENGTH.unpack_from(buffer, offset)
+			offset += _STRING_LENGTH.size
+			strings.append(buffer[offset:offset+length])
+			offset += length
+		return strings
+
+	def _load_run(self, record_types, values, first, last, strings):
+		""" pass the records [first:last] from a block to the consumer """
+		consumer = self._consumer
+		record_type = record_types[first]
+		a = values[(4*first)+1:4*last:4]
+		b = values[(4*first)+2:4*last:4]
+		c = values[(4*first)+3:4*last:4]
+
+		if record_type in 'SE':
+			consumer.on_samples_batch(record_types[first:last], a, b, c)
+		elif record_type == 'Y':
+			consumer.on_event_emits_batch(a, b, c)
+		elif record_type == 'D':
+			consumer.on_counter_values_batch(a, c, b)
+		elif record_type == 'T':
+			consumer.on_thread(a[0], strings[b[0]])
+		elif record_type == 'F':
+			consumer.on_function(a[0], b[0], strings[c[0]])
+		elif record_type == 'V':
+			consumer.on_event(a[0], b[0], strings[c[0]])
+		elif record_type == 'C':
+			consumer.on_counter(a[0], strings[b[0]])
+		else:
+			raise ValueError("unknown record type %r" % record_type)
+
+def convert_text_to_binary(text_filename, binary_filename):
+	with open(binary_filename, "wb") as binary_file:
+		writer = ProfileBinaryWriter(binary_file)
+		ProfileParser(writer).load_file(text_filename)
+		writer.finish()
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Convert a profile.txt file to the binary profile format")
+	parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file')
+	parser.add_argument('--output', '-o', default='profile.bin', help='file path to write the binary profile file to')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	args = parse_args()
+	convert_text_to_binary(args.filename, args.output)
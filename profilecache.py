@@ -0,0 +1,116 @@
+import cPickle
+import hashlib
+import os
+import tempfile
+
+from profileparser import paused_gc
+
+# Note: directory that built profile data is cached in, between runs of the visualiser
+CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.profile-visualiser', 'cache')
+
+# Note: the least recently used cache files are deleted when the cache directory grows past this size, in bytes
+MAX_CACHE_SIZE = 4 * 1024 * 1024 * 1024
+
+CACHE_SUFFIX = '.cache'
+
+# Note: change this whenever the classes in profiledata.py change, so that old cache files are ignored
+CACHE_VERSION = 10
+
+# Note: number of bytes hashed from the start and the end of a profile file
+#  - hashing the whole file would cost as much I/O as parsing it
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def hash_file_content(filename):
+	""" hash the first and last blocks of a file """
+
+	content_hash = hashlib.sha1()
+	with open(filename, "rb") as file:
+		content_hash.update(file.read(HASH_BLOCK_SIZE))
+
+		file.seek(0, os.SEEK_END)
+		file.seek(max(HASH_BLOCK_SIZE, file.tell() - HASH_BLOCK_SIZE))
+		content_hash.update(file.read())
+
+	return content_hash.hexdigest()
+
+class ProfileCache:
+	""" cache of ProfileData that has been built from profile files
+	     - each cache file is keyed on the path, size, modified time and content of a profile file,
+	       and on any options (e.g. merging threads) that changed how the ProfileData was built """
+
+	def __init__(self, directory = CACHE_DIRECTORY, max_size = MAX_CACHE_SIZE):
+		self._directory = directory
+		self._max_size = max_size
+
+	def get_directory(self):
+		return self._directory
+
+	def get_cache_filename(self, filename, options = ()):
+		file_stat = os.stat(filename)
+		key = repr((CACHE_VERSION, os.path.abspath(filename), file_stat.st_size, file_stat.st_mtime, hash_file_content(filename), options))
+		return os.path.join(self._directory, hashlib.sha1(key).hexdigest() + CACHE_SUFFIX)
+
+	def load(self, filename, options = ()):
+		""" load the cached ProfileData for a profile file, or return None if it is not in the cache """
+
+		cache_filename = self.get_cache_filename(filename, options)
+		if not os.path.exists(cache_filename):
+			return None
+
+		try:
+			with open(cache_filename, "rb") as cache_file:
+				with paused_gc():
+					profile_data = cPickle.load(cache_file)
+		except Exception:
+			# a damaged cache file is rebuilt from the profile file
+			os.remove(cache_filename)
+			return None
+
+		# mark the cache file as most recently used
+		os.utime(cache_filename, None)
+
+		return profile_data
+
+	def save(self, filename, profile_data, options = ()):
+		""" save the ProfileData that has been built for a profile file into the cache """
+
+		if not os.path.isdir(self._directory):
+			os.makedirs(self._directory)
+
+		cache_filename = self.get_cache_filename(filename, options)
+
+		# write to a temporary file first, so that another visualiser never loads a partly written cache file
+		(temp_fd, temp_filename) = tempfile.mkstemp(suffix='.tmp', dir=self._directory)
+		try:
+			with os.fdopen(temp_fd, "wb") as temp_file:
+				cPickle.dump(profile_data, temp_file, cPickle.HIGHEST_PROTOCOL)
+
+			if os.path.exists(cache_filename):
+				os.remove(cache_filename)
+			os.rename(temp_filename, cache_filename)
+		except:
+			if os.path.exists(temp_filename):
+				os.remove(temp_filename)
+			raise
+
+		self._evict()
+
+	def _evict(self):
+		""" delete the least recently used cache files, until the cache directory fits in max_size """
+
+		cache_files = []
+		for name in os.listdir(self._directory):
+			if name.endswith(CACHE_SUFFIX):
+				path = os.path.join(self._directory, name)
+				file_stat = os.stat(path)
+				cache_files.append((file_stat.st_mtime, file_stat.st_size, path))
+
+		cache_files.sort()
+		total_size = sum(size for (mtime, size, path) in cache_files)
+
+		# the most recently used cache file is always kept
+		for (mtime, size, path) in cache_files[:-1]:
+			if total_size <= self._max_size:
+				break
+			os.remove(path)
+			total_size -= size
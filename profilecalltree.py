@@ -0,0 +1,226 @@
+import argparse
+from array import array
+from itertools import izip
+
+class CallTree:
+	""" the call paths of a profile, where samples with the same call path are merged into one node
+	     - node 0 is the root, which has no label, and has the total time of the samples that it contains
+	     - a node's parent always has a lower index than the node
+	     - nodes are found by hashing (parent node, label), so building a tree is linear in the number of samples """
+
+	def __init__(self):
+		self._labels = [None]
+		self._parents = array('i', [-1])
+		self._call_counts = [0]
+		self._inclusive_times = [0]
+		self._exclusive_times = [0]
+		self._nodes = {}
+		self._child_nodes = None
+
+	def get_num_nodes(self):
+		return len(self._labels)
+
+	def get_node_label(self, node):
+		return self._labels[node]
+
+	def get_node_parent(self, node):
+		""" return the parent of a node, or None for the root """
+		parent = self._parents[node]
+		if parent < 0:
+			return None
+		return parent
+
+	def get_node_call_count(self, node):
+		""" return the number of finished samples that were merged into a node """
+		return self._call_counts[node]
+
+	def get_node_inclusive_time(self, node):
+		return self._inclusive_times[node]
+
+	def get_node_exclusive_time(self, node):
+		""" return the time spent in a node, excluding the time spent in its children """
+		return self._exclusive_times[node]
+
+	def get_node_child(self, node, label):
+		""" return the child of a node with a label, or None """
+		return self._nodes.get((node, label))
+
+	def get_node_children(self, node):
+		""" return the children of a node, sorted by label """
+		if self._child_nodes == None:
+			child_nodes = [[] for label in self._labels]
+			for child, parent in enumerate(self._parents):
+				if parent >= 0:
+					child_nodes[parent].append(child)
+
+			labels = self._labels
+			for children in child_nodes:
+				children.sort(key=lambda child: labels[child])
+			self._child_nodes = child_nodes
+
+		return self._child_nodes[node]
+
+	def get_node_path(self, node):
+		""" return the labels of the nodes from the root's child down to a node """
+		path = []
+		while node > 0:
+			path.append(self._labels[node])
+			node = self._parents[node]
+		path.reverse()
+		return path
+
+	def add_node(self, parent, label):
+		""" return the child of a node with a label, adding it if it doesn't exist yet """
+		key = (parent, label)
+		node = self._nodes.get(key)
+		if node == None:
+			node = len(self._labels)
+			self._labels.append(label)
+			self._parents.append(parent)
+			self._call_counts.append(0)
+			self._inclusive_times.append(0)
+			self._exclusive_times.append(0)
+			self._nodes[key] = node
+			self._child_nodes = None
+		return node
+
+	def add_thread(self, thread_data, parent = 0):
+		""" merge the finished samples on a thread into the children of a node """
+		self.merge(thread_data.get_call_tree(), parent)
+
+	def merge(self, other, parent = 0):
+		""" merge the nodes of another CallTree into the children of a node """
+
+		other_labels = other._labels
+		other_call_counts = other._call_counts
+		other_inclusive_times = other._inclusive_times
+		other_exclusive_times = other._exclusive_times
+
+		call_counts = self._call_counts
+		inclusive_times = self._inclusive_times
+		exclusive_times = self._exclusive_times
+
+		node_map = array('i', [parent]) * len(other_labels)
+		for other_node in xrange(1, len(other_labels)):
+			node = self.add_node(node_map[other._parents[other_node]], other_labels[other_node])
+			node_map[other_node] = node
+			call_counts[node] += other_call_counts[other_node]
+			inclusive_times[node] += other_inclusive_times[other_node]
+			exclusive_times[node] += other_exclusive_times[other_node]
+
+		# the node and its ancestors now contain the time in the other tree
+		ancestor = parent
+		while ancestor >= 0:
+			inclusive_times[ancestor] += other_inclusive_times[0]
+			ancestor = self._parents[ancestor]
+
+	def write_folded_stacks(self, file):
+		""" write the tree in the folded stack format used by flame graph tools
+		     - one line per call path with exclusive time, i.e. 'main;update;draw 1200'
+		     - ';' is the separator between frames, so any ';' in a label is written as ':' """
+
+		labels = self._labels
+		parents = self._parents
+		paths = [None] * len(labels)
+		for node in xrange(1, len(labels)):
+			label = labels[node].replace(';', ':')
+			parent = parents[node]
+			paths[node] = (paths[parent] + ';' + label) if parent > 0 else label
+
+			exclusive_time = self._exclusive_times[node]
+			if exclusive_time > 0:
+				file.write("%s %d\n" % (paths[node], exclusive_time))
+
+class ProfileThreadCallTree(CallTree):
+	""" the call tree of the finished samples on a thread
+	     - each sample's node is found by hashing (node of its caller, function), in sample start order,
+	       so the samples' trees are merged without recursion """
+
+	def __init__(self, thread_data):
+		CallTree.__init__(self)
+
+		start_times = thread_data.get_sample_start_times()
+		finish_times = thread_data.get_sample_finish_times()
+		function_indices = thread_data.get_sample_function_indices()
+		parent_indices = thread_data.get_sample_parent_indices()
+		ends = thread_data.get_sample_ends()
+
+		# the nodes are keyed on function index while they're built, because labels might not be unique
+		function_labels = [thread_data.get_function(function_index).get_label() for function_index in xrange(thread_data.get_num_functions())]
+		nodes = {}
+		labels = self._labels
+		parents = self._parents
+		call_counts = self._call_counts
+		inclusive_times = self._inclusive_times
+		exclusive_times = self._exclusive_times
+
+		sample_nodes = array('i', [0]) * len(ends)
+		for index, function_index, parent_index, start_time, finish_time, end in izip(xrange(len(ends)), function_indices, parent_indices, start_times, finish_times, ends):
+			parent = sample_nodes[parent_index] if (parent_index >= 0) else 0
+
+			key = (parent, function_index)
+			node = nodes.get(key)
+			if node == None:
+				node = len(labels)
+				labels.append(function_labels[function_index])
+				parents.append(parent)
+				call_counts.append(0)
+				inclusive_times.append(0)
+				exclusive_times.append(0)
+				nodes[key] = node
+			sample_nodes[index] = node
+
+			if end:
+				duration = finish_time - start_time
+				call_counts[node] += 1
+				inclusive_times[node] += duration
+				exclusive_times[node] += duration
+				if parent_index < 0:
+					inclusive_times[0] += duration
+				elif ends[parent_index]:
+					exclusive_times[parent] -= duration
+
+		# nodes with the same label under the same parent (i.e. from merged threads) stay separate,
+		#  until the tree is merged into another CallTree
+		self._nodes = dict(((parent, labels[node]), node) for ((parent, function_index), node) in nodes.iteritems())
+
+def build_call_tree(profile_data, merge_threads = False):
+	""" merge the call trees of every thread in a profile
+	     - each thread's label is the first frame of its call paths, unless merge_threads is True,
+	       in which case the samples on every thread are merged together """
+
+	call_tree = CallTree()
+	for thread_index in xrange(profile_data.get_num_threads()):
+		thread_data = profile_data.get_thread(thread_index)
+		parent = 0 if merge_threads else call_tree.add_node(0, thread_data.get_label())
+		call_tree.add_thread(thread_data, parent)
+	return call_tree
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Export the merged call paths in a profile, in the folded stack format used by flame graph tools")
+	parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file, or a binary profile file')
+	parser.add_argument('--output', '-o', default='profile.folded', help='file path to write the folded stacks to')
+	parser.add_argument('--merge-threads', action='store_true', help="merge the samples on every thread, instead of starting each call path with the thread's label")
+	parser.add_argument('--range', '-r', type=int, nargs=2, metavar=('START_TIME', 'FINISH_TIME'), help='only include the samples, events and counter values between two clock times')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	# Note: imported here, because profiledata imports this module
+	from profiledata import ProfileData
+	from profileparser import ProfileParser
+	from profilebinary import ProfileBinaryLoader, is_binary_profile
+
+	args = parse_args()
+
+	profile_data = ProfileData()
+	if is_binary_profile(args.filename):
+		ProfileBinaryLoader(profile_data).load_file(args.filename)
+	else:
+		ProfileParser(profile_data).load_file(args.filename)
+
+	if args.range:
+		profile_data = profile_data.slice(*args.range)
+
+	with open(args.output, "w") as file:
+		build_call_tree(profile_data, args.merge_threads).write_folded_stacks(file)
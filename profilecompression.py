@@ -0,0 +1,118 @@
+import bz2
+import threading
+import zlib
+import Queue
+
+try:
+	import lzma
+except ImportError:
+	# Note: python 2 needs the backports.lzma package to read xz compressed profiles
+	try:
+		from backports import lzma
+	except ImportError:
+		lzma = None
+
+# Note: number of compressed bytes read from a file at a time
+COMPRESSED_BLOCK_SIZE = 256 * 1024
+
+# Note: maximum number of decompressed blocks waiting to be parsed
+#  - this bounds the memory used when decompression is faster than parsing
+DECOMPRESSED_QUEUE_SIZE = 8
+
+# the first bytes of each supported compressed file format
+_COMPRESSION_MAGIC = [
+	('\x1f\x8b', 'gzip'),
+	('BZh', 'bz2'),
+	('\xfd7zXZ\x00', 'xz')
+]
+
+def get_compression(filename):
+	""" return the compression format of a file ('gzip', 'bz2' or 'xz'), or None if it is not compressed """
+
+	with open(filename, "rb") as file:
+		header = file.read(max(len(magic) for (magic, compression) in _COMPRESSION_MAGIC))
+
+	for (magic, compression) in _COMPRESSION_MAGIC:
+		if header.startswith(magic):
+			return compression
+	return None
+
+def _create_decompressor(compression):
+	if compression == 'gzip':
+		return zlib.decompressobj(16 + zlib.MAX_WBITS)
+	elif compression == 'bz2':
+		return bz2.BZ2Decompressor()
+	elif lzma:
+		return lzma.LZMADecompressor()
+	else:
+		raise IOError("reading xz compressed profiles needs the lzma module (pip install backports.lzma)")
+
+def _decompress_blocks(file, compression):
+	""" generate the decompressed blocks of a compressed file """
+
+	decompressor = _create_decompressor(compression)
+	while True:
+		data = file.read(COMPRESSED_BLOCK_SIZE)
+		if not data:
+			break
+
+		while data:
+			block = decompressor.decompress(data)
+			if block:
+				yield block
+
+			data = decompressor.unused_data
+			if data:
+				# the start of another stream, in a file made by concatenating compressed files
+				decompressor = _create_decompressor(compression)
+
+def _decompress_file(filename, compression, blocks, stop_event):
+	""" put the decompressed blocks of a file into a queue, followed by None
+	     - runs on a background thread, while the blocks are parsed on the calling thread """
+	try:
+		with open(filename, "rb") as file:
+			for block in _decompress_blocks(file, compression):
+				blocks.put((block, None))
+				if stop_event.is_set():
+					return
+		blocks.put((None, None))
+	except Exception as e:
+		blocks.put((None, e))
+
+def read_blocks(filename, block_size):
+	""" generate the blocks of a profile file, decompressing it on a background thread if it is compressed
+	     - compressed files yield blocks of whatever size the decompressor produces """
+
+	compression = get_compression(filename)
+	if not compression:
+		with open(filename, "rb") as file:
+			while True:
+				block = file.read(block_size)
+				if not block:
+					break
+				yield block
+		return
+
+	blocks = Queue.Queue(DECOMPRESSED_QUEUE_SIZE)
+	stop_event = threading.Event()
+	thread = threading.Thread(target=_decompress_file, args=(filename, compression, blocks, stop_event), name="ProfileDecompressor")
+	thread.daemon = True
+	thread.start()
+
+	try:
+		while True:
+			(block, error) = blocks.get()
+			if error:
+				raise error
+			if block is None:
+				break
+			yield block
+	finally:
+		# if the caller stopped early, unblock the background thread so that it can see the stop event
+		stop_event.set()
+		while thread.is_alive():
+			try:
+				blocks.get(timeout=0.01)
+			except Queue.Empty:
+				pass
+		thread.join()
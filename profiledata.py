@@ -1,9 +1,71 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import izip
 
+from profilelod import ProfileLevelOfDetail, CounterLevelOfDetail
+from profilestats import ProfileThreadStats
+from profilecalltree import ProfileThreadCallTree
+from profileframes import ProfileFrames
+from profilesearch import ProfileFunctionCallIndex
+from profilesketch import DurationSketch
+
+# Note: array typecode for sample times - python 2's array has no 64 bit integer typecode,
+#       so times are stored as doubles where a long is only 32 bits (i.e. Windows)
+TIME_TYPECODE = 'l' if (array('l').itemsize >= 8) else 'd'
+
+# Note: array typecode for counter values - the same as TIME_TYPECODE, so that values past 32 bits (i.e. bytes of memory) fit
+VALUE_TYPECODE = TIME_TYPECODE
+
+# the arrays that store the samples in a ThreadData
+_SAMPLE_ARRAY_TYPECODES = {
+	'_sample_start_times': TIME_TYPECODE,
+	'_sample_finish_times': TIME_TYPECODE,
+	'_sample_functions': 'i',
+	'_sample_depths': 'H',
+	'_sample_child_depths': 'H',
+	'_sample_parents': 'i',
+	'_sample_ends': 'i',
+	'_root_samples': 'i',
+	'_event_sample_times': TIME_TYPECODE,
+	'_event_sample_events': 'i'
+}
+_SAMPLE_ARRAY_NAMES = sorted(_SAMPLE_ARRAY_TYPECODES.keys())
+
+# Note: number of items that are read at a time from arrays that can be kept in a MappedArrayStore,
+#       so that a mapped array is never copied into memory all at once
+ARRAY_READ_CHUNK_ITEMS = 64 * 1024
+
+def _merge_by_label(items, other_items):
+	""" append the items in other_items whose labels aren't in items yet, and return the index in items of each of other_items """
+	indices = {}
+	for index, item in enumerate(items):
+		indices.setdefault(item.get_label(), index)
+
+	item_map = array('i')
+	for item in other_items:
+		index = indices.get(item.get_label())
+		if index == None:
+			index = len(items)
+			items.append(item)
+			indices[item.get_label()] = index
+		item_map.append(index)
+	return item_map
+
+def _read_chunks(items, start = 0):
+	""" return a generator of the items of an array from start onwards, in arrays of at most ARRAY_READ_CHUNK_ITEMS items """
+	return (items[first:first + ARRAY_READ_CHUNK_ITEMS] for first in xrange(start, len(items), ARRAY_READ_CHUNK_ITEMS))
+
+def _is_after(times, other_times):
+	""" return True if the sorted times in other_times are all after the sorted times in times """
+	return (not times) or (not other_times) or (other_times[0] >= times[-1])
 
 class FunctionData:
 	def __init__(self, id, label):
 		self._id = id
 		self._label = label
+		# the durations of the function's finished samples, which is updated as they are loaded
+		self._duration_sketch = DurationSketch()
 
 	def get_id(self):
 		return self._id
@@ -11,59 +73,95 @@ class FunctionData:
 	def get_label(self):
 		return self._label
 
+	def get_duration_sketch(self):
+		""" return the DurationSketch of the durations of this function's finished samples on its thread """
+		return self._duration_sketch
+
 class SampleData:
-	def __init__(self, function, start_time, call_stack_depth):
-		self._function = function
-		self._start_time = start_time
-		self._finish_time = None
-		self._duration = 0
-		self._children = []
-		self._parent = None
-		self._call_stack_depth = call_stack_depth
-		self._child_call_stack_depth = 0
+	""" view of one sample, that is stored in the sample arrays of a ThreadData
+	     - views are created on demand, so a ThreadData never holds an object per sample """
+
+	def __init__(self, thread_data, index):
+		self._thread_data = thread_data
+		self._index = index
+
+	def __eq__(self, other):
+		return isinstance(other, SampleData) and (self._thread_data is other._thread_data) and (self._index == other._index)
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __hash__(self):
+		return hash((id(self._thread_data), self._index))
+
+	def get_thread(self):
+		return self._thread_data
+
+	def get_index(self):
+		return self._index
 
 	def get_children(self):
-		return self._children
+		return SampleList(self._thread_data, self._thread_data.get_sample_child_indices(self._index))
 
 	def get_num_children(self):
-		return len(self._children)
-
-	def set_finish_time(self, finish_time):
-		self._finish_time = finish_time
-		self._duration = self._finish_time - self._start_time
-
-	def set_parent(self, parent):
-		self._parent = parent
-		self._parent._on_child_call_stack_depth(self._call_stack_depth)
-		
-	def _on_child_call_stack_depth(self, call_stack_depth):
-		child_call_stack_depth = call_stack_depth - self._call_stack_depth
-		
-		if self._child_call_stack_depth < child_call_stack_depth:
-			self._child_call_stack_depth = child_call_stack_depth
-			if self._parent:
-				self._parent._on_child_call_stack_depth( call_stack_depth )		
+		return len(self._thread_data.get_sample_child_indices(self._index))
 
 	def get_parent(self):
-		return self._parent
+		parent_index = self._thread_data.get_sample_parent_index(self._index)
+		if parent_index == None:
+			return None
+		return SampleData(self._thread_data, parent_index)
 
 	def get_start_time(self):
-		return self._start_time
+		return self._thread_data.get_sample_start_time(self._index)
 
 	def get_finish_time(self):
-		return self._finish_time
+		return self._thread_data.get_sample_finish_time(self._index)
 	
 	def get_duration(self):
-		return self._duration
+		return self._thread_data.get_sample_duration(self._index)
 
 	def get_function(self):
-		return self._function
+		return self._thread_data.get_sample_function(self._index)
 	
 	def get_call_stack_depth(self):
-		return self._call_stack_depth
+		return self._thread_data.get_sample_call_stack_depth(self._index)
 	
 	def get_child_call_stack_depth(self):
-		return self._child_call_stack_depth
+		return self._thread_data.get_sample_child_call_stack_depth(self._index)
+
+class _SampleTimes:
+	""" sequence of the times of the samples at a list of indices, for binary searches with bisect """
+
+	def __init__(self, times, indices):
+		self._times = times
+		self._indices = indices
+
+	def __len__(self):
+		return len(self._indices)
+
+	def __getitem__(self, index):
+		return self._times[self._indices[index]]
+
+class SampleList:
+	""" sequence of SampleData views, for a list of sample indices in a ThreadData """
+
+	def __init__(self, thread_data, indices):
+		self._thread_data = thread_data
+		self._indices = indices
+
+	def __len__(self):
+		return len(self._indices)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [SampleData(self._thread_data, sample_index) for sample_index in self._indices[index]]
+		return SampleData(self._thread_data, self._indices[index])
+
+	def __iter__(self):
+		thread_data = self._thread_data
+		for sample_index in self._indices:
+			yield SampleData(thread_data, sample_index)
 
 class EventData:
 	def __init__(self, id, label):
@@ -87,19 +185,72 @@ class EventSampleData:
 	def get_time(self):
 		return self._time
 
+class EventSampleList:
+	""" sequence of EventSampleData, that are created on demand from the event sample arrays of a ThreadData """
+
+	def __init__(self, thread_data):
+		self._thread_data = thread_data
+
+	def __len__(self):
+		return self._thread_data.get_num_event_samples()
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self._thread_data.get_event_sample(event_sample_index) for event_sample_index in xrange(*index.indices(len(self)))]
+		if index < 0:
+			index += len(self)
+		return self._thread_data.get_event_sample(index)
+
+	def __iter__(self):
+		for index in xrange(len(self)):
+			yield self._thread_data.get_event_sample(index)
+
 class ThreadData:
-	def __init__(self, id, label):
+	""" the functions, samples and events on one thread
+	     - samples are stored in parallel arrays, with one entry per sample in the order that they started,
+	       so that each sample is followed by all of its descendants
+	     - the descendants of sample i are the samples in [i+1, end of sample i)
+	     - samples are only appended while they are loaded, and the metrics that depend on later samples
+	       (i.e. child call stack depths, and the finish time) are computed by finalize()
+	     - the arrays are created by new_array(typecode), which is array, or MappedArrayStore.new_array to keep them on disk """
+
+	def __init__(self, id, label, new_array = array):
 		self._id = id
 		self._label = label
 		self._functions = []
-		self._samples = []		
-		self._active_sample = None
-		self._active_stack_depth = 0
+		self._new_array = new_array
+
+		self._sample_start_times = new_array(TIME_TYPECODE)
+		self._sample_finish_times = new_array(TIME_TYPECODE)
+		self._sample_functions = new_array('i')
+		self._sample_depths = new_array('H')
+		self._sample_child_depths = new_array('H')
+		# Note: -1 for samples on the bottom of the call stack
+		self._sample_parents = new_array('i')
+		# Note: 0 for samples that have not finished yet
+		self._sample_ends = new_array('i')
+		self._root_samples = new_array('i')
+		# the indices of the samples at each call stack depth, which are in time order because they can't overlap
+		self._depth_samples = []
+
+		# summaries of the samples (e.g. ProfileLevelOfDetail), that are built when they are first needed
+		#  and rebuilt after more samples are added
+		self._summaries = {}
+
+		# indices of the samples that have started, but not finished yet
+		self._active_samples = []
+		# the number of samples, and the samples that hadn't finished, when finalize() was last called
+		self._num_finalized_samples = 0
+		self._finalized_active_samples = []
 		self._max_stack_depth = 0
 		self._start_time = None
 		self._finish_time = None
 		self._events = []
-		self._event_samples = []
+		# the emits of every event on this thread, in time order
+		self._event_sample_times = new_array(TIME_TYPECODE)
+		self._event_sample_events = new_array('i')
+		# the times of the emits of each event, in time order
+		self._event_emit_times = []
 
 	def get_id(self):
 		return self._id
@@ -116,37 +267,314 @@ class ThreadData:
 	def get_function(self, index):
 		return self._functions[index]
 
+	def get_function_duration_sketch(self, index):
+		""" return the DurationSketch of the durations of a function's finished samples """
+		return self._functions[index].get_duration_sketch()
+
 	def get_samples(self):
-		return self._samples
+		""" return the samples on the bottom of the call stack """
+		return SampleList(self, self._root_samples)
+
+	def get_root_sample_indices(self):
+		return self._root_samples
+
+	def get_num_samples(self):
+		return len(self._sample_start_times)
+
+	def get_sample(self, index):
+		return SampleData(self, index)
+
+	def get_sample_start_time(self, index):
+		return self._sample_start_times[index]
+
+	def get_sample_finish_time(self, index):
+		""" return the finish time of a sample, or None if it has not finished yet """
+		if not self._sample_ends[index]:
+			return None
+		return self._sample_finish_times[index]
+
+	def get_sample_duration(self, index):
+		if not self._sample_ends[index]:
+			return 0
+		return self._sample_finish_times[index] - self._sample_start_times[index]
+
+	def get_sample_function(self, index):
+		return self._functions[self._sample_functions[index]]
+
+	def get_sample_call_stack_depth(self, index):
+		return self._sample_depths[index]
+
+	def get_sample_child_call_stack_depth(self, index):
+		return self._sample_child_depths[index]
+
+	def get_sample_parent_index(self, index):
+		""" return the index of the sample that called a sample, or None """
+		parent_index = self._sample_parents[index]
+		if parent_index < 0:
+			return None
+		return parent_index
+
+	def get_sample_end_index(self, index):
+		""" return the index after the last descendant of a sample """
+		return self._sample_ends[index] or len(self._sample_ends)
+
+	def get_sample_child_indices(self, index):
+		ends = self._sample_ends
+		num_samples = len(ends)
+		end = ends[index] or num_samples
+
+		child_indices = []
+		child_index = index + 1
+		while child_index < end:
+			child_indices.append(child_index)
+			child_index = ends[child_index] or num_samples
+		return child_indices
+
+	def get_sample_start_times(self):
+		""" return the array of sample start times, in sample index order - this must not be modified """
+		return self._sample_start_times
+
+	def get_sample_finish_times(self):
+		""" return the array of sample finish times, which is only valid for samples that have finished """
+		return self._sample_finish_times
+
+	def get_sample_function_indices(self):
+		return self._sample_functions
+
+	def get_sample_ends(self):
+		""" return the array of sample end indices, which are 0 for samples that have not finished yet """
+		return self._sample_ends
+
+	def get_sample_call_stack_depths(self):
+		return self._sample_depths
+
+	def get_sample_parent_indices(self):
+		""" return the array of sample parent indices, which are -1 for samples on the bottom of the call stack """
+		return self._sample_parents
+
+	def _get_summary(self, summary_class, *args):
+		""" return summary_class(self, *args), which is cached until the samples or events on this thread change """
+
+		key = (len(self._sample_ends), len(self._active_samples), self._finish_time, len(self._event_sample_times))
+		(summary_key, summary) = self._summaries.get((summary_class,) + args, (None, None))
+		if summary_key != key:
+			summary = summary_class(self, *args)
+			self._summaries[(summary_class,) + args] = (key, summary)
+		return summary
+
+	def get_level_of_detail(self):
+		""" return the ProfileLevelOfDetail for the finished samples on this thread, or None if there aren't any """
+
+		if self._finish_time == None:
+			return None
+		return self._get_summary(ProfileLevelOfDetail)
+
+	def get_function_stats(self):
+		""" return the ProfileThreadStats for the finished samples on this thread """
+		return self._get_summary(ProfileThreadStats)
+
+	def get_call_tree(self):
+		""" return the ProfileThreadCallTree for the finished samples on this thread """
+		return self._get_summary(ProfileThreadCallTree)
+
+	def get_function_call_index(self):
+		""" return the ProfileFunctionCallIndex of the finished samples of each function on this thread """
+		return self._get_summary(ProfileFunctionCallIndex)
+
+	def get_depth_sample_indices(self, depth):
+		""" return the indices of the samples at a call stack depth, in time order """
+		return self._depth_samples[depth]
+
+	def get_sample_indices_in_range(self, depth, start_time, finish_time, parent_index = None):
+		""" return the indices of the samples at a call stack depth that overlap [start_time, finish_time]
+		     - with parent_index, only the descendants of that sample are returned
+		     - the samples are found with binary searches, so the cost only depends on the number of samples returned """
+
+		if depth >= len(self._depth_samples):
+			return []
+
+		depth_samples = self._depth_samples[depth]
+		first = 0
+		last = len(depth_samples)
+
+		if parent_index != None:
+			# the descendants of a sample are the samples between it and its end index
+			first = bisect_left(depth_samples, parent_index + 1)
+			last = bisect_left(depth_samples, self.get_sample_end_index(parent_index), first)
+
+		first = bisect_left(_SampleTimes(self._sample_finish_times, depth_samples), start_time, first, last)
+		last = bisect_right(_SampleTimes(self._sample_start_times, depth_samples), finish_time, first, last)
+		return depth_samples[first:last]
 
 	def on_sample_start(self, function_id, start_time):
-		function = self._functions[function_id]		
-		sample_data = SampleData(function, start_time, self._active_stack_depth)
-		if self._active_sample:
-			sample_data.set_parent(self._active_sample)
-			self._active_sample.get_children().append(sample_data)
-		else:
-			self._samples.append(sample_data)
+		# raises an IndexError for a function that hasn't been registered
+		self._functions[function_id]
 
-		self._active_sample = sample_data
-		self._active_stack_depth += 1
-		self._max_stack_depth = max(self._max_stack_depth, self._active_stack_depth)
+		index = len(self._sample_start_times)
+		active_samples = self._active_samples
+		depth = len(active_samples)
 
-		if self._start_time == None:
-			self._start_time = start_time
+		self._sample_start_times.append(start_time)
+		self._sample_finish_times.append(start_time)
+		self._sample_functions.append(function_id)
+		self._sample_depths.append(depth)
+		self._sample_child_depths.append(0)
+		self._sample_ends.append(0)
+
+		if active_samples:
+			self._sample_parents.append(active_samples[-1])
+		else:
+			self._sample_parents.append(-1)
+			self._root_samples.append(index)
+
+		active_samples.append(index)
+		if depth == len(self._depth_samples):
+			self._depth_samples.append(self._new_array('i'))
+		self._depth_samples[depth].append(index)
 
 	def on_sample_finish(self, function_id, finish_time):
 		# @todo - check that active sample has matching function_id
-		self._active_sample.set_finish_time(finish_time)
+		index = self._active_samples.pop()
+		self._sample_finish_times[index] = finish_time
+		self._sample_ends[index] = len(self._sample_ends)
+		self._functions[self._sample_functions[index]].get_duration_sketch().add(finish_time - self._sample_start_times[index])
+
+	def on_samples_batch(self, record_types, function_ids, times):
+		""" consume a run of 'S' and 'E' records on this thread
+		     - same as calling on_sample_start() / on_sample_finish() for each record, without the per-record method calls """
+
+		num_functions = len(self._functions)
+		active_samples = self._active_samples
+		start_times = self._sample_start_times
+		finish_times = self._sample_finish_times
+		functions = self._sample_functions
+		depths = self._sample_depths
+		child_depths = self._sample_child_depths
+		parents = self._sample_parents
+		ends = self._sample_ends
+		root_samples = self._root_samples
+		depth_samples = self._depth_samples
+		# the durations of the samples that finish in this batch, for each function
+		function_durations = [[] for function_data in self._functions]
 
-		self._active_sample = self._active_sample.get_parent()
-		self._active_stack_depth -= 1
+		for record_type, function_id, time in izip(record_types, function_ids, times):
+			if record_type == 'S':
+				if not (0 <= function_id < num_functions):
+					# raise the same error as on_sample_start()
+					self._functions[function_id]
+
+				index = len(start_times)
+				depth = len(active_samples)
+
+				start_times.append(time)
+				finish_times.append(time)
+				functions.append(function_id)
+				depths.append(depth)
+				child_depths.append(0)
+				ends.append(0)
+
+				if depth:
+					parents.append(active_samples[-1])
+				else:
+					parents.append(-1)
+					root_samples.append(index)
+
+				active_samples.append(index)
+				if depth == len(depth_samples):
+					depth_samples.append(self._new_array('i'))
+				depth_samples[depth].append(index)
+			else:
+				index = active_samples.pop()
+				finish_times[index] = time
+				ends[index] = len(ends)
+				function_durations[functions[index]].append(time - start_times[index])
+
+		for function_data, durations in izip(self._functions, function_durations):
+			if durations:
+				function_data.get_duration_sketch().add_durations(durations)
+
+	def finalize(self):
+		""" compute the child call stack depths, max stack depth and start / finish times, for the samples added since the last call
+		     - a sample's callers always have lower indices than it, so each child call stack depth is known
+		       before it is passed on to the sample's caller, in one pass from the last sample to the first """
+
+		first = self._num_finalized_samples
+		num_samples = len(self._sample_start_times)
+		finish_times = self._sample_finish_times
+		child_depths = self._sample_child_depths
+		parents = self._sample_parents
+		ends = self._sample_ends
+
+		finish_time = self._finish_time
+		for index in xrange(num_samples - 1, first - 1, -1):
+			if ends[index] and (finish_time < finish_times[index]):
+				finish_time = finish_times[index]
+
+			parent = parents[index]
+			child_depth = child_depths[index] + 1
+			if parent >= first:
+				if child_depths[parent] < child_depth:
+					child_depths[parent] = child_depth
+			else:
+				# the callers that were finalized before are only updated while they get deeper
+				while (parent >= 0) and (child_depths[parent] < child_depth):
+					child_depths[parent] = child_depth
+					parent = parents[parent]
+					child_depth += 1
+
+		# samples that were still running the last time might have finished since
+		for index in self._finalized_active_samples:
+			if ends[index] and (finish_time < finish_times[index]):
+				finish_time = finish_times[index]
 
 		self._finish_time = finish_time
+		self._max_stack_depth = len(self._depth_samples)
+		if num_samples:
+			self._start_time = self._sample_start_times[0]
+
+		self._num_finalized_samples = num_samples
+		self._finalized_active_samples = list(self._active_samples)
 
 	def get_max_stack_depth(self):
 		return self._max_stack_depth
 
+	def __getstate__(self):
+		""" pickle the sample arrays as strings, which load much faster than pickled lists """
+		state = self.__dict__.copy()
+		for name in _SAMPLE_ARRAY_NAMES:
+			state[name] = state[name].tostring()
+		state['_depth_samples'] = [depth_samples.tostring() for depth_samples in self._depth_samples]
+		state['_event_emit_times'] = [emit_times.tostring() for emit_times in self._event_emit_times]
+		state['_summaries'] = {}
+		# Note: the arrays are always loaded into memory
+		state['_new_array'] = array
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		for name in _SAMPLE_ARRAY_NAMES:
+			sample_array = array(_SAMPLE_ARRAY_TYPECODES[name])
+			sample_array.fromstring(state[name])
+			setattr(self, name, sample_array)
+
+		self._depth_samples = []
+		for depth_samples_string in state['_depth_samples']:
+			depth_samples = array('i')
+			depth_samples.fromstring(depth_samples_string)
+			self._depth_samples.append(depth_samples)
+
+		self._event_emit_times = []
+		for emit_times_string in state['_event_emit_times']:
+			emit_times = array(TIME_TYPECODE)
+			emit_times.fromstring(emit_times_string)
+			self._event_emit_times.append(emit_times)
+
+	def get_open_sample_start_time(self):
+		""" return the start time of the outermost sample that has not finished yet, or None """
+		if not self._active_samples:
+			return None
+		return self._sample_start_times[self._active_samples[0]]
+
 	def get_start_time(self):
 		return self._start_time
 
@@ -154,13 +582,82 @@ class ThreadData:
 		return self._finish_time
 
 	def merge(self, other):
+		""" append the samples and events of another thread, that starts after this thread finishes
+		     - functions and events with the same label share one entry, so the tables don't grow with each merged thread """
+
 		self._max_stack_depth = max(self._max_stack_depth, other._max_stack_depth)
 		self._start_time = min(self._start_time, other._start_time)
 		self._finish_time = max(self._finish_time, other._finish_time)
-		num_functions = len(self._functions)
-		self._functions.extend(other._functions)
-		self._samples.extend(other._samples)
-	
+		function_map = _merge_by_label(self._functions, other._functions)
+		for other_function_data, function_index in izip(other._functions, function_map):
+			function_data = self._functions[function_index]
+			if function_data is not other_function_data:
+				function_data.get_duration_sketch().merge(other_function_data.get_duration_sketch())
+
+		# append the other thread's samples, with their indices offset to follow this thread's samples
+		#  - the arrays are copied a chunk at a time, so that mapped arrays aren't read into memory all at once
+		num_samples = len(self._sample_start_times)
+		for start_times in _read_chunks(other._sample_start_times):
+			self._sample_start_times.extend(start_times)
+		for finish_times in _read_chunks(other._sample_finish_times):
+			self._sample_finish_times.extend(finish_times)
+		for function_indices in _read_chunks(other._sample_functions):
+			self._sample_functions.extend(array('i', [function_map[function_index] for function_index in function_indices]))
+		for depths in _read_chunks(other._sample_depths):
+			self._sample_depths.extend(depths)
+		for child_depths in _read_chunks(other._sample_child_depths):
+			self._sample_child_depths.extend(child_depths)
+		for parents in _read_chunks(other._sample_parents):
+			self._sample_parents.extend(array('i', [(parent + num_samples) if (parent >= 0) else parent for parent in parents]))
+		for ends in _read_chunks(other._sample_ends):
+			self._sample_ends.extend(array('i', [(end + num_samples) if end else end for end in ends]))
+		for roots in _read_chunks(other._root_samples):
+			self._root_samples.extend(array('i', [root + num_samples for root in roots]))
+
+		# the other thread's samples start after this thread's samples finish, so each depth stays in time order
+		for depth, other_depth_samples in enumerate(other._depth_samples):
+			if depth == len(self._depth_samples):
+				self._depth_samples.append(self._new_array('i'))
+			for indices in _read_chunks(other_depth_samples):
+				self._depth_samples[depth].extend(array('i', [index + num_samples for index in indices]))
+
+		self._merge_events(other)
+
+	def _merge_events(self, other):
+		""" merge the event emits of another thread, keeping them in time order
+		     - emits are not bounded by the samples' times, so the other thread's emits might interleave with this thread's """
+
+		event_map = _merge_by_label(self._events, other._events)
+		while len(self._event_emit_times) < len(self._events):
+			self._event_emit_times.append(self._new_array(TIME_TYPECODE))
+
+		if _is_after(self._event_sample_times, other._event_sample_times):
+			for times in _read_chunks(other._event_sample_times):
+				self._event_sample_times.extend(times)
+			for event_indices in _read_chunks(other._event_sample_events):
+				self._event_sample_events.extend(array('i', [event_map[event_index] for event_index in event_indices]))
+		else:
+			# the merged emits are streamed into the new arrays, rather than collected in a list
+			other_event_sample_events = (event_map[event_index] for event_index in other._event_sample_events)
+			event_samples = heapq.merge(izip(self._event_sample_times, self._event_sample_events), izip(other._event_sample_times, other_event_sample_events))
+			event_sample_times = self._new_array(TIME_TYPECODE)
+			event_sample_events = self._new_array('i')
+			for (time, event_index) in event_samples:
+				event_sample_times.append(time)
+				event_sample_events.append(event_index)
+			self._event_sample_times = event_sample_times
+			self._event_sample_events = event_sample_events
+
+		for other_event_index, other_emit_times in enumerate(other._event_emit_times):
+			emit_times = self._event_emit_times[event_map[other_event_index]]
+			if _is_after(emit_times, other_emit_times):
+				for times in _read_chunks(other_emit_times):
+					emit_times.extend(times)
+			else:
+				merged_emit_times = self._new_array(TIME_TYPECODE)
+				merged_emit_times.extend(heapq.merge(emit_times, other_emit_times))
+				self._event_emit_times[event_map[other_event_index]] = merged_emit_times
+
 	def debug_tty(self):
 		print "Thread:", self._label
 		print " Max Stack Depth:", self._max_stack_depth
@@ -169,26 +666,62 @@ class ThreadData:
 	
 	def add_event(self, event_data):
 		self._events.append(event_data)
+		self._event_emit_times.append(self._new_array(TIME_TYPECODE))
 	
 	def get_num_events(self):
 		return len(self._events)
 	
 	def get_event(self, index):
 		return self._events[index]
+
+	def get_event_index(self, label):
+		""" return the index of the first event with a label, or None """
+		for index, event in enumerate(self._events):
+			if event.get_label() == label:
+				return index
+		return None
 	
 	def on_event_emit(self, event_id, time):
-		event = self._events[event_id]
-		event_sample_data = EventSampleData(event, time)
-		self._event_samples.append(event_sample_data)
+		emit_times = self._event_emit_times[event_id]
+
+		event_sample_times = self._event_sample_times
+		if (not event_sample_times) or (time >= event_sample_times[-1]):
+			event_sample_times.append(time)
+			self._event_sample_events.append(event_id)
+		else:
+			# keep the emits in time order, if a producer emits them out of order
+			index = bisect_right(event_sample_times, time)
+			event_sample_times.insert(index, time)
+			self._event_sample_events.insert(index, event_id)
+
+		if (not emit_times) or (time >= emit_times[-1]):
+			emit_times.append(time)
+		else:
+			emit_times.insert(bisect_right(emit_times, time), time)
 
 	def get_num_event_samples(self):
-		return len(self._event_samples)
+		return len(self._event_sample_times)
 	
 	def get_event_sample(self, index):
-		return self._event_samples[index]
+		return EventSampleData(self._events[self._event_sample_events[index]], self._event_sample_times[index])
 	
 	def get_event_samples(self):
-		return self._event_samples
+		""" return the emits of every event on this thread, in time order """
+		return EventSampleList(self)
+
+	def get_event_sample_index_range(self, start_time, finish_time):
+		""" return (first, end) indices of the event samples in [start_time, finish_time] """
+		first = bisect_left(self._event_sample_times, start_time)
+		end = bisect_right(self._event_sample_times, finish_time, first)
+		return (first, end)
+
+	def get_event_emit_times(self, event_index):
+		""" return the array of the times that an event was emitted, in time order - this must not be modified """
+		return self._event_emit_times[event_index]
+
+	def get_frames(self, event_index):
+		""" return the ProfileFrames between consecutive emits of an event (i.e. 'Frame Start') """
+		return self._get_summary(ProfileFrames, event_index)
 
 class CounterSample:
 	def __init__(self, time, value):
@@ -201,12 +734,40 @@ class CounterSample:
 	def get_value(self):
 		return self._value
 
+class CounterSampleList:
+	""" sequence of CounterSample, that are created on demand from the sample arrays of a CounterData """
+
+	def __init__(self, times, values):
+		self._times = times
+		self._values = values
+
+	def __len__(self):
+		return len(self._times)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [CounterSample(time, value) for time, value in izip(self._times[index], self._values[index])]
+		return CounterSample(self._times[index], self._values[index])
+
+	def __iter__(self):
+		for time, value in izip(self._times, self._values):
+			yield CounterSample(time, value)
+
 class CounterData:
-	def __init__(self, id, label):
+	""" the values of one counter
+	     - samples are stored in parallel arrays of times and values, in the order that they were emitted """
+
+	def __init__(self, id, label, new_array = array):
 		self._id = id
 		self._label = label
-		self._samples = []
+		self._sample_times = new_array(TIME_TYPECODE)
+		self._sample_values = new_array(VALUE_TYPECODE)
+
+		# built when it is first needed, and rebuilt after more samples are added
+		self._level_of_detail = None
 
+		# the range of values, up to the number of samples when finalize() was last called
+		self._num_finalized_samples = 0
 		self._max_value = 0
 		self._min_value = 0
 	
@@ -217,14 +778,36 @@ class CounterData:
 		return self._label
 	
 	def get_samples(self):
-		return self._samples
+		return CounterSampleList(self._sample_times, self._sample_values)
+
+	def get_num_samples(self):
+		return len(self._sample_times)
+
+	def get_sample_times(self):
+		""" return the array of sample times - this must not be modified """
+		return self._sample_times
+
+	def get_sample_values(self):
+		return self._sample_values
 	
 	def add_sample(self, sample):
-		self._samples.append(sample)
-		
-		value = sample.get_value()
-		self._max_value = max(self._max_value, value)
-		self._min_value = min(self._min_value, value)
+		self.add_value(sample.get_time(), sample.get_value())
+
+	def add_value(self, time, value):
+		self._sample_times.append(time)
+		self._sample_values.append(value)
+
+	def add_values(self, times, values):
+		""" add a list of samples, in time order """
+		self._sample_times.extend(times)
+		self._sample_values.extend(values)
+
+	def finalize(self):
+		""" extend the range of values to include the samples added since the last call """
+		for values in _read_chunks(self._sample_values, self._num_finalized_samples):
+			self._max_value = max(self._max_value, max(values))
+			self._min_value = min(self._min_value, min(values))
+		self._num_finalized_samples = len(self._sample_values)
 
 	def get_max_value(self):
 		return self._max_value
@@ -232,15 +815,71 @@ class CounterData:
 	def get_min_value(self):
 		return self._min_value
 
+	def get_sample_index_at_time(self, time):
+		""" return the index of the sample whose value is in effect at a time, or -1 if the time is before the first sample """
+		return bisect_right(self._sample_times, time) - 1
+
+	def get_sample_index_range(self, start_time, finish_time):
+		""" return (first, end) indices of the samples whose values are in effect during [start_time, finish_time] """
+		first = max(0, self.get_sample_index_at_time(start_time))
+		end = bisect_right(self._sample_times, finish_time, first)
+		return (first, end)
+
+	def get_level_of_detail(self):
+		""" return the CounterLevelOfDetail for the samples of this counter, or None if there aren't any """
+
+		if not self._sample_times:
+			return None
+
+		if (self._level_of_detail == None) or (self._level_of_detail.get_num_samples() != len(self._sample_times)):
+			self._level_of_detail = CounterLevelOfDetail(self)
+		return self._level_of_detail
+
+	def __getstate__(self):
+		# see ThreadData.__getstate__
+		state = self.__dict__.copy()
+		state['_sample_times'] = self._sample_times.tostring()
+		state['_sample_values'] = self._sample_values.tostring()
+		state['_level_of_detail'] = None
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._sample_times = array(TIME_TYPECODE)
+		self._sample_times.fromstring(state['_sample_times'])
+		self._sample_values = array(VALUE_TYPECODE)
+		self._sample_values.fromstring(state['_sample_values'])
+
 class ProfileData:
-	def __init__(self):
+	def __init__(self, array_store = None):
 		self._threads = []
 		self._counters = []
 		self._start_time = None
 		self._finish_time = None
 
+		# with a MappedArrayStore, the sample, event and counter arrays are kept in its scratch file instead of in memory
+		self._array_store = array_store
+		self._new_array = array_store.new_array if array_store else array
+
+		# the ProfileUtilization, and the number of samples on each thread and the finish time that it was built for
+		self._utilization = None
+		self._utilization_key = None
+
+	def get_array_store(self):
+		""" return the MappedArrayStore that the arrays are kept in, or None if they are in memory """
+		return self._array_store
+
+	def __getstate__(self):
+		# the threads and counters load their arrays into memory, so the cached ProfileData doesn't use the scratch file
+		state = self.__dict__.copy()
+		state['_array_store'] = None
+		state['_new_array'] = array
+		state['_utilization'] = None
+		state['_utilization_key'] = None
+		return state
+
 	def on_thread(self, thread_id, thread_label):
-		thread_data = ThreadData(thread_id, thread_label)
+		thread_data = ThreadData(thread_id, thread_label, self._new_array)
 		self._threads.append( thread_data )
 
 	def get_num_threads(self):
@@ -264,6 +903,30 @@ class ProfileData:
 
 		self._finish_time = finish_time
 	
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		""" consume a run of 'S' (sample start) and 'E' (sample finish) records, in file order """
+
+		if not record_types:
+			return
+
+		first_thread_id = thread_ids[0]
+		if thread_ids.count(first_thread_id) == len(thread_ids):
+			self._threads[first_thread_id].on_samples_batch(record_types, function_ids, times)
+		else:
+			# each thread only depends on the order of its own records, so the run can be split by thread
+			thread_positions = {}
+			for position, thread_id in enumerate(thread_ids):
+				thread_positions.setdefault(thread_id, []).append(position)
+
+			for thread_id, positions in thread_positions.iteritems():
+				self._threads[thread_id].on_samples_batch([record_types[position] for position in positions], [function_ids[position] for position in positions], [times[position] for position in positions])
+
+		if (self._start_time==None) and ('S' in record_types):
+			self._start_time = times[record_types.index('S')]
+
+		if 'E' in record_types:
+			self._finish_time = times[len(record_types) - 1 - record_types[::-1].index('E')]
+
 	def on_event(self, thread_id, event_id, event_label):
 		event_data = EventData(event_id, event_label)
 		self._threads[thread_id].add_event( event_data )
@@ -271,35 +934,76 @@ class ProfileData:
 	def on_event_emit(self, thread_id, event_id, time):
 		self._threads[thread_id].on_event_emit(event_id, time)
 
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		threads = self._threads
+		for thread_id, event_id, time in izip(thread_ids, event_ids, times):
+			threads[thread_id].on_event_emit(event_id, time)
+
+	def finalize(self):
+		""" compute the metrics that depend on later records (i.e. each thread's call stack depths and start / finish times,
+		    and each counter's range of values), after loading more data
+		     - the loaders append records without computing these, and call this when they finish loading
+		     - only the records added since the last call are visited, so it can be called after each block of a live profile """
+
+		for thread_data in self._threads:
+			thread_data.finalize()
+		for counter_data in self._counters:
+			counter_data.finalize()
+
 	def get_start_time(self):
 		return self._start_time
 
 	def get_finish_time(self):
 		return self._finish_time
 
-	def merge_restarted_threads(self):
-		""" merge threads that have the same label, and non-overlapping start/finish times """
+	def get_open_sample_start_time(self):
+		""" return the start time of the earliest sample, on any thread, that has not finished yet, or None """
+		start_times = [thread.get_open_sample_start_time() for thread in self._threads]
+		start_times = [start_time for start_time in start_times if start_time != None]
+		return min(start_times) if start_times else None
 
-		i = 0
-		while (i < len(self._threads)):
-			thread_data = self._threads[i]
+	def slice(self, start_time, finish_time):
+		""" return a ProfileDataSlice, which is a view of the threads, samples, events and counters that overlap [start_time, finish_time] """
+		# Note: imported here, because profileslice imports this module
+		from profileslice import ProfileDataSlice
+		return ProfileDataSlice(self, start_time, finish_time)
 
-			j = i+1
-			while (j < len(self._threads)):
-				merge_thread_data = self._threads[j]
+	def get_utilization(self):
+		""" return the ProfileUtilization of the threads, which is cached until samples are added or finish """
+		# Note: imported here, because profileutilization imports this module
+		from profileutilization import ProfileUtilization
 
-				if (thread_data.get_label() == merge_thread_data.get_label()) and (merge_thread_data.get_start_time() >= thread_data.get_finish_time()):
-					# merge together
-					thread_data.merge( merge_thread_data )
+		key = (self._finish_time, [thread_data.get_num_samples() for thread_data in self._threads])
+		if key != self._utilization_key:
+			self._utilization = ProfileUtilization(self)
+			self._utilization_key = key
+		return self._utilization
 
-					# remove merge_thread_data
-					self._threads.pop(j)
+	def merge_restarted_threads(self):
+		""" merge threads that have the same label, and non-overlapping start/finish times
+		     - each label's threads are visited in start time order, and merged into the run of merged threads that finished first,
+		       so this is O(n log n) in the number of threads, rather than comparing every pair of threads """
 
-				else:
-					j += 1
+		# the runs of merged threads for each label, as a heap of (finish time, order, run's first thread)
+		runs = {}
+		merged_threads = set()
+		for order, thread_data in enumerate(sorted(self._threads, key=lambda thread_data: thread_data.get_start_time())):
+			if thread_data.get_start_time() == None:
+				# a thread without samples doesn't have a time period to merge
+				continue
+
+			label_runs = runs.setdefault(thread_data.get_label(), [])
+			if label_runs and (label_runs[0][0] <= thread_data.get_start_time()):
+				(finish_time, run_order, run_thread_data) = label_runs[0]
+				run_thread_data.merge(thread_data)
+				merged_threads.add(thread_data)
+				heapq.heapreplace(label_runs, (run_thread_data.get_finish_time(), run_order, run_thread_data))
+
+			elif thread_data.get_finish_time() != None:
+				heapq.heappush(label_runs, (thread_data.get_finish_time(), order, thread_data))
+
+		self._threads = [thread_data for thread_data in self._threads if thread_data not in merged_threads]
 
-			i += 1
-	
 	def debug_tty(self):
 		print " Start Time:", self._start_time
 		print "Finish Time:", self._finish_time
@@ -313,10 +1017,13 @@ class ProfileData:
 		return self._counters[index]
 
 	def on_counter(self, counter_id, counter_label):
-		counter = CounterData(counter_id, counter_label)
+		counter = CounterData(counter_id, counter_label, self._new_array)
 		self._counters.append(counter)
 	
 	def on_counter_value(self, counter_id, time, counter_value):
-		counter = self._counters[counter_id]
-		sample = CounterSample(time, counter_value)
-		counter.add_sample(sample)
\ No newline at end of file
+		self._counters[counter_id].add_value(time, counter_value)
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		counters = self._counters
+		for counter_id, time, counter_value in izip(counter_ids, times, counter_values):
+			counters[counter_id].add_value(time, counter_value)
@@ -0,0 +1,236 @@
+import argparse
+from itertools import izip
+
+from profileparser import ProfileParser
+from profilebinary import ProfileBinaryLoader, is_binary_profile
+from profilesketch import DurationSketch
+
+# the per-call percentiles that are compared
+DIFF_PERCENTILES = [50, 95, 99, 99.9]
+
+# the columns that a diff can be sorted by, which are sorted by the size of the change
+SORT_KEYS = ['inclusive', 'exclusive', 'calls', 'p50', 'p95', 'p99', 'p99.9']
+
+class FunctionAggregate:
+	""" the calls to one function on the threads with the same label, without keeping the samples
+	     - the duration of each call is counted in a DurationSketch, so its size doesn't depend on the number of calls
+	     - inclusive time only counts the outermost call of a recursive function, as in profilestats.py """
+
+	def __init__(self):
+		self._call_count = 0
+		self._total_time = 0
+		self._inclusive_time = 0
+		self._exclusive_time = 0
+		self._duration_sketch = DurationSketch()
+
+	def add_call(self, duration, exclusive_time, is_outermost):
+		self._call_count += 1
+		self._total_time += duration
+		self._exclusive_time += exclusive_time
+		if is_outermost:
+			self._inclusive_time += duration
+		self._duration_sketch.add(duration)
+
+	def get_call_count(self):
+		return self._call_count
+
+	def get_total_time(self):
+		""" return the sum of the durations of every call, including recursive calls """
+		return self._total_time
+
+	def get_inclusive_time(self):
+		return self._inclusive_time
+
+	def get_exclusive_time(self):
+		return self._exclusive_time
+
+	def get_min_time(self):
+		return self._duration_sketch.get_min_duration()
+
+	def get_max_time(self):
+		return self._duration_sketch.get_max_duration()
+
+	def get_percentile(self, percentile):
+		""" return an estimate of the duration that percentile% of the calls are no slower than, or None if there were no calls """
+		return self._duration_sketch.get_percentile(percentile)
+
+class ProfileSummary:
+	""" per-function aggregates for a profile, keyed on (thread label, function label)
+	     - a consumer for ProfileParser / ProfileBinaryLoader, that only keeps the call stack of each thread while loading,
+	       so that very large profiles can be compared without loading their samples
+	     - events and counters are ignored """
+
+	def __init__(self):
+		self._thread_labels = {}
+		self._function_labels = {}
+
+		# the call stack of each thread, as [function_id, start time, time spent in finished children],
+		#  and the number of times each function is on it
+		self._call_stacks = {}
+		self._call_stack_counts = {}
+
+		self._function_aggregates = {}
+
+	def on_thread(self, thread_id, thread_label):
+		self._thread_labels[thread_id] = thread_label
+		self._function_labels[thread_id] = {}
+		self._call_stacks[thread_id] = []
+		self._call_stack_counts[thread_id] = {}
+
+	def on_function(self, thread_id, function_id, function_label):
+		self._function_labels[thread_id][function_id] = function_label
+
+	def on_sample_start(self, thread_id, function_id, start_time):
+		call_stack_counts = self._call_stack_counts[thread_id]
+		self._call_stacks[thread_id].append([function_id, start_time, 0])
+		call_stack_counts[function_id] = call_stack_counts.get(function_id, 0) + 1
+
+	def on_sample_finish(self, thread_id, function_id, finish_time):
+		call_stack = self._call_stacks[thread_id]
+		if not call_stack:
+			return
+
+		(function_id, start_time, child_time) = call_stack.pop()
+		duration = finish_time - start_time
+		if call_stack:
+			call_stack[-1][2] += duration
+
+		call_stack_counts = self._call_stack_counts[thread_id]
+		call_stack_counts[function_id] -= 1
+
+		key = (self._thread_labels[thread_id], self._function_labels[thread_id][function_id])
+		function_aggregate = self._function_aggregates.get(key)
+		if function_aggregate == None:
+			function_aggregate = self._function_aggregates[key] = FunctionAggregate()
+		function_aggregate.add_call(duration, duration - child_time, not call_stack_counts[function_id])
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		on_sample_start = self.on_sample_start
+		on_sample_finish = self.on_sample_finish
+		for record_type, thread_id, function_id, time in izip(record_types, thread_ids, function_ids, times):
+			if record_type == 'S':
+				on_sample_start(thread_id, function_id, time)
+			else:
+				on_sample_finish(thread_id, function_id, time)
+
+	def on_event(self, thread_id, event_id, event_label):
+		pass
+
+	def on_event_emit(self, thread_id, event_id, time):
+		pass
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		pass
+
+	def on_counter(self, counter_id, counter_label):
+		pass
+
+	def on_counter_value(self, counter_id, time, value):
+		pass
+
+	def on_counter_values_batch(self, counter_ids, times, values):
+		pass
+
+	def get_function_keys(self):
+		""" return the (thread label, function label) of every function with at least one finished call """
+		return self._function_aggregates.keys()
+
+	def get_function_aggregate(self, key):
+		""" return the FunctionAggregate for a (thread label, function label), or None """
+		return self._function_aggregates.get(key)
+
+def load_summary(filenames):
+	""" return a ProfileSummary of one or more profile.txt files or binary profile files (i.e. repeated captures of a scenario),
+	    where the calls to functions with the same thread label and function label are aggregated together """
+	profile_summary = ProfileSummary()
+	for filename in filenames:
+		if is_binary_profile(filename):
+			ProfileBinaryLoader(profile_summary).load_file(filename)
+		else:
+			ProfileParser(profile_summary).load_file(filename)
+	return profile_summary
+
+class FunctionDiff:
+	""" the change in a function's calls between a baseline and a candidate profile
+	     - a function that is only in one of the profiles has no calls in the other """
+
+	def __init__(self, key, baseline_aggregate, candidate_aggregate):
+		self._key = key
+		self._baseline_aggregate = baseline_aggregate or FunctionAggregate()
+		self._candidate_aggregate = candidate_aggregate or FunctionAggregate()
+
+	def get_thread_label(self):
+		return self._key[0]
+
+	def get_function_label(self):
+		return self._key[1]
+
+	def get_baseline(self):
+		return self._baseline_aggregate
+
+	def get_candidate(self):
+		return self._candidate_aggregate
+
+	def get_call_count_delta(self):
+		return self._candidate_aggregate.get_call_count() - self._baseline_aggregate.get_call_count()
+
+	def get_inclusive_time_delta(self):
+		return self._candidate_aggregate.get_inclusive_time() - self._baseline_aggregate.get_inclusive_time()
+
+	def get_exclusive_time_delta(self):
+		return self._candidate_aggregate.get_exclusive_time() - self._baseline_aggregate.get_exclusive_time()
+
+	def get_percentile_delta(self, percentile):
+		""" return the change in the estimated per-call percentile, or None if either profile has no calls """
+		baseline_duration = self._baseline_aggregate.get_percentile(percentile)
+		candidate_duration = self._candidate_aggregate.get_percentile(percentile)
+		if (baseline_duration == None) or (candidate_duration == None):
+			return None
+		return candidate_duration - baseline_duration
+
+def diff_profiles(baseline_summary, candidate_summary):
+	""" return a FunctionDiff for each (thread label, function label) that is in either profile, sorted by key """
+	keys = set(baseline_summary.get_function_keys()) | set(candidate_summary.get_function_keys())
+	return [FunctionDiff(key, baseline_summary.get_function_aggregate(key), candidate_summary.get_function_aggregate(key)) for key in sorted(keys)]
+
+def _get_sort_value(function_diff, sort_key):
+	if sort_key == 'inclusive':
+		return function_diff.get_inclusive_time_delta()
+	elif sort_key == 'exclusive':
+		return function_diff.get_exclusive_time_delta()
+	elif sort_key == 'calls':
+		return function_diff.get_call_count_delta()
+	else:
+		return function_diff.get_percentile_delta(float(sort_key[1:])) or 0
+
+def _format_percentile(duration):
+	if duration == None:
+		return "-"
+	return "%.1f" % duration
+
+def print_diff(function_diffs, sort_key = 'exclusive', max_functions = None):
+	""" print a table of the changes in each function, from the largest change to the smallest """
+
+	function_diffs = sorted(function_diffs, key=lambda function_diff: abs(_get_sort_value(function_diff, sort_key)), reverse=True)
+
+	percentile_columns = ["p%g" % percentile for percentile in DIFF_PERCENTILES]
+	print "%10s %10s %12s %12s %12s %12s %s  %s" % ("calls", "delta", "inclusive", "delta", "exclusive", "delta", " ".join("%23s" % column for column in percentile_columns), "thread;function")
+	for function_diff in function_diffs[:max_functions]:
+		candidate = function_diff.get_candidate()
+		percentiles = " ".join("%10s ->%10s" % (_format_percentile(function_diff.get_baseline().get_percentile(percentile)), _format_percentile(candidate.get_percentile(percentile))) for percentile in DIFF_PERCENTILES)
+		print "%10d %+10d %12d %+12d %12d %+12d %s  %s;%s" % (candidate.get_call_count(), function_diff.get_call_count_delta(), candidate.get_inclusive_time(), function_diff.get_inclusive_time_delta(), candidate.get_exclusive_time(), function_diff.get_exclusive_time_delta(), percentiles, function_diff.get_thread_label(), function_diff.get_function_label())
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Print the change in the calls to each function between a baseline profile and a candidate profile, matching functions by thread label and function label")
+	parser.add_argument('--baseline', '-b', required=True, nargs='+', help='file paths to one or more baseline profile.txt files, or binary profile files')
+	parser.add_argument('--candidate', '-c', required=True, nargs='+', help='file paths to one or more candidate profile.txt files, or binary profile files')
+	parser.add_argument('--sort', '-s', default='exclusive', choices=SORT_KEYS, help='column to sort the functions by, from the largest change to the smallest')
+	parser.add_argument('--top', '-t', type=int, default=None, help='only print this many functions')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	args = parse_args()
+
+	function_diffs = diff_profiles(load_summary(args.baseline), load_summary(args.candidate))
+	print_diff(function_diffs, args.sort, args.top)
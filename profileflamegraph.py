@@ -0,0 +1,234 @@
+import colorsys
+import zlib
+
+from profilecalltree import build_call_tree
+from profilerender import render_text, TITLE_HEIGHT, TEXT_SIZE_TITLE, COLOUR_BLACK
+
+FLAME_GRAPH_ROW_HEIGHT = 20
+TEXT_SIZE_FLAME_GRAPH_LABEL = 11
+
+# Note: nodes that are narrower than this, in pixels, are not drawn (and neither are their children)
+FLAME_GRAPH_MIN_NODE_WIDTH = 0.5
+
+def get_node_colour(label):
+	""" return a warm colour for a label, which is the same every time the label is drawn """
+	hue = (zlib.crc32(label) & 0xffff) / 65535.0
+	return colorsys.hls_to_rgb(hue * 0.15, 0.6, 0.8)
+
+class ProfileFlameGraphRender:
+	""" Render the merged call tree of a profiling session as a flame graph
+	     - each row is a call stack depth, starting with the threads at the top, and each node's width is its inclusive time
+	     - the children of a node are sorted by label, so the x axis is not time
+	     - has the same interface as ProfileRender, so that the window can switch between them """
+
+	def __init__(self, profile_data):
+		self._width = 0.0
+		self._height = 0.0
+		self._profile_data = profile_data
+		self._offset_y = 0
+
+		self._call_tree = None
+		self._build_layout()
+
+		# the range of inclusive time, from the left edge of the root, that is shown across the window
+		self._start_offset = 0
+		self._finish_offset = self._total_time
+
+	def _build_layout(self):
+		""" merge the threads' call trees, and position each node relative to the left edge of the root """
+
+		call_tree = build_call_tree(self._profile_data)
+		num_nodes = call_tree.get_num_nodes()
+		offsets = [0] * num_nodes
+		depths = [0] * num_nodes
+		max_depth = 0
+
+		# parents always have lower indices than their children, so they are positioned first
+		for node in xrange(num_nodes):
+			offset = offsets[node]
+			child_depth = depths[node] + 1
+			for child in call_tree.get_node_children(node):
+				offsets[child] = offset
+				depths[child] = child_depth
+				offset += call_tree.get_node_inclusive_time(child)
+			if call_tree.get_node_children(node):
+				max_depth = max(max_depth, child_depth)
+
+		self._call_tree = call_tree
+		self._node_offsets = offsets
+		self._total_time = call_tree.get_node_inclusive_time(0)
+		self._render_height = TITLE_HEIGHT + (max_depth * FLAME_GRAPH_ROW_HEIGHT)
+
+	def render(self, cr):
+		if self._call_tree == None:
+			self._build_layout()
+
+		cr.set_source_rgb(1.0, 1.0, 1.0)
+		cr.paint()
+
+		if not self._total_time:
+			# there are no finished samples to render yet
+			return
+
+		call_tree = self._call_tree
+		(clip_x1, clip_y1, clip_x2, clip_y2) = cr.clip_extents()
+		visible_start_offset = self._get_offset_at_x(clip_x1)
+		visible_finish_offset = self._get_offset_at_x(clip_x2)
+		min_node_time = FLAME_GRAPH_MIN_NODE_WIDTH * self._get_offset_per_pixel()
+
+		cr.set_line_width(1)
+
+		# nodes to draw, as (node, depth) - without recursion, because call stacks can be very deep
+		pending = [(child, 0) for child in reversed(call_tree.get_node_children(0))]
+		while pending:
+			(node, depth) = pending.pop()
+			start_offset = self._node_offsets[node]
+			inclusive_time = call_tree.get_node_inclusive_time(node)
+			finish_offset = start_offset + inclusive_time
+
+			if (inclusive_time < min_node_time) or (finish_offset < visible_start_offset) or (start_offset > visible_finish_offset):
+				continue
+
+			y = self._offset_y + TITLE_HEIGHT + (depth * FLAME_GRAPH_ROW_HEIGHT)
+			if y > self._height:
+				continue
+
+			start_x = self._get_x_for_offset(start_offset)
+			width = self._get_x_for_offset(finish_offset) - start_x
+			if y + FLAME_GRAPH_ROW_HEIGHT > 0:
+				self._render_node(cr, node, start_x, y, width)
+
+			pending.extend((child, depth + 1) for child in reversed(call_tree.get_node_children(node)))
+
+		# render title
+		cr.set_source_rgb(1.0, 1.0, 1.0)
+		cr.rectangle(0, 0, self._width, TITLE_HEIGHT)
+		cr.fill()
+		cr.set_source_rgb(*COLOUR_BLACK)
+		render_text(cr, "Flame Graph: all threads", TEXT_SIZE_TITLE, 0, 0)
+
+	def _render_node(self, cr, node, start_x, y, width):
+		label = self._call_tree.get_node_label(node)
+
+		cr.set_source_rgb(*get_node_colour(label))
+		cr.rectangle(start_x, y, width, FLAME_GRAPH_ROW_HEIGHT)
+		cr.fill()
+
+		if width > 10:
+			cr.set_source_rgb(*COLOUR_BLACK)
+			cr.rectangle(start_x, y, width, FLAME_GRAPH_ROW_HEIGHT)
+			cr.stroke()
+
+			render_text(cr, label, TEXT_SIZE_FLAME_GRAPH_LABEL, start_x, y, width)
+
+	def render_pointer(self, cr, pointer):
+		""" outline the node under the pointer, and show its inclusive / exclusive time in the title """
+
+		(x,y) = pointer
+		node = self._get_node_at(x, y)
+		if node == None:
+			return
+
+		call_tree = self._call_tree
+		start_x = self._get_x_for_offset(self._node_offsets[node])
+		width = self._get_x_for_offset(self._node_offsets[node] + call_tree.get_node_inclusive_time(node)) - start_x
+		depth = len(call_tree.get_node_path(node)) - 1
+
+		cr.set_source_rgb(*COLOUR_BLACK)
+		cr.set_line_width(3)
+		cr.rectangle(start_x, self._offset_y + TITLE_HEIGHT + (depth * FLAME_GRAPH_ROW_HEIGHT), max(width, 1), FLAME_GRAPH_ROW_HEIGHT)
+		cr.stroke()
+
+		inclusive_time = call_tree.get_node_inclusive_time(node)
+		title = "%s - %d calls, %.3fms inclusive (%.1f%%), %.3fms exclusive" % (call_tree.get_node_label(node), call_tree.get_node_call_count(node), inclusive_time / 1000.0, inclusive_time * 100.0 / self._total_time, call_tree.get_node_exclusive_time(node) / 1000.0)
+
+		cr.set_source_rgb(1.0, 1.0, 1.0)
+		cr.rectangle(0, 0, self._width, TITLE_HEIGHT)
+		cr.fill()
+		cr.set_source_rgb(*COLOUR_BLACK)
+		render_text(cr, title, TEXT_SIZE_TITLE, 0, 0)
+
+	def _get_node_at(self, x, y):
+		""" return the node at x,y in the window, or None """
+
+		if (self._call_tree == None) or not self._total_time:
+			return None
+
+		depth = int((y - self._offset_y - TITLE_HEIGHT) // FLAME_GRAPH_ROW_HEIGHT)
+		if (y < TITLE_HEIGHT) or (depth < 0):
+			return None
+
+		offset = self._get_offset_at_x(x)
+		node = 0
+		for node_depth in xrange(depth + 1):
+			for child in self._call_tree.get_node_children(node):
+				child_offset = self._node_offsets[child]
+				if child_offset <= offset < (child_offset + self._call_tree.get_node_inclusive_time(child)):
+					node = child
+					break
+			else:
+				return None
+		return node
+
+	def resize(self, width, height):
+		self._width = float(width)
+		self._height = float(height)
+
+		self._validate_viewport()
+
+	def on_profile_data_extended(self):
+		""" rebuild the flame graph after more data has been added to the profile data
+		     - returns the range of x co-ords that need to be redrawn as (x, width) """
+
+		was_showing_all = (self._start_offset <= 0) and (self._finish_offset >= self._total_time)
+
+		self._build_layout()
+		if was_showing_all:
+			self._start_offset = 0
+			self._finish_offset = self._total_time
+		self._validate_viewport()
+
+		return (0, self._width)
+
+	def pan_by(self, dx, dy):
+		doffset = dx * self._get_offset_per_pixel()
+		self._start_offset -= doffset
+		self._finish_offset -= doffset
+		self._offset_y += dy
+
+		self._validate_viewport()
+
+	def scale_at(self, scale_factor, x, y):
+		x_offset = self._get_offset_at_x(float(x))
+
+		self._start_offset = x_offset - ((x_offset - self._start_offset) / scale_factor)
+		self._finish_offset = x_offset + ((self._finish_offset - x_offset) / scale_factor)
+
+		self._validate_viewport()
+
+	def _get_offset_per_pixel(self):
+		return float(self._finish_offset - self._start_offset) / max(1.0, self._width)
+
+	def _get_offset_at_x(self, x):
+		return self._start_offset + (x * self._get_offset_per_pixel())
+
+	def _get_x_for_offset(self, offset):
+		return (offset - self._start_offset) / max(0.001, self._get_offset_per_pixel())
+
+	def _validate_viewport(self):
+		# keep the window inside the root, without panning past either edge
+		duration = min(self._finish_offset - self._start_offset, self._total_time)
+		if self._start_offset < 0:
+			self._start_offset = 0
+			self._finish_offset = duration
+		elif self._finish_offset > self._total_time:
+			self._finish_offset = self._total_time
+			self._start_offset = self._total_time - duration
+
+		# validate offset_y
+		offset_y = self._offset_y
+		bottom = offset_y + self._render_height
+		if bottom < self._height:
+			offset_y += self._height - bottom
+
+		self._offset_y = min(0, offset_y)
@@ -0,0 +1,63 @@
+import io
+import threading
+import time
+
+from profileparser import ProfileParser, finalize_consumer
+
+# Note: number of bytes parsed at a time while following a file
+#  - the lock on the profile data is held while each block is parsed, so this bounds how long the UI can wait for it
+FOLLOW_BLOCK_SIZE = 64 * 1024
+
+# Note: seconds to wait before checking for more data, after reaching the end of the file
+FOLLOW_POLL_INTERVAL = 0.05
+
+class ProfileFollower:
+	""" follow a profile file that is still being written, parsing newly appended lines into a consumer
+	     - the file is read and parsed on a background thread
+	     - the consumer is only modified while the lock is held """
+
+	def __init__(self, filename, consumer, lock):
+		self._filename = filename
+		self._consumer = consumer
+		self._parser = ProfileParser(consumer)
+		self._lock = lock
+		self._has_new_data = False
+		self._is_running = False
+		self._thread = None
+
+	def start(self):
+		self._is_running = True
+		self._thread = threading.Thread(target=self._follow, name="ProfileFollower")
+		self._thread.daemon = True
+		self._thread.start()
+
+	def stop(self):
+		self._is_running = False
+		if self._thread:
+			self._thread.join()
+			self._thread = None
+
+	def get_lock(self):
+		return self._lock
+
+	def has_new_data(self):
+		""" return True once after new data has been parsed into the consumer
+		     - call this while holding the lock """
+		has_new_data = self._has_new_data
+		self._has_new_data = False
+		return has_new_data
+
+	def _follow(self):
+		# Note: io.open() doesn't use C stdio, so reads keep returning newly appended data after reaching the end of the file
+		with io.open(self._filename, "rb") as file:
+			while self._is_running:
+				block = file.read(FOLLOW_BLOCK_SIZE)
+				if not block:
+					# reached the end of the file - wait for the profiler to append more
+					time.sleep(FOLLOW_POLL_INTERVAL)
+					continue
+
+				with self._lock:
+					self._parser.feed(block)
+					finalize_consumer(self._consumer)
+					self._has_new_data = True
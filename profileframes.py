@@ -0,0 +1,143 @@
+import argparse
+import operator
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Note: default number of bins in a histogram of frame durations
+FRAME_HISTOGRAM_BINS = 20
+
+class ProfileFrames:
+	""" the frames on a thread, where each frame starts with an emit of an event (i.e. 'Frame Start'),
+	    and finishes when the event is next emitted
+	     - the frames are also sorted by duration when they are built, so that the slowest frames can be found instantly """
+
+	def __init__(self, thread_data, event_index):
+		self._event = thread_data.get_event(event_index)
+
+		emit_times = thread_data.get_event_emit_times(event_index)
+		self._start_times = emit_times[:-1]
+		self._finish_times = emit_times[1:]
+		self._durations = array(emit_times.typecode, map(operator.sub, self._finish_times, self._start_times))
+
+		# frame indices from the slowest frame to the fastest, and the durations from the fastest frame to the slowest
+		durations = self._durations
+		self._slowest_frames = array('i', sorted(xrange(len(durations)), key=durations.__getitem__, reverse=True))
+		self._sorted_durations = array(durations.typecode, sorted(durations))
+
+	def get_event(self):
+		return self._event
+
+	def get_num_frames(self):
+		return len(self._durations)
+
+	def get_frame_start_time(self, index):
+		return self._start_times[index]
+
+	def get_frame_finish_time(self, index):
+		return self._finish_times[index]
+
+	def get_frame_duration(self, index):
+		return self._durations[index]
+
+	def get_frame_at_time(self, time):
+		""" return the index of the frame that contains a time, or None """
+		index = bisect_right(self._start_times, time) - 1
+		if (index < 0) or (time >= self._finish_times[index]):
+			return None
+		return index
+
+	def get_frame_index_range(self, start_time, finish_time):
+		""" return (first, end) indices of the frames that overlap [start_time, finish_time] """
+		first = bisect_right(self._finish_times, start_time)
+		end = bisect_right(self._start_times, finish_time, first)
+		return (first, end)
+
+	def get_slowest_frame_indices(self, num_frames):
+		""" return the indices of the slowest frames, from the slowest to the fastest """
+		return self._slowest_frames[:num_frames]
+
+	def get_duration_percentile(self, percentile):
+		""" return the duration that percentile% of the frames are no slower than """
+		if not self._sorted_durations:
+			return None
+		rank = int(round((percentile / 100.0) * (len(self._sorted_durations) - 1)))
+		return self._sorted_durations[rank]
+
+	def get_duration_histogram(self, num_bins = FRAME_HISTOGRAM_BINS):
+		""" return (min duration, max duration, number of frames) for bins of equal width, from the fastest frame to the slowest """
+
+		sorted_durations = self._sorted_durations
+		if not sorted_durations:
+			return []
+
+		min_duration = sorted_durations[0]
+		max_duration = sorted_durations[-1]
+		bin_width = float(max_duration - min_duration) / num_bins
+		if not bin_width:
+			return [(min_duration, max_duration, len(sorted_durations))]
+
+		histogram = []
+		first = 0
+		for bin_index in xrange(num_bins):
+			bin_min_duration = min_duration + (bin_index * bin_width)
+			bin_max_duration = min_duration + ((bin_index + 1) * bin_width)
+			if bin_index == num_bins - 1:
+				end = len(sorted_durations)
+			else:
+				end = bisect_left(sorted_durations, bin_max_duration, first)
+			histogram.append((bin_min_duration, bin_max_duration, end - first))
+			first = end
+		return histogram
+
+def print_frames(profile_data, event_label, num_slowest_frames = 10, num_bins = FRAME_HISTOGRAM_BINS):
+	""" print a histogram of frame durations, and the slowest frames, for each thread with an event """
+
+	for thread_index in xrange(profile_data.get_num_threads()):
+		thread_data = profile_data.get_thread(thread_index)
+		event_index = thread_data.get_event_index(event_label)
+		if event_index == None:
+			continue
+
+		frames = thread_data.get_frames(event_index)
+		print "Thread %d: %s (%d frames)" % (thread_data.get_id(), thread_data.get_label(), frames.get_num_frames())
+		if not frames.get_num_frames():
+			print
+			continue
+
+		print "median %.3fms, 99th percentile %.3fms" % (frames.get_duration_percentile(50) / 1000.0, frames.get_duration_percentile(99) / 1000.0)
+		for (min_duration, max_duration, num_frames) in frames.get_duration_histogram(num_bins):
+			print "%10.3fms - %10.3fms %10d" % (min_duration / 1000.0, max_duration / 1000.0, num_frames)
+
+		print "slowest frames:"
+		for index in frames.get_slowest_frame_indices(num_slowest_frames):
+			print "%10d %10.3fms  start %d" % (index, frames.get_frame_duration(index) / 1000.0, frames.get_frame_start_time(index))
+		print
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Print the durations of the frames in a profile, between consecutive emits of an event")
+	parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file, or a binary profile file')
+	parser.add_argument('--event', '-e', default='Frame Start', help='label of the event that is emitted at the start of each frame')
+	parser.add_argument('--slowest', '-s', type=int, default=10, help='number of the slowest frames to print')
+	parser.add_argument('--bins', '-b', type=int, default=FRAME_HISTOGRAM_BINS, help='number of bins in the histogram of frame durations')
+	parser.add_argument('--range', '-r', type=int, nargs=2, metavar=('START_TIME', 'FINISH_TIME'), help='only include the samples, events and counter values between two clock times')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	# Note: imported here, because profiledata imports this module
+	from profiledata import ProfileData
+	from profileparser import ProfileParser
+	from profilebinary import ProfileBinaryLoader, is_binary_profile
+
+	args = parse_args()
+
+	profile_data = ProfileData()
+	if is_binary_profile(args.filename):
+		ProfileBinaryLoader(profile_data).load_file(args.filename)
+	else:
+		ProfileParser(profile_data).load_file(args.filename)
+
+	if args.range:
+		profile_data = profile_data.slice(*args.range)
+
+	print_frames(profile_data, args.event, args.slowest, args.bins)
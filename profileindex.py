@@ -0,0 +1,357 @@
+import bisect
+import json
+import os
+from itertools import izip
+
+from profileparser import ProfileParser, finalize_consumer
+from profilecompression import get_compression
+
+# Note: the index for 'profile.txt' is saved alongside it, as 'profile.txt.idx'
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+
+# Note: labels are saved in the index as latin-1, so that any bytes in a label survive the round trip through json
+LABEL_ENCODING = 'latin-1'
+
+# Note: default number of records between checkpoints in the index
+RECORDS_PER_CHECKPOINT = 100000
+
+# Note: number of bytes read at a time while building an index, or loading a range
+#  - checkpoints are placed at the boundaries between these blocks
+INDEX_BLOCK_SIZE = 64 * 1024
+
+# Note: time past the end of a window that loading a range keeps reading to, in microseconds
+#  - the records of different threads aren't strictly in time order (i.e. a thread's records can be written late),
+#    so reading stops at the first block whose records are all later than this past the window
+RANGE_TIME_MARGIN = 1000000
+
+class ProfileIndexBuilder:
+	""" consumer for ProfileParser, that tracks the state needed to start parsing from the middle of a file:
+	     - the registrations (T/F/V/C records) that have been seen so far
+	     - the samples that are still open on each thread
+	     - the last value of each counter """
+
+	def __init__(self):
+		self._registrations = []
+		self._stacks = {}
+		self._counter_values = {}
+		self._time = None
+		self._num_records = 0
+		self._checkpoints = []
+
+	def get_num_records(self):
+		return self._num_records
+
+	def add_checkpoint(self, offset):
+		self._checkpoints.append({
+			'offset': offset,
+			'time': self._time,
+			'stacks': [[thread_id, stack[:]] for thread_id, stack in self._stacks.iteritems() if stack],
+			'counters': [[counter_id, value] for counter_id, value in self._counter_values.iteritems()]
+		})
+		self._num_records = 0
+
+	def get_index(self):
+		return {
+			'version': INDEX_VERSION,
+			'registrations': self._registrations,
+			'checkpoints': self._checkpoints
+		}
+
+	def _on_registration(self, *args):
+		# registrations are tagged with the number of the next checkpoint, and replayed when loading from it or any later checkpoint
+		self._registrations.append([len(self._checkpoints)] + list(args))
+
+	def _on_time(self, time):
+		self._time = time if (self._time == None) else max(self._time, time)
+
+	def on_thread(self, thread_id, thread_label):
+		self._on_registration('T', thread_id, thread_label)
+		self._stacks[thread_id] = []
+
+	def on_function(self, thread_id, function_id, function_label):
+		self._on_registration('F', thread_id, function_id, function_label)
+
+	def on_event(self, thread_id, event_id, event_label):
+		self._on_registration('V', thread_id, event_id, event_label)
+
+	def on_counter(self, counter_id, counter_label):
+		self._on_registration('C', counter_id, counter_label)
+
+	def on_sample_start(self, thread_id, function_id, start_time):
+		self.on_samples_batch(['S'], [thread_id], [function_id], [start_time])
+
+	def on_sample_finish(self, thread_id, function_id, finish_time):
+		self.on_samples_batch(['E'], [thread_id], [function_id], [finish_time])
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		stacks = self._stacks
+		for record_type, thread_id, function_id, time in izip(record_types, thread_ids, function_ids, times):
+			if record_type == 'S':
+				stacks[thread_id].append([function_id, time])
+			else:
+				stacks[thread_id].pop()
+
+		self._on_time(max(times))
+		self._num_records += len(record_types)
+
+	def on_event_emit(self, thread_id, event_id, time):
+		self.on_event_emits_batch([thread_id], [event_id], [time])
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		self._on_time(max(times))
+		self._num_records += len(times)
+
+	def on_counter_value(self, counter_id, time, counter_value):
+		self.on_counter_values_batch([counter_id], [time], [counter_value])
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		counter_values_dict = self._counter_values
+		for counter_id, time, counter_value in izip(counter_ids, times, counter_values):
+			counter_values_dict[counter_id] = [time, counter_value]
+
+		self._on_time(max(times))
+		self._num_records += len(times)
+
+class ProfileRangeFilter:
+	""" consumer for ProfileParser, that starts from a checkpoint and only passes on
+	    the samples, events and counter values that overlap the time window [start_time, finish_time]
+	     - samples that are still open at finish_time are clipped to finish_time """
+
+	def __init__(self, consumer, start_time, finish_time, checkpoint):
+		self._consumer = consumer
+		self._start_time = start_time
+		self._finish_time = finish_time
+		self._is_past_window = False
+
+		# the earliest time of the records since start_block() was last called
+		self._block_min_time = None
+
+		# each open sample is [function_id, start_time, has been passed on to the consumer]
+		self._stacks = {}
+		for thread_id, stack in checkpoint['stacks']:
+			self._stacks[thread_id] = [[function_id, time, False] for function_id, time in stack]
+
+		# the last value of each counter before the window, that is passed on when the window starts
+		self._pending_counter_values = {}
+		for counter_id, (time, counter_value) in checkpoint['counters']:
+			self._pending_counter_values[counter_id] = [time, counter_value]
+
+	def is_past_window(self):
+		""" return True if any record has been after the window """
+		return self._is_past_window
+
+	def start_block(self):
+		""" start tracking the earliest time of the records in the next block that is parsed """
+		self._block_min_time = None
+
+	def is_block_past_window(self, margin):
+		""" return True if every record since start_block() was more than margin after the window, and there was at least one """
+		return (self._block_min_time != None) and (self._block_min_time > (self._finish_time + margin))
+
+	def _on_times(self, times):
+		if times:
+			min_time = min(times)
+			if (self._block_min_time == None) or (min_time < self._block_min_time):
+				self._block_min_time = min_time
+
+	def close(self):
+		""" pass on the samples that are still open, and the counter values, that overlap the window """
+		for counter_id in self._pending_counter_values.keys():
+			self._flush_counter_value(counter_id)
+
+		for thread_id, stack in self._stacks.iteritems():
+			self._flush_stack(thread_id, stack)
+
+			if self._is_past_window:
+				while stack:
+					function_id = stack.pop()[0]
+					self._consumer.on_sample_finish(thread_id, function_id, self._finish_time)
+
+	def _flush_stack(self, thread_id, stack):
+		""" pass on the open samples on a thread that have not been passed on yet """
+		for sample in stack:
+			if not sample[2]:
+				sample[2] = True
+				self._consumer.on_sample_start(thread_id, sample[0], sample[1])
+
+	def _flush_counter_value(self, counter_id):
+		pending = self._pending_counter_values.pop(counter_id, None)
+		if pending:
+			self._consumer.on_counter_value(counter_id, pending[0], pending[1])
+
+	def on_thread(self, thread_id, thread_label):
+		self._stacks.setdefault(thread_id, [])
+		self._consumer.on_thread(thread_id, thread_label)
+
+	def on_function(self, thread_id, function_id, function_label):
+		self._consumer.on_function(thread_id, function_id, function_label)
+
+	def on_event(self, thread_id, event_id, event_label):
+		self._consumer.on_event(thread_id, event_id, event_label)
+
+	def on_counter(self, counter_id, counter_label):
+		self._consumer.on_counter(counter_id, counter_label)
+
+	def on_sample_start(self, thread_id, function_id, start_time):
+		self.on_samples_batch(['S'], [thread_id], [function_id], [start_time])
+
+	def on_sample_finish(self, thread_id, function_id, finish_time):
+		self.on_samples_batch(['E'], [thread_id], [function_id], [finish_time])
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		consumer = self._consumer
+		stacks = self._stacks
+		start_time = self._start_time
+		finish_time = self._finish_time
+		self._on_times(times)
+
+		for record_type, thread_id, function_id, time in izip(record_types, thread_ids, function_ids, times):
+			if time > finish_time:
+				self._is_past_window = True
+				continue
+
+			stack = stacks[thread_id]
+			if record_type == 'S':
+				stack.append([function_id, time, False])
+				if time >= start_time:
+					self._flush_stack(thread_id, stack)
+			else:
+				if time >= start_time:
+					# the sample overlaps the window
+					self._flush_stack(thread_id, stack)
+					stack.pop()
+					consumer.on_sample_finish(thread_id, function_id, time)
+				else:
+					stack.pop()
+
+	def on_event_emit(self, thread_id, event_id, time):
+		self.on_event_emits_batch([thread_id], [event_id], [time])
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		self._on_times(times)
+		for thread_id, event_id, time in izip(thread_ids, event_ids, times):
+			if time > self._finish_time:
+				self._is_past_window = True
+			elif time >= self._start_time:
+				self._consumer.on_event_emit(thread_id, event_id, time)
+
+	def on_counter_value(self, counter_id, time, counter_value):
+		self.on_counter_values_batch([counter_id], [time], [counter_value])
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		self._on_times(times)
+		for counter_id, time, counter_value in izip(counter_ids, times, counter_values):
+			if time > self._finish_time:
+				self._is_past_window = True
+			elif time >= self._start_time:
+				self._flush_counter_value(counter_id)
+				self._consumer.on_counter_value(counter_id, time, counter_value)
+			else:
+				self._pending_counter_values[counter_id] = [time, counter_value]
+
+_REGISTRATION_METHODS = { 'T': 'on_thread', 'F': 'on_function', 'V': 'on_event', 'C': 'on_counter' }
+
+def _replay_registration(consumer, record_type, args):
+	# labels are the last argument, see LABEL_ENCODING
+	args[-1] = args[-1].encode(LABEL_ENCODING)
+	getattr(consumer, _REGISTRATION_METHODS[record_type])(*args)
+
+def get_index_filename(filename):
+	return filename + INDEX_SUFFIX
+
+def build_index(filename, records_per_checkpoint = RECORDS_PER_CHECKPOINT):
+	""" index the checkpoints in a text profile file, and save the index alongside it """
+
+	builder = ProfileIndexBuilder()
+	parser = ProfileParser(builder)
+
+	offset = 0
+	remainder = ''
+	builder.add_checkpoint(offset)
+
+	with open(filename, "rb") as file:
+		while True:
+			block = file.read(INDEX_BLOCK_SIZE)
+			if not block:
+				break
+
+			# only feed complete lines, so that a checkpoint offset is always the start of a line
+			block = remainder + block
+			end = block.rfind('\n') + 1
+			remainder = block[end:]
+			parser.feed(block[:end])
+			offset += end
+
+			if builder.get_num_records() >= records_per_checkpoint:
+				builder.add_checkpoint(offset)
+
+		parser.feed(remainder)
+		parser.flush()
+
+	index = builder.get_index()
+	file_stat = os.stat(filename)
+	index['size'] = file_stat.st_size
+	index['mtime'] = file_stat.st_mtime
+
+	with open(get_index_filename(filename), "w") as index_file:
+		json.dump(index, index_file, encoding=LABEL_ENCODING)
+
+	return index
+
+def load_index(filename):
+	""" load the saved index for a text profile file, or return None if it is missing or out of date """
+
+	index_filename = get_index_filename(filename)
+	if not os.path.exists(index_filename):
+		return None
+
+	with open(index_filename, "r") as index_file:
+		index = json.load(index_file)
+
+	file_stat = os.stat(filename)
+	if (index.get('version') != INDEX_VERSION) or (index['size'] != file_stat.st_size) or (index['mtime'] != file_stat.st_mtime):
+		return None
+
+	return index
+
+def load_range(filename, start_time, finish_time, consumer):
+	""" load the samples, events and counter values that overlap [start_time, finish_time] from a text profile file
+	     - parsing starts from the last checkpoint before start_time, so the cost depends on the size of the window
+	     - parsing stops once a whole block of records is more than RANGE_TIME_MARGIN past finish_time, so the records
+	       of the window must be written within RANGE_TIME_MARGIN of the later records of any other thread """
+
+	if get_compression(filename):
+		raise ValueError("can't load a range from a compressed profile file")
+
+	index = load_index(filename)
+	if not index:
+		index = build_index(filename)
+
+	# find the last checkpoint where every record before it is earlier than start_time
+	checkpoints = index['checkpoints']
+	checkpoint_times = [checkpoint['time'] for checkpoint in checkpoints[1:]]
+	checkpoint_number = bisect.bisect_left(checkpoint_times, start_time)
+	checkpoint = checkpoints[checkpoint_number]
+
+	range_filter = ProfileRangeFilter(consumer, start_time, finish_time, checkpoint)
+	parser = ProfileParser(range_filter)
+
+	for registration in index['registrations']:
+		if registration[0] <= checkpoint_number:
+			_replay_registration(range_filter, registration[1], registration[2:])
+
+	with open(filename, "rb") as file:
+		file.seek(checkpoint['offset'])
+		while True:
+			block = file.read(INDEX_BLOCK_SIZE)
+			if not block:
+				parser.flush()
+				break
+			range_filter.start_block()
+			parser.feed(block)
+			if range_filter.is_block_past_window(RANGE_TIME_MARGIN):
+				break
+
+	range_filter.close()
+	finalize_consumer(consumer)
@@ -0,0 +1,216 @@
+import argparse
+import os
+import socket
+import threading
+import SocketServer
+
+from profileparser import ProfileParser, finalize_consumer
+
+# Note: maximum number of bytes received from a producer connection at a time
+#  - the lock on the profile data is held while each block is parsed, so this bounds how long the UI can wait for it
+INGEST_BLOCK_SIZE = 64 * 1024
+
+# Note: seconds between checks for a request to stop the server
+INGEST_POLL_INTERVAL = 0.1
+
+def parse_address(address):
+	""" convert 'host:port' to a TCP address, or any other string to the path of a UNIX domain socket """
+	(host, separator, port) = address.rpartition(':')
+	if separator and port.isdigit():
+		return (host or 'localhost', int(port))
+	return address
+
+def _is_unix_address(address):
+	return not isinstance(address, tuple)
+
+class _ConnectionConsumer:
+	""" consumer for the ProfileParser of one producer connection
+	     - each producer numbers its threads and counters from 0, so they are passed on
+	       with ids that are unique across every connection to the server """
+
+	def __init__(self, server, consumer):
+		self._server = server
+		self._consumer = consumer
+		self._thread_ids = {}
+		self._counter_ids = {}
+
+	def on_thread(self, thread_id, thread_label):
+		self._thread_ids[thread_id] = self._server._allocate_thread_id()
+		self._consumer.on_thread(self._thread_ids[thread_id], thread_label)
+
+	def on_function(self, thread_id, function_id, function_label):
+		self._consumer.on_function(self._thread_ids[thread_id], function_id, function_label)
+
+	def on_sample_start(self, thread_id, function_id, start_time):
+		self._consumer.on_sample_start(self._thread_ids[thread_id], function_id, start_time)
+
+	def on_sample_finish(self, thread_id, function_id, finish_time):
+		self._consumer.on_sample_finish(self._thread_ids[thread_id], function_id, finish_time)
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		thread_id_map = self._thread_ids
+		self._consumer.on_samples_batch(record_types, [thread_id_map[thread_id] for thread_id in thread_ids], function_ids, times)
+
+	def on_event(self, thread_id, event_id, event_label):
+		self._consumer.on_event(self._thread_ids[thread_id], event_id, event_label)
+
+	def on_event_emit(self, thread_id, event_id, time):
+		self._consumer.on_event_emit(self._thread_ids[thread_id], event_id, time)
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		thread_id_map = self._thread_ids
+		self._consumer.on_event_emits_batch([thread_id_map[thread_id] for thread_id in thread_ids], event_ids, times)
+
+	def on_counter(self, counter_id, counter_label):
+		self._counter_ids[counter_id] = self._server._allocate_counter_id()
+		self._consumer.on_counter(self._counter_ids[counter_id], counter_label)
+
+	def on_counter_value(self, counter_id, time, counter_value):
+		self._consumer.on_counter_value(self._counter_ids[counter_id], time, counter_value)
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		counter_id_map = self._counter_ids
+		self._consumer.on_counter_values_batch([counter_id_map[counter_id] for counter_id in counter_ids], times, counter_values)
+
+class _IngestRequestHandler(SocketServer.BaseRequestHandler):
+	def handle(self):
+		self.server.ingest_server._ingest(self.request)
+
+class _TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+if hasattr(socket, 'AF_UNIX'):
+	class _UnixStreamServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+		daemon_threads = True
+
+class ProfileIngestServer:
+	""" listen on a TCP or UNIX domain socket for producers that stream profile records, and parse them into a consumer
+	     - each connection is read and parsed on its own background thread
+	     - the consumer is only modified while the lock is held
+	     - a connection isn't read while the lock is held elsewhere, so a slow UI pushes back on the producers
+	       through the socket, instead of buffering their records in memory """
+
+	def __init__(self, address, consumer, lock):
+		self._address = address
+		self._consumer = consumer
+		self._lock = lock
+		self._has_new_data = False
+		self._num_threads = 0
+		self._num_counters = 0
+		self._server = None
+		self._server_thread = None
+		self._connections = set()
+
+	def start(self):
+		if _is_unix_address(self._address):
+			self._server = _UnixStreamServer(self._address, _IngestRequestHandler)
+		else:
+			self._server = _TCPServer(self._address, _IngestRequestHandler)
+		self._server.ingest_server = self
+
+		self._server_thread = threading.Thread(target=self._server.serve_forever, args=(INGEST_POLL_INTERVAL,), name="ProfileIngestServer")
+		self._server_thread.daemon = True
+		self._server_thread.start()
+
+	def stop(self):
+		if not self._server:
+			return
+
+		self._server.shutdown()
+		self._server.server_close()
+		self._server_thread.join()
+
+		# wake up the threads that are waiting for data from a producer
+		with self._lock:
+			for connection in self._connections:
+				try:
+					connection.shutdown(socket.SHUT_RDWR)
+				except socket.error:
+					pass
+
+		if _is_unix_address(self._address) and os.path.exists(self._address):
+			os.remove(self._address)
+
+		self._server = None
+
+	def get_address(self):
+		""" return the address that the server is listening on (i.e. the port that was chosen, when started with port 0) """
+		return self._server.server_address
+
+	def get_lock(self):
+		return self._lock
+
+	def has_new_data(self):
+		""" return True once after new data has been parsed into the consumer
+		     - call this while holding the lock """
+		has_new_data = self._has_new_data
+		self._has_new_data = False
+		return has_new_data
+
+	def _allocate_thread_id(self):
+		# called by _ConnectionConsumer, while the lock is held
+		thread_id = self._num_threads
+		self._num_threads += 1
+		return thread_id
+
+	def _allocate_counter_id(self):
+		counter_id = self._num_counters
+		self._num_counters += 1
+		return counter_id
+
+	def _ingest(self, connection):
+		""" parse the records streamed by a producer, until it closes the connection """
+		parser = ProfileParser(_ConnectionConsumer(self, self._consumer))
+
+		with self._lock:
+			self._connections.add(connection)
+
+		try:
+			while True:
+				block = connection.recv(INGEST_BLOCK_SIZE)
+				if not block:
+					break
+
+				with self._lock:
+					parser.feed(block)
+					finalize_consumer(self._consumer)
+					self._has_new_data = True
+
+			with self._lock:
+				parser.flush()
+				finalize_consumer(self._consumer)
+				self._has_new_data = True
+		finally:
+			with self._lock:
+				self._connections.discard(connection)
+
+def send_file(filename, address, block_size = INGEST_BLOCK_SIZE):
+	""" stream the records in a profile.txt file to an ingest server, as fast as it accepts them """
+
+	if _is_unix_address(address):
+		connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	else:
+		connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+	try:
+		connection.connect(address)
+		with open(filename, "rb") as file:
+			while True:
+				block = file.read(block_size)
+				if not block:
+					break
+				connection.sendall(block)
+	finally:
+		connection.close()
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Stream a profile.txt file to a visualiser that was started with --listen")
+	parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file')
+	parser.add_argument('--address', '-a', default='localhost:7878', help='host:port, or the path of a UNIX domain socket, that the visualiser is listening on')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	args = parse_args()
+	send_file(args.filename, parse_address(args.address))
@@ -0,0 +1,297 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import izip
+
+# Note: maximum number of buckets in the finest level of detail for a thread
+#  - each level of detail uses 12 bytes per bucket, for every call stack depth on the thread
+LOD_MAX_BUCKETS = 8192
+
+# Note: samples that are at least this many buckets long are listed individually in each level of detail,
+#       so that they can still be drawn with an outline and a label
+LOD_WIDE_SAMPLE_BUCKETS = 4
+
+# Note: the finest level of detail for a counter has about one bucket for this many of its samples
+#  - each level of detail uses 16 bytes per bucket
+COUNTER_LOD_SAMPLES_PER_BUCKET = 16
+
+def get_finest_bucket_duration(duration, max_buckets = LOD_MAX_BUCKETS):
+	""" return the duration of the buckets in level 0, for samples that span duration """
+	return 1 << max(0, int(math.ceil(math.log(max(1.0, float(duration)) / max_buckets, 2))))
+
+class ProfileLevelOfDetail:
+	""" multi-resolution summary of the finished samples on a thread, for rendering it zoomed out
+	     - level 0 splits the time on the thread into at most LOD_MAX_BUCKETS buckets, with a power of two duration,
+	       and each level above it has half as many buckets, that are twice as long
+	     - for each level, call stack depth and bucket it stores the time covered by samples, the function
+	       of the sample that covers the most time, and the number of samples that start in the bucket """
+
+	def __init__(self, thread_data):
+		self._origin = thread_data.get_start_time()
+		duration = max(1, thread_data.get_finish_time() - self._origin)
+		self._bucket_duration = get_finest_bucket_duration(duration)
+
+		# levels[level][depth] = (covered times, dominant functions, sample counts)
+		self._levels = []
+		# runs[level][depth] = (first bucket, end bucket) arrays of the runs of buckets that contain samples
+		self._runs = []
+		# wide_samples[level][depth] = (sample indices, start times, finish times) of samples that are at least LOD_WIDE_SAMPLE_BUCKETS long
+		self._wide_samples = []
+
+		num_buckets = int(-(-duration // self._bucket_duration))
+		depth_levels = [self._build_depth(thread_data, depth, num_buckets) for depth in xrange(thread_data.get_max_stack_depth())]
+
+		num_levels = len(depth_levels[0][0]) if depth_levels else 0
+		for level in xrange(num_levels):
+			self._levels.append([levels[level] for (levels, runs, wide_samples) in depth_levels])
+			self._runs.append([runs[level] for (levels, runs, wide_samples) in depth_levels])
+			self._wide_samples.append([wide_samples[level] for (levels, runs, wide_samples) in depth_levels])
+
+	def _build_depth(self, thread_data, depth, num_buckets):
+		""" build every level of detail for the samples at one call stack depth """
+
+		origin = self._origin
+		bucket_duration = self._bucket_duration
+		start_times = thread_data.get_sample_start_times()
+		finish_times = thread_data.get_sample_finish_times()
+		function_indices = thread_data.get_sample_function_indices()
+		ends = thread_data.get_sample_ends()
+
+		covered = array('f', [0.0]) * num_buckets
+		dominant_functions = array('i', [-1]) * num_buckets
+		dominant_times = array('f', [0.0]) * num_buckets
+		counts = array('i', [0]) * num_buckets
+
+		num_levels = (num_buckets - 1).bit_length() + 1
+		wide_samples = [(array('i'), array('d'), array('d')) for level in xrange(num_levels)]
+		min_wide_duration = LOD_WIDE_SAMPLE_BUCKETS * bucket_duration
+
+		for index in thread_data.get_depth_sample_indices(depth):
+			if not ends[index]:
+				# open samples aren't rendered until they finish
+				continue
+
+			start_time = start_times[index]
+			finish_time = finish_times[index]
+			function_index = function_indices[index]
+
+			# a sample that starts or finishes exactly at the finish of the thread is in the last bucket
+			first_bucket = min(num_buckets - 1, int((start_time - origin) // bucket_duration))
+			last_bucket = int((finish_time - origin) // bucket_duration)
+			if (last_bucket > first_bucket) and ((origin + (last_bucket * bucket_duration)) >= finish_time):
+				# the sample finishes exactly at the start of a bucket
+				last_bucket -= 1
+			last_bucket = min(num_buckets - 1, last_bucket)
+			counts[first_bucket] += 1
+
+			bucket_start_time = origin + (first_bucket * bucket_duration)
+			for bucket in xrange(first_bucket, last_bucket + 1):
+				overlap = min(finish_time, bucket_start_time + bucket_duration) - max(start_time, bucket_start_time)
+				covered[bucket] += overlap
+				if (dominant_functions[bucket] < 0) or (overlap > dominant_times[bucket]):
+					dominant_functions[bucket] = function_index
+					dominant_times[bucket] = overlap
+				bucket_start_time += bucket_duration
+
+			duration = finish_time - start_time
+			if duration >= min_wide_duration:
+				# list the sample in every level where it is at least LOD_WIDE_SAMPLE_BUCKETS long
+				max_level = min(num_levels - 1, int(math.log(duration / min_wide_duration, 2)))
+				for level in xrange(max_level + 1):
+					(indices, wide_start_times, wide_finish_times) = wide_samples[level]
+					indices.append(index)
+					wide_start_times.append(start_time)
+					wide_finish_times.append(finish_time)
+
+		levels = [(covered, dominant_functions, counts)]
+		runs = [self._find_runs(dominant_functions)]
+		while len(covered) > 1:
+			(covered, dominant_functions, dominant_times, counts) = self._build_next_level(covered, dominant_functions, dominant_times, counts)
+			levels.append((covered, dominant_functions, counts))
+			runs.append(self._find_runs(dominant_functions))
+
+		return (levels, runs, wide_samples[:len(levels)])
+
+	def _build_next_level(self, covered, dominant_functions, dominant_times, counts):
+		""" merge each pair of buckets in a level into one bucket """
+
+		num_buckets = (len(covered) + 1) // 2
+		next_covered = array('f', [0.0]) * num_buckets
+		next_dominant_functions = array('i', [-1]) * num_buckets
+		next_dominant_times = array('f', [0.0]) * num_buckets
+		next_counts = array('i', [0]) * num_buckets
+
+		for bucket in xrange(len(covered)):
+			next_bucket = bucket // 2
+			next_covered[next_bucket] += covered[bucket]
+			next_counts[next_bucket] += counts[bucket]
+			if (dominant_functions[bucket] >= 0) and ((next_dominant_functions[next_bucket] < 0) or (dominant_times[bucket] > next_dominant_times[next_bucket])):
+				next_dominant_functions[next_bucket] = dominant_functions[bucket]
+				next_dominant_times[next_bucket] = dominant_times[bucket]
+
+		return (next_covered, next_dominant_functions, next_dominant_times, next_counts)
+
+	def _find_runs(self, dominant_functions):
+		""" find the runs of buckets that contain at least one sample """
+
+		first_buckets = array('i')
+		end_buckets = array('i')
+		is_in_run = False
+		for bucket, function_index in enumerate(dominant_functions):
+			if (function_index >= 0) != is_in_run:
+				is_in_run = not is_in_run
+				if is_in_run:
+					first_buckets.append(bucket)
+				else:
+					end_buckets.append(bucket)
+		if is_in_run:
+			end_buckets.append(len(dominant_functions))
+
+		return (first_buckets, end_buckets)
+
+	def get_num_levels(self):
+		return len(self._levels)
+
+	def get_num_depths(self):
+		return len(self._levels[0]) if self._levels else 0
+
+	def get_bucket_duration(self, level):
+		return self._bucket_duration << level
+
+	def get_bucket_start_time(self, level, bucket):
+		return self._origin + (bucket * self.get_bucket_duration(level))
+
+	def get_level_for_time_per_pixel(self, time_per_pixel):
+		""" return the coarsest level with buckets that are no longer than one pixel, or None if every level is too coarse """
+
+		if (not self._levels) or (time_per_pixel < self._bucket_duration):
+			return None
+		level = int(math.log(time_per_pixel / self._bucket_duration, 2))
+		return min(level, len(self._levels) - 1)
+
+	def get_bucket(self, level, depth, bucket):
+		""" return (fraction of the bucket covered by samples, index of the dominant function or -1, number of samples that start in the bucket) """
+
+		(covered, dominant_functions, counts) = self._levels[level][depth]
+		return (covered[bucket] / self.get_bucket_duration(level), dominant_functions[bucket], counts[bucket])
+
+	def get_occupied_time_ranges(self, level, depth, start_time, finish_time):
+		""" return the (start time, finish time) of each run of buckets with samples, that overlaps [start_time, finish_time] """
+
+		(first_buckets, end_buckets) = self._runs[level][depth]
+		bucket_duration = self.get_bucket_duration(level)
+		first_bucket = int((start_time - self._origin) // bucket_duration)
+		last_bucket = int((finish_time - self._origin) // bucket_duration)
+
+		first = bisect_right(end_buckets, first_bucket)
+		last = bisect_right(first_buckets, last_bucket, first)
+		return [(self.get_bucket_start_time(level, first_buckets[run]), self.get_bucket_start_time(level, end_buckets[run])) for run in xrange(first, last)]
+
+	def get_wide_sample_indices(self, level, depth, start_time, finish_time):
+		""" return the indices of the samples that are at least LOD_WIDE_SAMPLE_BUCKETS long in a level, and overlap [start_time, finish_time] """
+
+		(indices, wide_start_times, wide_finish_times) = self._wide_samples[level][depth]
+		first = bisect_left(wide_finish_times, start_time)
+		last = bisect_right(wide_start_times, finish_time, first)
+		return indices[first:last]
+
+class CounterLevelOfDetail:
+	""" min/max/last envelopes of the values of a counter, at several resolutions
+	     - level 0 splits the time between the first and last samples into power of two buckets,
+	       with about COUNTER_LOD_SAMPLES_PER_BUCKET samples per bucket, and each level above it
+	       has half as many buckets, that are twice as long
+	     - for each level and bucket it stores the min, max and last values of the samples in the bucket,
+	       so that spikes are still visible when many samples are drawn in one pixel """
+
+	def __init__(self, counter_data):
+		times = counter_data.get_sample_times()
+		values = counter_data.get_sample_values()
+
+		self._num_samples = len(times)
+		self._origin = times[0]
+		duration = times[-1] - self._origin
+		self._bucket_duration = get_finest_bucket_duration(duration, max(1, len(times) // COUNTER_LOD_SAMPLES_PER_BUCKET))
+
+		num_buckets = int(duration // self._bucket_duration) + 1
+		mins = array(values.typecode, [0]) * num_buckets
+		maxs = array(values.typecode, [0]) * num_buckets
+		lasts = array(values.typecode, [0]) * num_buckets
+		counts = array('i', [0]) * num_buckets
+
+		origin = self._origin
+		bucket_duration = self._bucket_duration
+		for time, value in izip(times, values):
+			bucket = int((time - origin) // bucket_duration)
+			if counts[bucket]:
+				if value < mins[bucket]:
+					mins[bucket] = value
+				elif value > maxs[bucket]:
+					maxs[bucket] = value
+			else:
+				mins[bucket] = value
+				maxs[bucket] = value
+			lasts[bucket] = value
+			counts[bucket] += 1
+
+		# levels[level] = (mins, maxs, lasts, counts)
+		self._levels = [(mins, maxs, lasts, counts)]
+		while len(counts) > 1:
+			(mins, maxs, lasts, counts) = self._build_next_level(mins, maxs, lasts, counts)
+			self._levels.append((mins, maxs, lasts, counts))
+
+	def _build_next_level(self, mins, maxs, lasts, counts):
+		""" merge each pair of buckets in a level into one bucket """
+
+		num_buckets = (len(counts) + 1) // 2
+		next_mins = array(mins.typecode, [0]) * num_buckets
+		next_maxs = array(mins.typecode, [0]) * num_buckets
+		next_lasts = array(mins.typecode, [0]) * num_buckets
+		next_counts = array('i', [0]) * num_buckets
+
+		for bucket in xrange(len(counts)):
+			if not counts[bucket]:
+				continue
+
+			next_bucket = bucket // 2
+			if next_counts[next_bucket]:
+				next_mins[next_bucket] = min(next_mins[next_bucket], mins[bucket])
+				next_maxs[next_bucket] = max(next_maxs[next_bucket], maxs[bucket])
+			else:
+				next_mins[next_bucket] = mins[bucket]
+				next_maxs[next_bucket] = maxs[bucket]
+			next_lasts[next_bucket] = lasts[bucket]
+			next_counts[next_bucket] += counts[bucket]
+
+		return (next_mins, next_maxs, next_lasts, next_counts)
+
+	def get_num_samples(self):
+		""" return the number of samples that the level of detail was built from """
+		return self._num_samples
+
+	def get_num_levels(self):
+		return len(self._levels)
+
+	def get_bucket_duration(self, level):
+		return self._bucket_duration << level
+
+	def get_level_for_time_per_pixel(self, time_per_pixel):
+		""" return the coarsest level with buckets that are no longer than one pixel, or None if every level is too coarse """
+
+		if time_per_pixel < self._bucket_duration:
+			return None
+		level = int(math.log(time_per_pixel / self._bucket_duration, 2))
+		return min(level, len(self._levels) - 1)
+
+	def get_buckets(self, level, start_time, finish_time):
+		""" generate (start time, finish time, min value, max value, last value) for each bucket with samples, that overlaps [start_time, finish_time] """
+
+		(mins, maxs, lasts, counts) = self._levels[level]
+		bucket_duration = self.get_bucket_duration(level)
+		first_bucket = max(0, int((start_time - self._origin) // bucket_duration))
+		end_bucket = min(len(counts), int((finish_time - self._origin) // bucket_duration) + 1)
+
+		bucket_start_time = self._origin + (first_bucket * bucket_duration)
+		for bucket in xrange(first_bucket, end_bucket):
+			if counts[bucket]:
+				yield (bucket_start_time, bucket_start_time + bucket_duration, mins[bucket], maxs[bucket], lasts[bucket])
+			bucket_start_time += bucket_duration
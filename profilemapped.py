@@ -0,0 +1,195 @@
+import mmap
+import os
+import resource
+import shutil
+import struct
+import tempfile
+from array import array
+from itertools import islice
+
+# Note: size of the chunks that a MappedArray is written to its file in - the items after the last full chunk are kept in memory,
+#        so this is also the most memory that each array uses, apart from the pages of the file that are mapped in
+MAPPED_CHUNK_SIZE = 256 * 1024
+
+# Note: the scratch file grows by doubling, starting at this size
+MAPPED_FILE_MIN_SIZE = 64 * 1024 * 1024
+
+def get_resident_memory():
+	""" return the resident memory of this process in bytes, which includes the pages of mapped files that are in memory
+	     - reads /proc/self/statm where it exists (i.e. Linux), otherwise returns the peak resident memory """
+	try:
+		with open('/proc/self/statm') as statm_file:
+			return int(statm_file.read().split()[1]) * mmap.PAGESIZE
+	except (IOError, IndexError, ValueError):
+		peak_resident_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# Note: ru_maxrss is in kilobytes, except on OS X where it's in bytes
+		return peak_resident_memory if (os.uname()[0] == 'Darwin') else peak_resident_memory * 1024
+
+class MappedArrayStore:
+	""" creates MappedArrays, whose chunks are written to one memory mapped scratch file
+	     - the operating system pages the chunks in when they are read, and out again when memory is needed,
+	       so a profile can be much bigger than the memory of the machine
+	     - all of the arrays share one file and one mapping, so the number of arrays isn't limited by the number of open files
+	     - the scratch file is deleted by close() """
+
+	def __init__(self, scratch_dir = None):
+		self._dir = tempfile.mkdtemp(prefix='profile-', dir=scratch_dir)
+		self._file = open(os.path.join(self._dir, 'samples.bin'), 'w+b')
+		self._file.truncate(MAPPED_FILE_MIN_SIZE)
+		self._mmap = mmap.mmap(self._file.fileno(), MAPPED_FILE_MIN_SIZE)
+		self._used_size = 0
+
+	def new_array(self, typecode):
+		""" return an empty MappedArray - this has the same signature as array(typecode), so either can be used to create arrays """
+		return MappedArray(self, typecode)
+
+	def get_mmap(self):
+		return self._mmap
+
+	def get_mapped_size(self):
+		""" return the number of bytes of the scratch file that are used by chunks """
+		return self._used_size
+
+	def get_scratch_dir(self):
+		return self._dir
+
+	def write_chunk(self, data):
+		""" append a chunk to the scratch file, and return its offset """
+		offset = self._used_size
+		if offset + len(data) > len(self._mmap):
+			self._mmap.resize(max(offset + len(data), 2 * len(self._mmap)))
+		self._mmap[offset:offset + len(data)] = data
+		self._used_size += len(data)
+		return offset
+
+	def close(self):
+		self._mmap.close()
+		self._file.close()
+		shutil.rmtree(self._dir, ignore_errors=True)
+
+class MappedArray:
+	""" an array of numbers whose full chunks are stored in a MappedArrayStore's scratch file, and whose last chunk is kept in memory
+	     - has the parts of the interface of array that ThreadData and CounterData use, so it can replace their arrays
+	     - reading or writing an item in a chunk only pages in that part of the file, and iterating reads a chunk at a time """
+
+	def __init__(self, store, typecode):
+		self._store = store
+		# Note: mmap.resize() resizes the mapping in place, so the store's mmap can be kept
+		self._mmap = store.get_mmap()
+		self._tail = array(typecode)
+		self._struct = struct.Struct(typecode)
+		self._chunk_items = MAPPED_CHUNK_SIZE // self._tail.itemsize
+		# the file offset of each full chunk
+		self._chunks = []
+		self._num_chunk_items = 0
+
+		self.typecode = typecode
+		self.itemsize = self._tail.itemsize
+
+	def __len__(self):
+		return self._num_chunk_items + len(self._tail)
+
+	def _get_offset(self, index):
+		if not (0 <= index < self._num_chunk_items):
+			raise IndexError("array index out of range")
+		(chunk, position) = divmod(index, self._chunk_items)
+		return self._chunks[chunk] + (position * self.itemsize)
+
+	def _read_chunk(self, chunk):
+		offset = self._chunks[chunk]
+		items = array(self.typecode)
+		items.fromstring(self._mmap[offset:offset + (self._chunk_items * self.itemsize)])
+		return items
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			(start, stop, step) = index.indices(len(self))
+			if step != 1:
+				return array(self.typecode, [self[i] for i in xrange(start, stop, step)])
+			return self._read_range(start, stop)
+
+		if index < 0:
+			index += len(self)
+		# the most recent items are the ones that are read most while loading, so the tail is checked first
+		tail_index = index - self._num_chunk_items
+		if tail_index >= 0:
+			return self._tail[tail_index]
+		return self._struct.unpack_from(self._mmap, self._get_offset(index))[0]
+
+	def _read_range(self, start, stop):
+		""" return an array of the items in [start, stop) """
+		items = array(self.typecode)
+		chunk_items = self._chunk_items
+		index = start
+		while (index < stop) and (index < self._num_chunk_items):
+			(chunk, position) = divmod(index, chunk_items)
+			chunk_stop = min(stop, (chunk + 1) * chunk_items)
+			offset = self._chunks[chunk] + (position * self.itemsize)
+			items.fromstring(self._mmap[offset:offset + ((chunk_stop - index) * self.itemsize)])
+			index = chunk_stop
+		if index < stop:
+			items.extend(self._tail[index - self._num_chunk_items:stop - self._num_chunk_items])
+		return items
+
+	def __setitem__(self, index, value):
+		if index < 0:
+			index += len(self)
+		tail_index = index - self._num_chunk_items
+		if tail_index >= 0:
+			self._tail[tail_index] = value
+		else:
+			self._struct.pack_into(self._mmap, self._get_offset(index), value)
+
+	def __iter__(self):
+		for chunk in xrange(len(self._chunks)):
+			for item in self._read_chunk(chunk):
+				yield item
+		for item in self._tail:
+			yield item
+
+	def append(self, value):
+		tail = self._tail
+		tail.append(value)
+		if len(tail) == self._chunk_items:
+			self._write_tail()
+
+	def extend(self, items):
+		""" append items, which can be an array or any iterable - an iterable is read a chunk at a time, so it's never all kept in memory """
+		if isinstance(items, array):
+			self._tail.extend(items)
+			while len(self._tail) >= self._chunk_items:
+				self._write_tail()
+			return
+
+		items = iter(items)
+		while True:
+			tail = self._tail
+			tail.extend(islice(items, self._chunk_items - len(tail)))
+			if len(tail) < self._chunk_items:
+				break
+			self._write_tail()
+
+	def insert(self, index, value):
+		""" insert an item before index - this rewrites the items after it, so it should only be used near the end of the array """
+		if index >= self._num_chunk_items:
+			self._tail.insert(index - self._num_chunk_items, value)
+			if len(self._tail) == self._chunk_items:
+				self._write_tail()
+			return
+
+		# move the items after index along by one, from the last item backwards
+		last = self[-1]
+		for position in xrange(len(self) - 1, index, -1):
+			self[position] = self[position - 1]
+		self[index] = value
+		self.append(last)
+
+	def _write_tail(self):
+		""" write the first chunk of the tail to the scratch file, and keep the rest of the tail in memory """
+		chunk_items = self._chunk_items
+		self._chunks.append(self._store.write_chunk(self._tail[:chunk_items].tostring()))
+		self._num_chunk_items += chunk_items
+		self._tail = self._tail[chunk_items:]
+
+	def tostring(self):
+		return self[:].tostring()
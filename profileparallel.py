@@ -0,0 +1,93 @@
+import io
+import multiprocessing
+import os
+
+from profileparser import ProfileParser, BLOCK_SIZE, paused_gc, finalize_consumer
+from profilebinary import ProfileBinaryLoader, ProfileBinaryWriter
+from profilecompression import get_compression
+
+# Note: size of the byte ranges that a profile file is split into
+RANGE_SIZE = 16 * 1024 * 1024
+
+# Note: number of ranges that can be parsed ahead of the range being loaded, per process
+#  - this bounds the memory used by parsed ranges that are waiting to be loaded
+RANGES_IN_FLIGHT_PER_PROCESS = 2
+
+def split_file_into_ranges(filename, range_size = RANGE_SIZE):
+	""" split a file into (start, end) byte ranges, that each start at the beginning of a line """
+
+	file_size = os.path.getsize(filename)
+	ranges = []
+
+	with open(filename, "rb") as file:
+		start = 0
+		while start < file_size:
+			file.seek(start + range_size)
+			file.readline()
+			end = min(file.tell(), file_size)
+
+			ranges.append((start, end))
+			start = end
+
+	return ranges
+
+def parse_range(filename, start, end):
+	""" parse the lines in a byte range of a text profile file
+	     - returns the records encoded in the binary profile format, so they are compact to send between processes """
+
+	buffer = io.BytesIO()
+	writer = ProfileBinaryWriter(buffer)
+	parser = ProfileParser(writer)
+
+	with open(filename, "rb") as file:
+		file.seek(start)
+		remaining = end - start
+		while remaining > 0:
+			block = file.read(min(BLOCK_SIZE, remaining))
+			if not block:
+				break
+			remaining -= len(block)
+			parser.feed(block)
+		parser.flush()
+
+	writer.finish()
+	return buffer.getvalue()
+
+def _parse_range_task(args):
+	# multiprocessing can only call functions at the top level of a module
+	return parse_range(*args)
+
+def load_file_parallel(filename, consumer, num_processes = None, range_size = RANGE_SIZE):
+	""" parse a text profile file with a pool of processes, and load the records into consumer in file order
+	     - registrations, and samples that start and finish in different ranges, are resolved
+	       because the consumer receives every range in order """
+
+	if get_compression(filename):
+		# a compressed file can't be split into ranges
+		ProfileParser(consumer).load_file(filename)
+		return
+
+	num_processes = num_processes or multiprocessing.cpu_count()
+	ranges = split_file_into_ranges(filename, range_size)
+	loader = ProfileBinaryLoader(consumer)
+
+	pool = multiprocessing.Pool(num_processes)
+	try:
+		max_ranges_in_flight = num_processes * RANGES_IN_FLIGHT_PER_PROCESS
+		pending = []
+		next_range = 0
+
+		with paused_gc():
+			while (next_range < len(ranges)) or pending:
+				while (next_range < len(ranges)) and (len(pending) < max_ranges_in_flight):
+					(start, end) = ranges[next_range]
+					pending.append(pool.apply_async(_parse_range_task, [(filename, start, end)]))
+					next_range += 1
+
+				records = pending.pop(0).get()
+				loader.load_buffer(records)
+
+			finalize_consumer(consumer)
+	finally:
+		pool.terminate()
+		pool.join()
@@ -1,19 +1,171 @@
+import contextlib
+import gc
+import json
+import re
+
+from profilecompression import read_blocks
+
+# Note: number of bytes read from a profile file at a time by the bulk parser
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# a line that is not a S/E/Y/D record (i.e. registrations, comments or blank lines)
+#  - these lines are handled one at a time by the per-line parse() fallback
+_OTHER_LINE_PATTERN = re.compile(r'^[^SEYD\n].*$', re.M)
+
+_RECORD_TYPES = set(['S', 'E', 'Y', 'D'])
+
+# a run of records that can be passed to a consumer in one call, in a string with one character per record
+_RUN_PATTERN = re.compile(r'[SE]+|Y+|D+')
+
+# the characters of the integer fields of the records, joined with commas - json.loads would also accept floats, true or NaN
+_INTEGER_LIST_CHARACTERS = '0123456789-,'
+
+@contextlib.contextmanager
+def paused_gc():
+	""" pause the cyclic garbage collector while loading a profile
+	     - consumers allocate millions of long-lived objects, which makes the collector
+	       repeatedly rescan everything allocated so far """
+	gc_was_enabled = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if gc_was_enabled:
+			gc.enable()
+
+def finalize_consumer(consumer):
+	""" let a consumer compute the metrics that depend on every record, after a load has appended them (see ProfileData.finalize)
+	     - a consumer that only passes the records on doesn't have to implement finalize() """
+	if hasattr(consumer, 'finalize'):
+		consumer.finalize()
+
 class ProfileParser:
 
 	def __init__(self, consumer):
 		self._consumer = consumer
+		self._remainder = ''
+		self._line_number = 0
 
 	def load_file(self, filename):
-		with open(filename, "r") as file:
-			for line_number, line in enumerate(file):
-				try:
-					line = line.rstrip()
-					self.parse(line)
-				except Exception as e:
-					print "exception while parsing line ", line_number
-					print ">> line: [", line, "]"
-					print ">>", e
-					raise e
+		""" parse a profile file, which can be compressed with gzip, bz2 or xz """
+
+		if not hasattr(self._consumer, 'on_samples_batch'):
+			# consumer only implements the per-record interface
+			self._load_file_lines(filename)
+			finalize_consumer(self._consumer)
+			return
+
+		with paused_gc():
+			for block in read_blocks(filename, BLOCK_SIZE):
+				self.feed(block)
+
+			self.flush()
+			finalize_consumer(self._consumer)
+
+	def _load_file_lines(self, filename):
+		line_number = 0
+		remainder = ''
+		for block in read_blocks(filename, BLOCK_SIZE):
+			lines = (remainder + block).split('\n')
+			remainder = lines.pop()
+			for line in lines:
+				self._parse_line(line, line_number)
+				line_number += 1
+
+		if remainder:
+			self._parse_line(remainder, line_number)
+
+	def _parse_line(self, line, line_number):
+		try:
+			line = line.rstrip()
+			self.parse(line)
+		except Exception as e:
+			print "exception while parsing line ", line_number
+			print ">> line: [", line, "]"
+			print ">>", e
+			raise e
+
+	def feed(self, data):
+		""" parse a block of profile data, keeping any incomplete line at the end for the next call
+		    - S/E/Y/D records are passed to the consumer in batches, so it must implement
+		      on_samples_batch(), on_event_emits_batch() and on_counter_values_batch() """
+
+		data = self._remainder + data
+		end = data.rfind('\n')
+		if end < 0:
+			self._remainder = data
+			return
+
+		self._remainder = data[end+1:]
+		self._parse_block(data, 0, end)
+
+	def flush(self):
+		""" parse the incomplete line left over from the last call to feed() """
+
+		data = self._remainder
+		self._remainder = ''
+		if data:
+			self._parse_block(data, 0, len(data))
+
+	def _parse_block(self, block, start, end):
+		""" parse the complete lines in block[start:end] """
+
+		# tokenize runs of S/E/Y/D records in bulk, and fall back to parse() for any other line
+		position = start
+		for match in _OTHER_LINE_PATTERN.finditer(block, start, end):
+			self._parse_records(block, position, match.start() - 1)
+			self._parse_line(match.group(0), self._line_number + block.count('\n', start, match.start()))
+			position = match.end() + 1
+		self._parse_records(block, position, end)
+
+		self._line_number += block.count('\n', start, end) + 1
+
+	def _parse_records(self, block, start, end):
+		""" parse block[start:end], which only contains S/E/Y/D records, and pass them to the consumer in batches
+		     - each run of S/E records, Y records or D records is one batch, so the consumer gets the records in file order """
+
+		if start >= end:
+			return
+
+		# every line should be 'S|E|Y|D <integer> <integer> <integer>'
+		records_block = block[start:end]
+		tokens = records_block.split()
+		record_types = tokens[0::4]
+		record_types_string = ''.join(record_types)
+
+		try:
+			if (len(tokens) != 4 * (records_block.count('\n') + 1)) or not (set(record_types_string) <= _RECORD_TYPES):
+				raise ValueError("not a block of well formed records")
+
+			# json's C scanner converts a whole list of integers much faster than map(int, ...)
+			del tokens[0::4]
+			integers = ','.join(tokens)
+			if integers.translate(None, _INTEGER_LIST_CHARACTERS):
+				raise ValueError("not a block of well formed records")
+			values = json.loads('[' + integers + ']')
+			if len(values) != len(tokens):
+				raise ValueError("not a block of well formed records")
+		except ValueError:
+			# blank or malformed lines - parse one line at a time, to report errors against their line number
+			line_number = self._line_number + block.count('\n', 0, start)
+			for line in block[start:end].split('\n'):
+				self._parse_line(line, line_number)
+				line_number += 1
+			return
+
+		for match in _RUN_PATTERN.finditer(record_types_string):
+			(first, last) = match.span()
+			a = values[3*first:3*last:3]
+			b = values[(3*first)+1:3*last:3]
+			c = values[(3*first)+2:3*last:3]
+
+			record_type = record_types_string[first]
+			if record_type == 'Y':
+				self._consumer.on_event_emits_batch(a, b, c)
+			elif record_type == 'D':
+				self._consumer.on_counter_values_batch(a, b, c)
+			else:
+				self._consumer.on_samples_batch(record_types[first:last], a, b, c)
 
 	def parse(self, line):
 		if line.startswith('#'):
@@ -40,7 +192,7 @@ class ProfileParser:
 			self._consumer.on_function(thread_id, function_id, function_label)
 		elif line_type == 'S':
 			split_line = line.split(' ',3)
-			
+
 			thread_id = int(split_line[1])
 			function_id = int(split_line[2])
 			time = int(split_line[3])
@@ -48,7 +200,7 @@ class ProfileParser:
 			self._consumer.on_sample_start(thread_id, function_id, time)
 		elif line_type == 'E':
 			split_line = line.split(' ',3)
-			
+
 			thread_id = int(split_line[1])
 			function_id = int(split_line[2])
 			time = int(split_line[3])
@@ -64,7 +216,7 @@ class ProfileParser:
 			self._consumer.on_event(thread_id, event_id, event_label)
 		elif line_type == 'Y':
 			split_line = line.split(' ',3)
-			
+
 			thread_id = int(split_line[1])
 			event_id = int(split_line[2])
 			time = int(split_line[3])
@@ -72,14 +224,14 @@ class ProfileParser:
 			self._consumer.on_event_emit(thread_id, event_id, time)
 		elif line_type == 'C':
 			split_line = line.split(' ',2)
-			
+
 			counter_id = int(split_line[1])
 			counter_label = split_line[2]
 
 			self._consumer.on_counter(counter_id, counter_label)
 		elif line_type == 'D':
 			split_line = line.split(' ',3)
-			
+
 			counter_id = int(split_line[1])
 			time = int(split_line[2])
 			counter_value = int(split_line[3])
@@ -2,20 +2,35 @@ import pygtk
 pygtk.require('2.0')
 import gtk, gobject, cairo
 import argparse
+import atexit
 import json
+import math
+import threading
 
-from profilerender import ProfileRender
+from profilerender import ProfileRender, ProfileDiffRender
+from profileflamegraph import ProfileFlameGraphRender
 from profiledata import ProfileData
 from profileparser import ProfileParser
-
-# Note: Set this to true if you want to merge data for multiple threads that have the same name but
-#         run at different times.  
-#       This is useful when visualising a worker thread that repeatedly starts and stops
-MERGE_THREADS_WITH_SAME_NAME_AND_DIFFERENT_TIME_PERIODS = False
+from profilebinary import ProfileBinaryLoader, is_binary_profile
+from profileindex import load_range
+from profilefollow import ProfileFollower
+from profileingest import ProfileIngestServer, parse_address
+from profileparallel import load_file_parallel
+from profilesession import load_session
+from profilecache import ProfileCache
+from profilesearch import SampleQuery
+from profilemapped import MappedArrayStore, get_resident_memory
 
 # Note: Set this to true to report information from the parser at startup
 DEBUG_PARSER = False
 
+# Note: fraction of a frame's duration that is shown either side of it, when jumping to a slow frame or to a call that matches a search
+FRAME_MARGIN = 0.1
+
+# Note: milliseconds between checks for new data, when following a profile that is still being written,
+#        or listening for profile data from a producer
+LIVE_REDRAW_INTERVAL_MS = 100
+
 # Create a GTK+ widget on which we will draw using Cairo
 class ProfilerWindow(gtk.DrawingArea):
 
@@ -26,8 +41,31 @@ class ProfilerWindow(gtk.DrawingArea):
     def __init__(self, args):
         super(ProfilerWindow,self).__init__()
         
+        # the profile data is only modified by a ProfileFollower or ProfileIngestServer while this lock is held
+        self._profile_lock = threading.Lock()
+        self._live_profile_source = None
+
         self._init_profile_data(args)
 
+        # the window shows either the timeline, or a flame graph that is built the first time it is shown
+        self._timeline_render = self._profile_render
+        self._flame_graph_render = None
+        if args.utilization:
+            self._timeline_render.set_show_utilization(True)
+        if args.flame_graph:
+            self._show_flame_graph(True)
+
+        # the frames between emits of args.frame_event, and the rank of the slow frame that is shown
+        self._frame_event = args.frame_event
+        self._slow_frame_rank = -1
+
+        # the calls that match args.find are outlined, and the index of the match that is shown
+        self._sample_query = None
+        self._match_index = -1
+        if args.find:
+            self._sample_query = SampleQuery(args.find, min_duration = args.find_min_duration)
+            self._timeline_render.set_sample_query(self._sample_query)
+
         self._init_gtk()
 
         self._is_mouse_over = True
@@ -42,8 +80,11 @@ class ProfilerWindow(gtk.DrawingArea):
         self.connect("scroll-event", self.on_scroll_event)
         self.connect("enter_notify_event", self.on_enter_notify_event)
         self.connect("leave_notify_event", self.on_leave_notify_event)
+        self.connect("key_press_event", self.on_key_press_event)
 
+        self.set_flags(gtk.CAN_FOCUS)
         self.set_events( gtk.gdk.EXPOSURE_MASK
+                            | gtk.gdk.KEY_PRESS_MASK
                             | gtk.gdk.ENTER_NOTIFY_MASK
                             | gtk.gdk.LEAVE_NOTIFY_MASK
                             | gtk.gdk.BUTTON_PRESS_MASK
@@ -52,20 +93,197 @@ class ProfilerWindow(gtk.DrawingArea):
                             | gtk.gdk.POINTER_MOTION_HINT_MASK)
 
     def _init_profile_data(self, args):        
-        filename = args.filename
+        filename = args.filename[0]
+
+        profile_data = self._create_profile_data(args)
+        if args.follow or args.listen:
+            # samples are added to the profile data in the background, while the window is open
+            self._profile_render = ProfileRender( profile_data )
+            if args.listen:
+                self._live_profile_source = ProfileIngestServer(parse_address(args.listen), profile_data, self._profile_lock)
+            else:
+                self._live_profile_source = ProfileFollower(filename, profile_data, self._profile_lock)
+            self._live_profile_source.start()
+            gobject.timeout_add(LIVE_REDRAW_INTERVAL_MS, self.on_live_data_timer)
+            return
+
+        if len(args.filename) > 1:
+            profile_data = self._load_session(args)
+        else:
+            profile_data = self._load_cached_profile_data(args, filename)
 
-        profile_data = ProfileData()
-        profile_parser = ProfileParser(profile_data)
-        profile_parser.load_file(filename)        
+        if profile_data.get_array_store():
+            print "Resident memory: %.1fMB, scratch file: %.1fMB" % (get_resident_memory() / 1e6, profile_data.get_array_store().get_mapped_size() / 1e6)
 
         if DEBUG_PARSER:
             profile_data.debug_tty()
 
-        if MERGE_THREADS_WITH_SAME_NAME_AND_DIFFERENT_TIME_PERIODS:
+        if args.diff:
+            # show the baseline profile above this one, at the same times relative to the start of each profile
+            baseline_profile_data = self._load_cached_profile_data(args, args.diff)
+            self._profile_render = ProfileDiffRender( baseline_profile_data, profile_data, "Baseline: " + args.diff, "Candidate: " + ", ".join(args.filename) )
+        else:
+            self._profile_render = ProfileRender( profile_data )
+
+    def _create_profile_data(self, args):
+        if args.out_of_core == None:
+            return ProfileData()
+
+        # the scratch file is deleted when the visualiser exits
+        array_store = MappedArrayStore(args.out_of_core or None)
+        atexit.register(array_store.close)
+        return ProfileData(array_store)
+
+    def _load_session(self, args):
+        # the files of a session are parsed in parallel, so they aren't cached
+        profile_data = self._create_profile_data(args)
+        load_session(args.filename, profile_data, args.clock_offsets, args.sync_event)
+
+        if args.merge_restarted_threads:
+            profile_data.merge_restarted_threads()
+        return profile_data
+
+    def _load_cached_profile_data(self, args, filename):
+        # the cached profile data depends on how it was built
+        cache_options = (args.range, args.merge_restarted_threads)
+        # Note: cached profile data is loaded into memory, so it isn't used out-of-core
+        profile_cache = None if (args.no_cache or (args.out_of_core != None)) else ProfileCache()
+
+        cached_profile_data = profile_cache.load(filename, cache_options) if profile_cache else None
+        if cached_profile_data:
+            return cached_profile_data
+
+        profile_data = self._create_profile_data(args)
+        self._load_profile_data(args, filename, profile_data)
+        if profile_cache:
+            profile_cache.save(filename, profile_data, cache_options)
+        return profile_data
+
+    def _load_profile_data(self, args, filename, profile_data):
+        if args.range:
+            (start_time, finish_time) = args.range
+            load_range(filename, start_time, finish_time, profile_data)
+        else:
+            if is_binary_profile(filename):
+                ProfileBinaryLoader(profile_data).load_file(filename)
+            elif args.processes != 1:
+                load_file_parallel(filename, profile_data, args.processes)
+            else:
+                ProfileParser(profile_data).load_file(filename)
+
+        if args.merge_restarted_threads:
             profile_data.merge_restarted_threads()
 
-        self._profile_render = ProfileRender( profile_data )
+    def on_live_data_timer(self):
+        """ redraw the part of the window that is affected by data appended to the profile """
+
+        with self._profile_lock:
+            if self._live_profile_source.has_new_data():
+                redraw_area = self._timeline_render.on_profile_data_extended()
+                if self._profile_render is self._flame_graph_render:
+                    redraw_area = self._flame_graph_render.on_profile_data_extended()
+                else:
+                    # rebuilt when it's next shown
+                    self._flame_graph_render = None
+                if redraw_area and self.window:
+                    (x, width) = redraw_area
+                    self.queue_draw_area(int(x), 0, int(math.ceil(width)), self.allocation.height)
+
+        # keep the timer running
+        return True
+
+    def _show_flame_graph(self, show_flame_graph):
+        """ switch between the timeline and the flame graph """
+
+        if show_flame_graph:
+            with self._profile_lock:
+                if not self._flame_graph_render:
+                    self._flame_graph_render = ProfileFlameGraphRender(self._timeline_render.get_profile_data())
+            self._profile_render = self._flame_graph_render
+        else:
+            self._profile_render = self._timeline_render
+
+        if self.window:
+            self._profile_render.resize(*self.window.get_size())
+            self.queue_draw()
+
+    def _get_frames(self):
+        """ return the ProfileFrames for the frame event, on the first thread that has it, or None """
 
+        if not self._frame_event:
+            return None
+
+        profile_data = self._timeline_render.get_profile_data()
+        for thread_index in range(profile_data.get_num_threads()):
+            thread_data = profile_data.get_thread(thread_index)
+            event_index = thread_data.get_event_index(self._frame_event)
+            if event_index != None:
+                return thread_data.get_frames(event_index)
+        return None
+
+    def _show_slow_frame(self, rank_offset):
+        """ zoom the timeline to the next (or previous) slowest frame """
+
+        with self._profile_lock:
+            frames = self._get_frames()
+            if not frames or not frames.get_num_frames():
+                return
+
+            self._slow_frame_rank = max(0, min(frames.get_num_frames() - 1, self._slow_frame_rank + rank_offset))
+            index = frames.get_slowest_frame_indices(self._slow_frame_rank + 1)[-1]
+            start_time = frames.get_frame_start_time(index)
+            finish_time = frames.get_frame_finish_time(index)
+            margin = (finish_time - start_time) * FRAME_MARGIN
+
+            self._show_flame_graph(False)
+            self._timeline_render.show_time_range(start_time - margin, finish_time + margin)
+
+        self.get_toplevel().set_title("Profiler - frame %d: %.3fms (slowest frame #%d)" % (index, frames.get_frame_duration(index) / 1000.0, self._slow_frame_rank + 1))
+        self.queue_draw()
+
+    def _show_match(self, match_offset):
+        """ zoom the timeline to the next (or previous) call that matches the search, in start order """
+
+        with self._profile_lock:
+            if not self._sample_query:
+                return
+            samples = self._sample_query.find_samples(self._timeline_render.get_profile_data())
+            if not samples:
+                return
+
+            self._match_index = max(0, min(len(samples) - 1, self._match_index + match_offset))
+            sample = samples[self._match_index]
+
+            self._show_flame_graph(False)
+            self._timeline_render.show_sample(sample, FRAME_MARGIN)
+
+        self.get_toplevel().set_title("Profiler - %s: %.3fms (match %d of %d)" % (sample.get_function().get_label(), sample.get_duration() / 1000.0, self._match_index + 1, len(samples)))
+        self.queue_draw()
+
+    def on_key_press_event(self, widget, event):
+        """ key is pressed """
+
+        key_name = gtk.gdk.keyval_name(event.keyval)
+        if key_name in ['g', 'G']:
+            self._show_flame_graph(self._profile_render is self._timeline_render)
+        elif key_name == 'f':
+            self._show_slow_frame(1)
+        elif key_name == 'F':
+            self._show_slow_frame(-1)
+        elif key_name == 'n':
+            self._show_match(1)
+        elif key_name == 'N':
+            self._show_match(-1)
+        elif key_name in ['u', 'U']:
+            self._timeline_render.set_show_utilization(not self._timeline_render.get_show_utilization())
+            self.queue_draw()
+        elif key_name == 'a':
+            profile_data = self._timeline_render.get_profile_data()
+            self._timeline_render.show_time_range(profile_data.get_start_time(), profile_data.get_finish_time())
+            self._slow_frame_rank = -1
+            self._match_index = -1
+            self.get_toplevel().set_title("Profiler")
+            self.queue_draw()
 
     def on_motion_notify_event(self, widget, event):
         """ mouse is moved """
@@ -119,6 +337,7 @@ class ProfilerWindow(gtk.DrawingArea):
     
     def on_enter_notify_event(self, widget, event):
         self._is_mouse_over = True
+        self.grab_focus()
         x = event.x
         y = event.y
         self._last_xy = (x,y)
@@ -137,7 +356,8 @@ class ProfilerWindow(gtk.DrawingArea):
                 event.area.width, event.area.height)
         cr.clip()
 
-        self._profile_render.render(cr)
+        with self._profile_lock:
+            self._profile_render.render(cr)
 
         if self._is_mouse_over and self._last_xy:
             self._profile_render.render_pointer(cr, self._last_xy)
@@ -160,11 +380,34 @@ def run( widget ):
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Function Profiler")
-    parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file')
+    parser.add_argument('--filename', '-f', default=['profile.txt'], nargs='+', help='file path to profile.txt file, or a binary profile file - several files (i.e. written by each process of a product) are loaded as one session, where the labels of their threads and counters start with the file path')
+    clock_group = parser.add_mutually_exclusive_group()
+    clock_group.add_argument('--clock-offsets', type=int, nargs='+', metavar='OFFSET', help='time to add to the clock of each file of a session')
+    clock_group.add_argument('--sync-event', metavar='LABEL', help='label of an event that every process emits at the same moment, to align the clocks of the files of a session on its first emit')
+    parser.add_argument('--flame-graph', '-g', action='store_true', help='start by showing a flame graph of the merged call paths on every thread, instead of the timeline (press g to switch between them)')
+    parser.add_argument('--frame-event', '-e', metavar='LABEL', help='label of the event that is emitted at the start of each frame (i.e. "Frame Start") - press f / F to jump to the next / previous slowest frame, and a to show the whole profile')
+    parser.add_argument('--find', '-n', metavar='PATTERN', help='outline the calls of the functions whose labels match a regular expression - press n / N to jump to the next / previous call, and a to show the whole profile')
+    parser.add_argument('--find-min-duration', type=int, metavar='DURATION', help='only outline the calls found with --find that took at least this long')
+    parser.add_argument('--merge-restarted-threads', '-m', action='store_true', help='merge threads that have the same name but run at different times, i.e. a worker thread that repeatedly starts and stops')
+    parser.add_argument('--diff', '-d', metavar='BASELINE_FILENAME', help='show the timeline of a baseline profile above the profile, at the same times relative to the start of each profile, to compare them')
+    parser.add_argument('--follow', action='store_true', help='keep reading data that is appended to the profile.txt file while the visualiser is open')
+    parser.add_argument('--listen', '-l', metavar='ADDRESS', help='listen on host:port, or the path of a UNIX domain socket, for profile data streamed by profileingest.py or the profiler')
+    parser.add_argument('--no-cache', action='store_true', help='always parse the profile file, instead of loading the profile data that was cached the last time it was opened')
+    parser.add_argument('--out-of-core', '-o', nargs='?', const='', metavar='SCRATCH_DIR', help='keep the samples, events and counter values in a memory mapped scratch file (in SCRATCH_DIR, or the temporary directory), for profiles that are too large to load into memory')
+    parser.add_argument('--processes', '-p', type=int, default=1, help='number of processes to parse a profile.txt file with, or 0 to use one per cpu')
+    parser.add_argument('--range', '-r', type=int, nargs=2, metavar=('START_TIME', 'FINISH_TIME'), help='only load the samples between two clock times, using an index saved alongside a profile.txt file')
+    parser.add_argument('--utilization', '-u', action='store_true', help='show a row of the number of threads that are active over time, above the threads (press u to show or hide it)')
     args = parser.parse_args()
+    if (len(args.filename) > 1) and (args.follow or args.listen or args.range):
+        parser.error("--follow, --listen and --range only work with one file")
+    if args.clock_offsets and (len(args.clock_offsets) != len(args.filename)):
+        parser.error("--clock-offsets needs one offset for each file")
     return args
 
 if __name__ == "__main__":
+    # allow ProfileFollower and ProfileIngestServer to run their background threads alongside the gtk main loop
+    gobject.threads_init()
+
     args = parse_args()
     profiler_window = ProfilerWindow(args)
 
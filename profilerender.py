@@ -1,9 +1,17 @@
 import cairo
 import colorsys
+import math
+
+from profilelod import get_finest_bucket_duration
+from profiletilecache import TileCache, TILE_WIDTH, TILE_HEIGHT
 
 TITLE_HEIGHT = 25
 EVENT_LABEL_HEIGHT = 20
 SAMPLE_HEIGHT = 40
+
+# Note: samples that are narrower than this, in pixels, are drawn without an outline or a label
+#  - this must not be more than profilelod.LOD_WIDE_SAMPLE_BUCKETS
+SAMPLE_MIN_OUTLINE_WIDTH = 4
 COLOUR_BLACK = (0.1,0.1,0.1)
 COLOUR_WHITE = (1,1,1)
 
@@ -22,6 +30,25 @@ EVENT_LABEL_OFFSET_Y = 1
 
 COUNTER_ROW_HEIGHT = 100
 
+# Note: colour of the outline of the samples that match a search, and the width of the outline of the selected match
+COLOUR_MATCH = (1.0, 0.4, 0.0)
+MATCH_LINE_WIDTH = 1
+SELECTED_MATCH_LINE_WIDTH = 4
+
+# Note: colour of the line between the baseline and the candidate profile, when they are rendered one above the other
+COLOUR_DIFF_DIVIDER = (0.8, 0.1, 0.1)
+
+# Note: most pixels that the label of an event is drawn across, to the right of the event
+EVENT_LABEL_MAX_WIDTH = 300
+
+# Note: pixels either side of a tile that the timeline it's drawn from extends across
+#  - samples that cross the edge of a tile are drawn at the same x co-ords in each tile, so their outlines and labels line up,
+#    unless they start or finish further away than this. Cairo can't draw co-ords past about 8 million pixels
+TILE_MARGIN_WIDTH = 100000
+
+# Note: pixels around a tile that samples are drawn from, so that the outlines of samples just outside it are drawn in it
+TILE_OVERLAP_WIDTH = SELECTED_MATCH_LINE_WIDTH
+
 class RenderContext:
 	def __init__(self, cr, width, height, start_time, finish_time, offset_x, offset_y):
 		self.cr = cr
@@ -33,6 +60,25 @@ class RenderContext:
 		self.offset_y = offset_y
 		self._duration = max(0.001, float(finish_time - start_time))
 
+		# the time that the profile finishes, which the last value of a counter is drawn up to
+		self.end_time = finish_time
+
+		# only the times inside the area that is being redrawn need to be rendered
+		(clip_x1, clip_y1, clip_x2, clip_y2) = cr.clip_extents()
+		self.set_visible_x_range(clip_x1, clip_x2)
+		self.set_visible_y_range(clip_y1, clip_y2)
+
+	def set_visible_x_range(self, x1, x2):
+		""" only render the times between two x co-ords, and the events whose labels reach them """
+		self.visible_start_time = self.get_time_at_x(x1)
+		self.visible_finish_time = self.get_time_at_x(x2)
+		self.visible_event_start_time = self.get_time_at_x(x1 - EVENT_LABEL_MAX_WIDTH)
+
+	def set_visible_y_range(self, y1, y2):
+		""" only render the call stack depths between two y co-ords """
+		self.visible_top_y = y1
+		self.visible_bottom_y = y2
+
 	def get_x_for_time(self, time):
 		if time <= self.start_time:
 			return 0
@@ -41,19 +87,30 @@ class RenderContext:
 		else:
 			return (time-self.start_time) * self.width / self._duration
 
-	def is_sample_visible(self, sample):
-		return not((sample.get_finish_time() < self.start_time) or (sample.get_start_time() > self.finish_time))
+	def get_time_per_pixel(self):
+		return self._duration / max(1.0, self.width)
 
-	def is_sample_off_right_of_screen(self, sample):
-		return sample.get_start_time() > self.finish_time
+	def get_time_at_x(self, x):
+		if x <= 0:
+			return self.start_time
+		elif x >= self.width:
+			return self.finish_time
+		else:
+			return self.start_time + (x * self._duration / self.width)
+
+	def is_sample_visible(self, start_time, finish_time):
+		return not((finish_time < self.visible_start_time) or (start_time > self.visible_finish_time))
+
+	def is_sample_off_right_of_screen(self, start_time):
+		return start_time > self.visible_finish_time
 	
 	def is_event_visible(self, event_sample):
 		time = event_sample.get_time()
-		return (time > self.start_time) and (time < self.finish_time)
+		return (time > self.visible_event_start_time) and (time < self.visible_finish_time)
 	
 	def is_event_off_right_of_screen(self, event_sample):
 		time = event_sample.get_time()
-		return (time > self.finish_time)
+		return (time > self.visible_finish_time)
 
 def render_text(cr, label, font_size, x, y, width = None):
 	# render label using x,y as top-left co-ords
@@ -70,15 +127,28 @@ def render_text(cr, label, font_size, x, y, width = None):
 
 	return (label_width, label_height)
 
-def render_sample(render_context, sample, y):
-	if not render_context.is_sample_visible(sample):
-		return not render_context.is_sample_off_right_of_screen(sample)
+def get_text_width(cr, label, font_size):
+	cr.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+	cr.set_font_size(font_size)
+	return cr.text_extents(label)[2]
+
+def get_visible_depth_range(top_y, bottom_y, y, num_depths):
+	""" return (first, end) call stack depths of the samples drawn from y down, that overlap [top_y, bottom_y] """
+	first = int((top_y - y) // SAMPLE_HEIGHT)
+	end = int(math.ceil((bottom_y - y) / float(SAMPLE_HEIGHT)))
+	return (max(0, first), max(0, min(num_depths, end)))
+
+def render_sample(render_context, thread_data, index, y):
+	""" render the sample at index in thread_data, and its children """
+
+	start_time = thread_data.get_sample_start_time(index)
+	finish_time = thread_data.get_sample_finish_time(index)
+
+	if not render_context.is_sample_visible(start_time, finish_time):
+		return not render_context.is_sample_off_right_of_screen(start_time)
 
 	cr = render_context.cr
 
-	start_time = sample.get_start_time()
-	finish_time = sample.get_finish_time()
-	
 	start_x = render_context.get_x_for_time(start_time)
 	finish_x = render_context.get_x_for_time(finish_time)
 
@@ -87,41 +157,82 @@ def render_sample(render_context, sample, y):
 	# make sure we always render at least something for a sample
 	width = max(width,0.5)
 
-	if width < 4:
+	if width < SAMPLE_MIN_OUTLINE_WIDTH:
 		# filled rectangle for this sample + all its' children
-		call_stack_depth = sample.get_child_call_stack_depth() + 1
+		call_stack_depth = thread_data.get_sample_child_call_stack_depth(index) + 1
 		
 		cr.set_source_rgb(*render_context.sample_colour)
 		cr.rectangle(start_x,y, width, SAMPLE_HEIGHT * call_stack_depth)
 		cr.fill()
 	else:
-		# filled rectangle
-		cr.set_source_rgb(*render_context.sample_colour)
-		cr.rectangle(start_x,y, width, SAMPLE_HEIGHT)
-		cr.fill()
+		if (y + SAMPLE_HEIGHT) >= render_context.visible_top_y:
+			render_sample_box(render_context, thread_data, index, start_x, width, y)
+
+		# recursive calls, for the children that overlap the area being redrawn
+		if (y + SAMPLE_HEIGHT) > render_context.visible_bottom_y:
+			return True
+		child_depth = thread_data.get_sample_call_stack_depth(index) + 1
+		for child_index in thread_data.get_sample_indices_in_range(child_depth, render_context.visible_start_time, render_context.visible_finish_time, index):
+			if not render_sample( render_context, thread_data, child_index, y+SAMPLE_HEIGHT):
+				return False
 
-		# black outline
-		cr.set_source_rgb(*COLOUR_BLACK)
-		cr.rectangle(start_x,y, width, SAMPLE_HEIGHT)
-		cr.stroke()
+	return True
 
-		if width > 10:
-			# function name
-			label = sample.get_function().get_label()
-			render_text(cr, label, TEXT_SIZE_LABEL, start_x, y, width)
+def render_sample_box(render_context, thread_data, index, start_x, width, y):
+	""" render a sample that is wide enough to have an outline, and maybe a label """
 
-			duration = sample.get_duration()
-			
-			duration_label = '%.3fms' % ( sample.get_duration() / 1000.0 )
-			render_text(cr, duration_label, TEXT_SIZE_DURATION, start_x, y + TEXT_LABEL_DURATION_OFFSET_Y, width)
+	cr = render_context.cr
 
-		# recursive calls
-		children = sample.get_children()
-		for child in children:
-			if not render_sample( render_context, child, y+SAMPLE_HEIGHT):
-				return False
+	# filled rectangle
+	cr.set_source_rgb(*render_context.sample_colour)
+	cr.rectangle(start_x,y, width, SAMPLE_HEIGHT)
+	cr.fill()
 
-	return True
+	# black outline
+	cr.set_source_rgb(*COLOUR_BLACK)
+	cr.rectangle(start_x,y, width, SAMPLE_HEIGHT)
+	cr.stroke()
+
+	if width > 10:
+		render_sample_labels(cr, get_sample_labels(thread_data, index), start_x, width, y)
+
+def get_sample_labels(thread_data, index):
+	""" return the function name and duration labels of a sample """
+	duration = thread_data.get_sample_duration(index)
+	return (thread_data.get_sample_function(index).get_label(), '%.3fms' % ( duration / 1000.0 ))
+
+def render_sample_labels(cr, labels, start_x, width, y):
+	""" render the labels of a sample that are narrower than its width """
+	(label, duration_label) = labels
+	render_text(cr, label, TEXT_SIZE_LABEL, start_x, y, width)
+	render_text(cr, duration_label, TEXT_SIZE_DURATION, start_x, y + TEXT_LABEL_DURATION_OFFSET_Y, width)
+
+def render_level_of_detail(render_context, thread_data, level_of_detail, level, y):
+	""" render the samples on a thread from a level of detail, when they are too small to render one at a time
+	     - each call stack depth is drawn as the runs of buckets that contain samples, with the samples
+	       that are wide enough to outline drawn on top """
+
+	cr = render_context.cr
+	visible_start_time = render_context.visible_start_time
+	visible_finish_time = render_context.visible_finish_time
+	min_outline_duration = SAMPLE_MIN_OUTLINE_WIDTH * render_context.get_time_per_pixel()
+
+	(first_depth, end_depth) = get_visible_depth_range(render_context.visible_top_y, render_context.visible_bottom_y, y, level_of_detail.get_num_depths())
+	for depth in xrange(first_depth, end_depth):
+		depth_y = y + (depth * SAMPLE_HEIGHT)
+
+		cr.set_source_rgb(*render_context.sample_colour)
+		for (start_time, finish_time) in level_of_detail.get_occupied_time_ranges(level, depth, visible_start_time, visible_finish_time):
+			start_x = render_context.get_x_for_time(start_time)
+			width = max(render_context.get_x_for_time(finish_time) - start_x, 0.5)
+			cr.rectangle(start_x, depth_y, width, SAMPLE_HEIGHT)
+		cr.fill()
+
+		for index in level_of_detail.get_wide_sample_indices(level, depth, visible_start_time, visible_finish_time):
+			if thread_data.get_sample_duration(index) >= min_outline_duration:
+				start_x = render_context.get_x_for_time(thread_data.get_sample_start_time(index))
+				width = render_context.get_x_for_time(thread_data.get_sample_finish_time(index)) - start_x
+				render_sample_box(render_context, thread_data, index, start_x, width, depth_y)
 
 def render_event(render_context, event_sample, y, height):
 	if not render_context.is_event_visible(event_sample):
@@ -169,60 +280,119 @@ class ProfileRenderCounter:
 		cr.rectangle(0, 0, render_context.width, self._height)
 		cr.fill()
 
-		# render title
-		title = "Counter: " + counter_data.get_label()
-		cr.set_source_rgb(*COLOUR_BLACK)
-		render_text(cr, title, TEXT_SIZE_TITLE, 0, 0)
-
-		# render values		
-		samples = counter_data.get_samples()		
-		if len(samples) > 0:		
+		# render values
+		if counter_data.get_num_samples() > 0:
 			cr.set_source_rgb(*self._colour)
 
 			max_value = counter_data.get_max_value()
 			min_value = counter_data.get_min_value()
-			y_scale = float(COUNTER_ROW_HEIGHT) / (max_value-min_value)
-			min_value_height = -min_value * y_scale
+			y_scale = float(COUNTER_ROW_HEIGHT) / max(1, max_value-min_value)
+			zero_y = COUNTER_ROW_HEIGHT + (min_value * y_scale)
 
 			cr.translate(0, TITLE_HEIGHT)
-			
-			def render_sample(cr, last_x, x, value):
-				value_height = float(value) * y_scale
-				if value >= 0:
-					cr.rectangle(last_x, COUNTER_ROW_HEIGHT - min_value_height - value_height, 1+x-last_x, value_height)
-				else:
-					value_height = -value_height
-					cr.rectangle(last_x, COUNTER_ROW_HEIGHT - min_value_height, 1+x-last_x, value_height)
-				cr.fill()				
-
-			last_sample = samples[0]
-
-			for sample in samples:
-				last_x = render_context.get_x_for_time(last_sample.get_time())
-				x = render_context.get_x_for_time(sample.get_time())
-				value = last_sample.get_value()
-
-				render_sample(cr, last_x, x, value)				
-
-				last_sample = sample
-
-			end_x = render_context.get_x_for_time(render_context.finish_time)
 
-			# render the last sample
-			last_x = render_context.get_x_for_time(last_sample.get_time())
-			value = last_sample.get_value()
-			render_sample(cr, last_x, end_x, value)
+			end_x = render_context.get_x_for_time(render_context.end_time)
+			for (start_x, finish_x, low_value, high_value) in self._get_column_spans(render_context, end_x):
+				# each column is filled between the x-axis and the furthest values from it, as if every sample were drawn
+				low_value = min(0, low_value)
+				high_value = max(0, high_value)
+				cr.rectangle(start_x, zero_y - (high_value * y_scale), finish_x - start_x, (high_value - low_value) * y_scale)
+			cr.fill()
 			
 			# render the x-axis
-			line_y = COUNTER_ROW_HEIGHT - min_value_height
 			cr.set_line_width(1)
-			cr.move_to(0, line_y)
-			cr.line_to(end_x, line_y)
+			cr.move_to(0, zero_y)
+			cr.line_to(end_x, zero_y)
 			cr.stroke()
+
+	def render_overlay(self, render_context):
+		""" render the parts of the row that stay at the left of the window, on top of its tiles """
+		title = "Counter: " + self._counter_data.get_label()
+		render_context.cr.set_source_rgb(*COLOUR_BLACK)
+		render_text(render_context.cr, title, TEXT_SIZE_TITLE, 0, 0)
+
+	def _get_column_spans(self, render_context, end_x):
+		""" return (start x, finish x, min value, max value) for runs of pixel columns that have the same span of values
+		     - when many samples are in each column, they are read from the counter's level of detail,
+		       instead of one sample at a time """
+
+		counter_data = self._counter_data
+		times = counter_data.get_sample_times()
+		values = counter_data.get_sample_values()
+		visible_start_time = render_context.visible_start_time
+		visible_finish_time = render_context.visible_finish_time
+
+		# cells are (start time, finish time, min value, max value, last value) of a sample, or a bucket of samples
+		level_of_detail = counter_data.get_level_of_detail()
+		level = level_of_detail.get_level_for_time_per_pixel(render_context.get_time_per_pixel())
+		if level != None:
+			# start with the bucket that has the value in effect at the left of the area being redrawn
+			first_time = times[max(0, counter_data.get_sample_index_at_time(visible_start_time))]
+			cells = level_of_detail.get_buckets(level, first_time, visible_finish_time)
+		else:
+			(first, end) = counter_data.get_sample_index_range(visible_start_time, visible_finish_time)
+			cells = ((times[index], times[index], values[index], values[index], values[index]) for index in xrange(first, end))
+
+		spans = []
+		def add_span(start_x, finish_x, low_value, high_value):
+			if finish_x <= start_x:
+				return
+			if spans and (spans[-1][1] == start_x) and (spans[-1][2] == low_value) and (spans[-1][3] == high_value):
+				spans[-1] = (spans[-1][0], finish_x, low_value, high_value)
+			else:
+				spans.append((start_x, finish_x, low_value, high_value))
+
+		column = None
+		low_value = high_value = last_value = None
+		for (start_time, finish_time, cell_min_value, cell_max_value, cell_last_value) in cells:
+			first_x = int(render_context.get_x_for_time(start_time))
+			last_x = max(first_x, int(math.ceil(render_context.get_x_for_time(finish_time))) - 1)
+
+			if first_x != column:
+				if column != None:
+					add_span(column, column + 1, low_value, high_value)
+					# the columns up to this cell only have the previous value
+					add_span(column + 1, first_x, last_value, last_value)
+					low_value = high_value = last_value
+				column = first_x
+
+			if (low_value == None) or (cell_min_value < low_value):
+				low_value = cell_min_value
+			if (high_value == None) or (cell_max_value > high_value):
+				high_value = cell_max_value
+
+			if last_x != column:
+				# a bucket that is in more than one column could have any of its values in each of them
+				add_span(column, column + 1, low_value, high_value)
+				add_span(column + 1, last_x, cell_min_value, cell_max_value)
+				column = last_x
+				low_value = cell_min_value
+				high_value = cell_max_value
+
+			last_value = cell_last_value
+
+		if column != None:
+			add_span(column, column + 1, low_value, high_value)
+			# the last value lasts until the end of the profile
+			add_span(column + 1, end_x, last_value, last_value)
+
+		return spans
 	
 	def get_height(self):
 		return self._height
 
+class ProfileRenderUtilization(ProfileRenderCounter):
+	""" the number of active threads over time (see ProfileUtilization), drawn as a counter
+	     - the profile data rebuilds its utilization when more samples are loaded, so the counter is looked up each time it's drawn """
+
+	def __init__(self, profile_data, colour, background_colour):
+		ProfileRenderCounter.__init__(self, profile_data.get_utilization().get_counter_data(), colour, background_colour)
+		self._profile_data = profile_data
+
+	def render(self, render_context):
+		self._counter_data = self._profile_data.get_utilization().get_counter_data()
+		ProfileRenderCounter.render(self, render_context)
+
 class ProfileRenderThread:
 
 	def __init__(self, thread_data, colour, background_colour):
@@ -239,39 +409,132 @@ class ProfileRenderThread:
 		cr.rectangle(0, 0, render_context.width, self._height)
 		cr.fill()
 
-		# render title
-		title = "Thread: " + self._thread_data.get_label()
-		cr.set_source_rgb(*COLOUR_BLACK)
-		render_text(cr, title, TEXT_SIZE_TITLE, 0, 0)
-
 		# render samples
 		render_context.sample_colour = self._colour
 		
-		samples = self._thread_data.get_samples()
-		for sample in samples:
-			if not render_sample(render_context, sample, TITLE_HEIGHT + EVENT_LABEL_HEIGHT):
-				break
+		thread_data = self._thread_data
+		samples_y = TITLE_HEIGHT + EVENT_LABEL_HEIGHT
+		(level_of_detail, level) = self._get_level_of_detail(render_context)
+		if level_of_detail:
+			render_level_of_detail(render_context, thread_data, level_of_detail, level, samples_y)
+		else:
+			for index in thread_data.get_sample_indices_in_range(0, render_context.visible_start_time, render_context.visible_finish_time):
+				if not render_sample(render_context, thread_data, index, samples_y):
+					break
 		
-		# render events
-		event_samples = self._thread_data.get_event_samples()
+		# render events, that are in the area being redrawn
 		event_height = self.get_height()
-		for event_sample in event_samples:
-			if not render_event(render_context, event_sample, TITLE_HEIGHT, event_height):
-				break			
+		visible_finish_time = render_context.visible_finish_time
+		(index, end) = thread_data.get_event_sample_index_range(render_context.visible_event_start_time, visible_finish_time)
+		while index < end:
+			event_sample = thread_data.get_event_sample(index)
+			render_event(render_context, event_sample, TITLE_HEIGHT, event_height)
+
+			# only one event is drawn in each pixel column, so skip to the first event in the next column
+			next_x = math.floor(render_context.get_x_for_time(event_sample.get_time())) + 1
+			(next_index, end) = thread_data.get_event_sample_index_range(render_context.get_time_at_x(next_x), visible_finish_time)
+			index = max(index + 1, next_index)
+
+		if render_context.sample_query:
+			self._render_matches(render_context, samples_y)
+
+	def render_overlay(self, render_context):
+		""" render the parts of the row that stay at the left of the window, on top of its tiles
+		     - the tiles label each sample at its start, so the samples that started before the left of the window
+		       are labelled again at the left of the window """
+
+		cr = render_context.cr
+		title = "Thread: " + self._thread_data.get_label()
+		cr.set_source_rgb(*COLOUR_BLACK)
+		render_text(cr, title, TEXT_SIZE_TITLE, 0, 0)
+
+		thread_data = self._thread_data
+		start_time = render_context.start_time
+		(clip_x1, clip_y1, clip_x2, clip_y2) = cr.clip_extents()
+		(first_depth, end_depth) = get_visible_depth_range(clip_y1, clip_y2, TITLE_HEIGHT + EVENT_LABEL_HEIGHT, thread_data.get_max_stack_depth())
+		for depth in xrange(first_depth, end_depth):
+			for index in thread_data.get_sample_indices_in_range(depth, start_time, start_time):
+				width = render_context.get_x_for_time(thread_data.get_sample_finish_time(index))
+				if (thread_data.get_sample_start_time(index) >= start_time) or (width <= 10):
+					continue
+
+				# cover the end of the label that the tile drew, inside the outline of the sample
+				y = TITLE_HEIGHT + EVENT_LABEL_HEIGHT + (depth * SAMPLE_HEIGHT)
+				labels = get_sample_labels(thread_data, index)
+				label_width = max(get_text_width(cr, labels[0], TEXT_SIZE_LABEL), get_text_width(cr, labels[1], TEXT_SIZE_DURATION))
+				cr.set_source_rgb(*self._colour)
+				cr.rectangle(0, y + 1, min(width - 1, label_width + (2 * LABEL_X_OFFSET)), SAMPLE_HEIGHT - 2)
+				cr.fill()
+
+				cr.set_source_rgb(*COLOUR_BLACK)
+				render_sample_labels(cr, labels, 0, width, y)
+
+	def _render_matches(self, render_context, y):
+		""" outline the samples that match the search, that are in the area being redrawn """
+
+		cr = render_context.cr
+		thread_data = self._thread_data
+		cr.set_source_rgb(*COLOUR_MATCH)
+		cr.set_line_width(MATCH_LINE_WIDTH)
+
+		# only one match is outlined in each pixel column at each call stack depth
+		outlined_columns = set()
+		(first_depth, end_depth) = get_visible_depth_range(render_context.visible_top_y, render_context.visible_bottom_y, y, thread_data.get_max_stack_depth())
+		for index in render_context.sample_query.find_thread_sample_indices(thread_data, render_context.visible_start_time, render_context.visible_finish_time):
+			depth = thread_data.get_sample_call_stack_depth(index)
+			if (depth < first_depth) or (depth >= end_depth):
+				continue
+			start_x = render_context.get_x_for_time(thread_data.get_sample_start_time(index))
+			if (depth, int(start_x)) in outlined_columns:
+				continue
+			outlined_columns.add((depth, int(start_x)))
+
+			width = max(render_context.get_x_for_time(thread_data.get_sample_finish_time(index)) - start_x, 1)
+			cr.rectangle(start_x, y + (depth * SAMPLE_HEIGHT), width, SAMPLE_HEIGHT)
+			cr.stroke()
+
+		selected_sample = render_context.selected_sample
+		if selected_sample and (selected_sample.get_thread() is thread_data):
+			start_x = render_context.get_x_for_time(selected_sample.get_start_time())
+			width = max(render_context.get_x_for_time(selected_sample.get_finish_time()) - start_x, 1)
+			cr.set_line_width(SELECTED_MATCH_LINE_WIDTH)
+			cr.rectangle(start_x, y + (selected_sample.get_call_stack_depth() * SAMPLE_HEIGHT), width, SAMPLE_HEIGHT)
+			cr.stroke()
+
+	def _get_level_of_detail(self, render_context):
+		""" return (level of detail, level) to render the samples with, or (None, None) to render them one at a time """
+
+		thread_data = self._thread_data
+		if thread_data.get_finish_time() == None:
+			return (None, None)
+
+		# only build the level of detail once the view is zoomed out far enough to use it
+		time_per_pixel = render_context.get_time_per_pixel()
+		if time_per_pixel < get_finest_bucket_duration(thread_data.get_finish_time() - thread_data.get_start_time()):
+			return (None, None)
+
+		level_of_detail = thread_data.get_level_of_detail()
+		level = level_of_detail.get_level_for_time_per_pixel(time_per_pixel)
+		if level == None:
+			return (None, None)
+		return (level_of_detail, level)
 
 	def get_height(self):
 		""" return the height of this thread on screen, in pixels """
 		return self._height
 
+	def get_thread_data(self):
+		return self._thread_data
+
 class ProfileRenderObjects:
 
-	def __init__(self, profile_data):
+	def __init__(self, profile_data, show_utilization = False):
 		self._counters = []
 		self._threads = []
 
 		num_counters = profile_data.get_num_counters()
 		num_threads = profile_data.get_num_threads()
-		num_rows = num_counters + num_threads
+		num_rows = num_counters + num_threads + (1 if show_utilization else 0)
 
 		row_index_mutable = [0]
 		def get_row_colours():
@@ -286,6 +549,11 @@ class ProfileRenderObjects:
 			(background_colour, colour) = get_row_colours()			
 			render_counter = ProfileRenderCounter(counter_data, colour, background_colour)
 			self._counters.append( render_counter )
+
+		if show_utilization:
+			# the number of active threads is drawn after the counters, above the threads
+			(background_colour, colour) = get_row_colours()
+			self._counters.append( ProfileRenderUtilization(profile_data, colour, background_colour) )
 		 				
 		for i in range(num_threads):
 			thread_data = profile_data.get_thread(i)
@@ -303,52 +571,75 @@ class ProfileRenderObjects:
 		cr.rectangle(0, 0, render_context.width, render_context.height)
 		cr.fill()
 
-	def render(self, render_context):		
+	def render(self, render_context, tile_cache):
+		""" render the rows from the tiles in tile_cache, rendering the tiles that aren't cached, then the titles on top
+		     - the tiles at the zoom level of the window are copied to it, lined up to whole pixels, so panning only renders
+		       the tiles that come into view """
+
 		cr = render_context.cr
 		self._render_background(render_context)
-		self._render_counters(render_context)
-		self._render_threads(render_context)
 
-	def _render_counters(self, render_context):
-		cr = render_context.cr
-		offset_x = render_context.offset_x
-		offset_y = render_context.offset_y
+		# the pixel column at the left of the window, counting from time 0 at the zoom level
+		zoom_level = tile_cache.get_zoom_level(render_context.get_time_per_pixel())
+		origin_x = int(round(render_context.start_time / zoom_level))
+
+		(clip_x1, clip_y1, clip_x2, clip_y2) = cr.clip_extents()
+		first_tile_x = (origin_x + int(math.floor(clip_x1))) // TILE_WIDTH
+		end_tile_x = ((origin_x + int(math.ceil(clip_x2)) - 1) // TILE_WIDTH) + 1
 
-		for render_counter in self._counters:
+		offset_y = render_context.offset_y
+		for row_index, render_row in enumerate(self._counters + self._threads):
 			if offset_y > render_context.height:
 				break
-			
-			if (offset_y + render_counter.get_height()) > 0:
+
+			row_height = render_row.get_height()
+			if (offset_y + row_height) > 0:
+				# only the tiles of the row that overlap the area being redrawn
+				first_tile_y = max(0, int(math.floor(clip_y1 - offset_y)) // TILE_HEIGHT)
+				end_tile_y = min(-(-row_height // TILE_HEIGHT), (int(math.ceil(clip_y2 - offset_y)) - 1) // TILE_HEIGHT + 1)
+
+				for tile_y in xrange(first_tile_y, end_tile_y):
+					for tile_x in xrange(first_tile_x, end_tile_x):
+						tile = tile_cache.get_tile(row_index, zoom_level, tile_x, tile_y)
+						if tile == None:
+							tile = self._render_tile(render_context, render_row, zoom_level, tile_x, tile_y)
+							tile_cache.add_tile(row_index, zoom_level, tile_x, tile_y, tile, tile.get_stride() * tile.get_height())
+
+						x = (tile_x * TILE_WIDTH) - origin_x
+						y = offset_y + (tile_y * TILE_HEIGHT)
+						cr.set_source_surface(tile, x, y)
+						cr.rectangle(x, y, TILE_WIDTH, tile.get_height())
+						cr.fill()
+
 				cr.save()
-				cr.translate(offset_x,offset_y)
-				render_counter.render(render_context)
+				cr.translate(0, offset_y)
+				render_row.render_overlay(render_context)
 				cr.restore()
 
-			offset_y += render_counter.get_height()
+			offset_y += row_height
 
-		render_context.offset_x = offset_x
-		render_context.offset_y = offset_y
+	def _render_tile(self, render_context, render_row, zoom_level, tile_x, tile_y):
+		""" render the TILE_WIDTH x TILE_HEIGHT pixels of a row at (tile_x, tile_y), to a new surface """
 
-	def _render_threads(self, render_context):
-		cr = render_context.cr
-		offset_x = render_context.offset_x
-		offset_y = render_context.offset_y
+		row_height = render_row.get_height()
+		top_y = tile_y * TILE_HEIGHT
+		surface = cairo.ImageSurface(cairo.FORMAT_RGB24, TILE_WIDTH, min(TILE_HEIGHT, row_height - top_y))
+		cr = cairo.Context(surface)
+		cr.translate(-TILE_MARGIN_WIDTH, -top_y)
 
-		for render_thread in self._threads:
-			if offset_y > render_context.height:
-				break
+		# the tile is the middle of a timeline that is TILE_MARGIN_WIDTH wider on each side
+		start_x = (tile_x * TILE_WIDTH) - TILE_MARGIN_WIDTH
+		width = TILE_WIDTH + (2 * TILE_MARGIN_WIDTH)
+		tile_context = RenderContext(cr, width, row_height, start_x * zoom_level, (start_x + width) * zoom_level, 0, 0)
+		tile_context.set_visible_x_range(TILE_MARGIN_WIDTH - TILE_OVERLAP_WIDTH, TILE_MARGIN_WIDTH + TILE_WIDTH + TILE_OVERLAP_WIDTH)
+		tile_context.set_visible_y_range(top_y - TILE_OVERLAP_WIDTH, top_y + TILE_HEIGHT + TILE_OVERLAP_WIDTH)
+		tile_context.end_time = render_context.end_time
+		tile_context.sample_query = render_context.sample_query
+		tile_context.selected_sample = render_context.selected_sample
 
-			if (offset_y + render_thread.get_height()) > 0:
-				cr.save()
-				cr.translate(offset_x,offset_y)
-				render_thread.render(render_context)
-				cr.restore()
+		render_row.render(tile_context)
+		return surface
 
-			offset_y += render_thread.get_height()
-		
-		render_context.offset_x = offset_x
-		render_context.offset_y = offset_y
-	
 	def _calculate_render_height(self):
 		# get the combined height of all the render counters & threads
 		render_height = 0
@@ -364,6 +655,16 @@ class ProfileRenderObjects:
 	def get_render_height(self):
 		return self._render_height
 
+	def get_sample_y(self, sample):
+		""" return the y co-ord of the top of a sample, relative to the top of the first row, or None if its thread isn't rendered """
+
+		y = sum(render_counter.get_height() for render_counter in self._counters)
+		for render_thread in self._threads:
+			if render_thread.get_thread_data() is sample.get_thread():
+				return y + TITLE_HEIGHT + EVENT_LABEL_HEIGHT + (sample.get_call_stack_depth() * SAMPLE_HEIGHT)
+			y += render_thread.get_height()
+		return None
+
 class ProfileRender:
 	""" Render the data for a profiling session """
 
@@ -372,7 +673,12 @@ class ProfileRender:
 		self._height = 0.0
 		self._profile_data = profile_data
 
+		self._show_utilization = False
 		self._profile_data_objects = ProfileRenderObjects(profile_data)
+		self._row_layout = self._get_row_layout()
+
+		# the tiles of the rows that have been rendered, which are dropped whenever what they show changes
+		self._tile_cache = TileCache()
 		
 		self._offset_y = 0
 						
@@ -380,15 +686,67 @@ class ProfileRender:
 		self._start_time = profile_data.get_start_time()
 		self._finish_time = profile_data.get_finish_time()
 
+		self._profile_finish_time = profile_data.get_finish_time()
+		self._extended_from_time = self._get_extended_from_time()
+
+		# the SampleQuery whose matches are outlined, and the match that is selected
+		self._sample_query = None
+		self._selected_sample = None
+
+	def get_profile_data(self):
+		return self._profile_data
+
+	def set_sample_query(self, sample_query):
+		""" outline the samples that match a SampleQuery, or nothing if sample_query is None """
+		self._sample_query = sample_query
+		self._selected_sample = None
+		self._tile_cache.clear()
+
+	def set_show_utilization(self, show_utilization):
+		""" show or hide the row of the number of active threads over time """
+		self._show_utilization = show_utilization
+		self._profile_data_objects = ProfileRenderObjects(self._profile_data, show_utilization)
+		self._row_layout = self._get_row_layout()
+		self._tile_cache.clear()
+		self._validate_viewport()
+
+	def get_show_utilization(self):
+		return self._show_utilization
+
+	def show_sample(self, sample, margin):
+		""" select a sample, and zoom to show it with margin times its duration either side of it, scrolling to its thread """
+
+		self._selected_sample = sample
+		self._tile_cache.clear()
+		sample_margin = sample.get_duration() * margin
+		self.show_time_range(sample.get_start_time() - sample_margin, sample.get_finish_time() + sample_margin)
+
+		sample_y = self._profile_data_objects.get_sample_y(sample)
+		if sample_y != None:
+			self._offset_y = (self._height / 2) - sample_y
+			self._validate_viewport()
+
 	def render(self, cr):								
+		if self._start_time == None:
+			# there are no samples to render yet
+			cr.set_source_rgb(1.0, 1.0, 1.0)
+			cr.paint()
+			return
+
 		offset_y = self._offset_y
 		offset_x = 0
 
 		render_context = RenderContext( cr, self._width, self._height, self._start_time, self._finish_time, offset_x, offset_y)
+		render_context.end_time = self._profile_data.get_finish_time()
+		render_context.sample_query = self._sample_query
+		render_context.selected_sample = self._selected_sample
 		
-		self._profile_data_objects.render(render_context )
+		self._profile_data_objects.render(render_context, self._tile_cache)
 
 	def render_pointer(self, cr, pointer):
+		if self._start_time == None:
+			return
+
 		(x,y) = pointer
 		t = self._get_time_at_x(x)
 		
@@ -403,7 +761,74 @@ class ProfileRender:
 
 		self._validate_viewport()
 
+	def on_profile_data_extended(self):
+		""" update after more data has been added to the profile data (i.e. while following a live profile)
+		     - returns the range of x co-ords that need to be redrawn as (x, width), or None """
+
+		profile_start_time = self._profile_data.get_start_time()
+		profile_finish_time = self._profile_data.get_finish_time()
+		if profile_finish_time == None:
+			return None
+
+		redraw_all = False
+
+		row_layout = self._get_row_layout()
+		if row_layout != self._row_layout:
+			# new threads / counters, or a change to the height or scale of a row
+			self._profile_data_objects = ProfileRenderObjects(self._profile_data, self._show_utilization)
+			self._row_layout = row_layout
+			self._tile_cache.clear()
+			redraw_all = True
+
+		if self._start_time == None:
+			# these are the first samples
+			self._start_time = profile_start_time
+			self._finish_time = profile_finish_time
+			redraw_all = True
+		elif self._finish_time >= self._profile_finish_time:
+			# the window is showing the end of the profile, so keep showing the end
+			self._finish_time = profile_finish_time
+			redraw_all = True
+
+		# only samples that were still open, and anything after the previous end of the profile, can have changed
+		extended_from_time = self._extended_from_time
+		self._profile_finish_time = profile_finish_time
+		self._extended_from_time = self._get_extended_from_time()
+		if extended_from_time != None:
+			self._tile_cache.invalidate_after(extended_from_time)
+
+		self._validate_viewport()
+
+		if redraw_all:
+			return (0, self._width)
+
+		if extended_from_time > self._finish_time:
+			return None
+
+		x = self._get_x_for_time(extended_from_time)
+		return (x, self._width - x)
+
+	def _get_extended_from_time(self):
+		# the earliest time that can change when more data is added to the profile
+		finish_time = self._profile_data.get_finish_time()
+		open_sample_start_time = self._profile_data.get_open_sample_start_time()
+		if open_sample_start_time != None:
+			return min(finish_time, open_sample_start_time)
+		return finish_time
+
+	def _get_row_layout(self):
+		# everything that affects the height or scale of each row
+		profile_data = self._profile_data
+		counters = [profile_data.get_counter(i) for i in range(profile_data.get_num_counters())]
+		threads = [profile_data.get_thread(i) for i in range(profile_data.get_num_threads())]
+		if self._show_utilization:
+			counters.append(profile_data.get_utilization().get_counter_data())
+		return ([(counter.get_min_value(), counter.get_max_value()) for counter in counters], [thread.get_max_stack_depth() for thread in threads])
+
 	def pan_by(self, dx, dy):
+		if self._start_time == None:
+			return
+
 		dt = self._get_dt_for_dx( dx )
 
 		if dt > 0:
@@ -418,7 +843,26 @@ class ProfileRender:
 
 		self._validate_viewport()	
 
+	def get_time_range(self):
+		""" return the times at the left and right edges of the window as (start_time, finish_time), or None if there are no samples yet """
+		if self._start_time == None:
+			return None
+		return (self._start_time, self._finish_time)
+
+	def show_time_range(self, start_time, finish_time):
+		""" zoom to show the times between start_time and finish_time across the window """
+		if self._start_time == None:
+			return
+
+		self._start_time = start_time
+		self._finish_time = finish_time
+
+		self._validate_viewport()
+
 	def scale_at(self, scale_factor, x, y):
+		if self._start_time == None:
+			return
+
 		x = float(x)
 
 		x_time = self._get_time_at_x(x)
@@ -437,6 +881,15 @@ class ProfileRender:
 			duration = self._finish_time - self._start_time
 			return ((x/self._width) * duration) + self._start_time
 
+	def _get_x_for_time(self, time):
+		if time <= self._start_time:
+			return 0
+		elif time >= self._finish_time:
+			return self._width
+		else:
+			duration = self._finish_time - self._start_time
+			return ((time - self._start_time) * self._width) / duration
+
 	def _get_dt_for_dx(self, dx):
 		time_per_pixel = (self._finish_time - self._start_time) / self._width
 		dt = dx * time_per_pixel
@@ -463,3 +916,106 @@ class ProfileRender:
 
 		offset_y = min(0, offset_y)
 		self._offset_y = offset_y
+
+class ProfileDiffRender:
+	""" Render the timelines of a baseline and a candidate profile, one above the other
+	     - both timelines show the same times relative to the start of their profile, so panning or zooming moves both
+	     - has the same interface as ProfileRender, so that the window can switch between them """
+
+	def __init__(self, baseline_profile_data, candidate_profile_data, baseline_title = "Baseline", candidate_title = "Candidate"):
+		self._width = 0.0
+		self._height = 0.0
+		self._renders = [ProfileRender(baseline_profile_data), ProfileRender(candidate_profile_data)]
+		self._titles = [baseline_title, candidate_title]
+
+	def get_profile_data(self):
+		""" return the candidate profile data """
+		return self._renders[1].get_profile_data()
+
+	def set_sample_query(self, sample_query):
+		""" outline the samples in the candidate profile that match a SampleQuery """
+		self._renders[1].set_sample_query(sample_query)
+
+	def set_show_utilization(self, show_utilization):
+		for profile_render in self._renders:
+			profile_render.set_show_utilization(show_utilization)
+
+	def get_show_utilization(self):
+		return self._renders[1].get_show_utilization()
+
+	def show_sample(self, sample, margin):
+		""" select a sample in the candidate profile, and zoom both profiles to it """
+		self._renders[1].show_sample(sample, margin)
+		self._sync_time_ranges()
+
+	def render(self, cr):
+		half_height = self._height / 2
+
+		for index, profile_render in enumerate(self._renders):
+			cr.save()
+			cr.translate(0, index * half_height)
+			cr.rectangle(0, 0, self._width, half_height)
+			cr.clip()
+			profile_render.render(cr)
+			cr.restore()
+
+		cr.set_source_rgb(*COLOUR_DIFF_DIVIDER)
+		cr.set_line_width(2)
+		cr.move_to(0, half_height)
+		cr.line_to(self._width, half_height)
+		cr.stroke()
+
+		# label each half in its top right corner
+		cr.set_font_size(TEXT_SIZE_TITLE)
+		for index, title in enumerate(self._titles):
+			title_width = cr.text_extents(title)[2]
+			render_text(cr, title, TEXT_SIZE_TITLE, self._width - title_width - (2 * LABEL_X_OFFSET), index * half_height)
+
+	def render_pointer(self, cr, pointer):
+		(x,y) = pointer
+		half_height = self._height / 2
+
+		for index, profile_render in enumerate(self._renders):
+			cr.save()
+			cr.translate(0, index * half_height)
+			profile_render.render_pointer(cr, (x, y - (index * half_height)))
+			cr.restore()
+
+	def resize(self, width, height):
+		self._width = float(width)
+		self._height = float(height)
+
+		for profile_render in self._renders:
+			profile_render.resize(width, height / 2)
+		self._sync_time_ranges()
+
+	def on_profile_data_extended(self):
+		for profile_render in self._renders:
+			profile_render.on_profile_data_extended()
+		return (0, self._width)
+
+	def pan_by(self, dx, dy):
+		for profile_render in self._renders:
+			profile_render.pan_by(dx, dy)
+		self._sync_time_ranges()
+
+	def show_time_range(self, start_time, finish_time):
+		""" zoom to show the times between start_time and finish_time, in the candidate profile """
+		self._renders[1].show_time_range(start_time, finish_time)
+		self._sync_time_ranges()
+
+	def scale_at(self, scale_factor, x, y):
+		self._renders[1].scale_at(scale_factor, x, y)
+		self._sync_time_ranges()
+
+	def _sync_time_ranges(self):
+		# show the same times in the baseline, relative to the start of each profile
+		(baseline_render, candidate_render) = self._renders
+		time_range = candidate_render.get_time_range()
+		baseline_start_time = baseline_render.get_profile_data().get_start_time()
+		candidate_start_time = candidate_render.get_profile_data().get_start_time()
+		if (time_range == None) or (baseline_start_time == None):
+			return
+
+		offset = baseline_start_time - candidate_start_time
+		baseline_render.show_time_range(time_range[0] + offset, time_range[1] + offset)
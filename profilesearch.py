@@ -0,0 +1,203 @@
+import argparse
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import izip
+
+class ProfileFunctionCallIndex:
+	""" the finished samples of each function on a thread, sorted by start time and by duration
+	     - calls that overlap a time window, or that are in a range of durations, are found with binary searches,
+	       so the cost only depends on the number of calls that are returned
+	     - the calls of a function in a time window are found using the latest finish time of the calls before each call,
+	       so the only extra calls that are checked are recursive calls, inside a call of the same function that overlaps the window """
+
+	def __init__(self, thread_data):
+		num_functions = thread_data.get_num_functions()
+		start_times = thread_data.get_sample_start_times()
+		finish_times = thread_data.get_sample_finish_times()
+
+		# sample indices of the finished calls of each function, in start order
+		call_indices = [array('i') for function_index in xrange(num_functions)]
+		for index, function_index, end in izip(xrange(len(start_times)), thread_data.get_sample_function_indices(), thread_data.get_sample_ends()):
+			if end:
+				call_indices[function_index].append(index)
+
+		self._call_indices = call_indices
+		self._call_start_times = []
+		self._call_max_finish_times = []
+		self._slowest_call_indices = []
+		self._sorted_durations = []
+
+		for indices in call_indices:
+			call_start_times = array(start_times.typecode, [start_times[index] for index in indices])
+			call_finish_times = [finish_times[index] for index in indices]
+
+			# the latest finish time of the calls up to each call, which only increases, so it can be searched
+			call_max_finish_times = array(finish_times.typecode, call_finish_times)
+			for position in xrange(1, len(call_max_finish_times)):
+				if call_max_finish_times[position] < call_max_finish_times[position - 1]:
+					call_max_finish_times[position] = call_max_finish_times[position - 1]
+
+			durations = [finish_time - start_time for start_time, finish_time in izip(call_start_times, call_finish_times)]
+			positions = sorted(xrange(len(durations)), key=durations.__getitem__)
+
+			self._call_start_times.append(call_start_times)
+			self._call_max_finish_times.append(call_max_finish_times)
+			self._slowest_call_indices.append(array('i', [indices[position] for position in reversed(positions)]))
+			self._sorted_durations.append(array(start_times.typecode, [durations[position] for position in positions]))
+
+		self._start_times = start_times
+		self._finish_times = finish_times
+
+	def get_num_calls(self, function_index):
+		return len(self._call_indices[function_index])
+
+	def get_call_indices(self, function_index):
+		""" return the array of the sample indices of a function's finished calls, in start order - this must not be modified """
+		return self._call_indices[function_index]
+
+	def get_slowest_call_indices(self, function_index, num_calls = None):
+		""" return the sample indices of a function's slowest calls, from the slowest to the fastest """
+		return self._slowest_call_indices[function_index][:num_calls]
+
+	def find_calls(self, function_index, start_time = None, finish_time = None, min_duration = None, max_duration = None):
+		""" return the sample indices of a function's calls that overlap [start_time, finish_time],
+		    and whose duration is in [min_duration, max_duration], in start order
+		     - the time window and the durations are each found with a binary search, and the calls in the smaller of the two
+		       ranges are checked against the other filter """
+
+		call_indices = self._call_indices[function_index]
+
+		# the calls that could overlap the time window
+		first = 0 if start_time == None else bisect_left(self._call_max_finish_times[function_index], start_time)
+		end = len(call_indices) if finish_time == None else bisect_right(self._call_start_times[function_index], finish_time, first)
+
+		# the calls in the range of durations
+		sorted_durations = self._sorted_durations[function_index]
+		duration_first = 0 if min_duration == None else bisect_left(sorted_durations, min_duration)
+		duration_end = len(sorted_durations) if max_duration == None else bisect_right(sorted_durations, max_duration, duration_first)
+
+		start_times = self._start_times
+		finish_times = self._finish_times
+
+		if (duration_end - duration_first) < (end - first):
+			# Note: the slowest calls are stored first, so the range of durations is reversed
+			num_calls = len(sorted_durations)
+			indices = self._slowest_call_indices[function_index][num_calls - duration_end:num_calls - duration_first]
+			if start_time != None:
+				indices = [index for index in indices if finish_times[index] >= start_time]
+			if finish_time != None:
+				indices = [index for index in indices if start_times[index] <= finish_time]
+			return sorted(indices)
+
+		indices = call_indices[first:end]
+		if start_time != None:
+			# skip recursive calls that finished before the window, inside a call that overlaps it
+			indices = [index for index in indices if finish_times[index] >= start_time]
+		if min_duration != None:
+			indices = [index for index in indices if (finish_times[index] - start_times[index]) >= min_duration]
+		if max_duration != None:
+			indices = [index for index in indices if (finish_times[index] - start_times[index]) <= max_duration]
+		return list(indices)
+
+class SampleQuery:
+	""" a search for the finished calls of functions, filtered by the label of the function and its thread,
+	    by duration and by a time window
+	     - the patterns are regular expressions, that match anywhere in a label
+	     - uses the ProfileFunctionCallIndex of each thread, so it doesn't visit the samples that don't match """
+
+	def __init__(self, function_pattern = None, thread_pattern = None, min_duration = None, max_duration = None, start_time = None, finish_time = None):
+		self._function_regex = re.compile(function_pattern) if function_pattern != None else None
+		self._thread_regex = re.compile(thread_pattern) if thread_pattern != None else None
+		self._min_duration = min_duration
+		self._max_duration = max_duration
+		self._start_time = start_time
+		self._finish_time = finish_time
+
+		# the indices of the functions that match on each thread, as (number of functions, indices)
+		self._thread_function_indices = {}
+
+	def _get_function_indices(self, thread_data):
+		""" return the indices of the functions on a thread that match """
+
+		if self._thread_regex and not self._thread_regex.search(thread_data.get_label()):
+			return []
+
+		num_functions = thread_data.get_num_functions()
+		(cached_num_functions, function_indices) = self._thread_function_indices.get(thread_data, (None, None))
+		if cached_num_functions != num_functions:
+			function_regex = self._function_regex
+			function_indices = [function_index for function_index in xrange(num_functions) if not function_regex or function_regex.search(thread_data.get_function(function_index).get_label())]
+			self._thread_function_indices[thread_data] = (num_functions, function_indices)
+		return function_indices
+
+	def find_thread_sample_indices(self, thread_data, start_time = None, finish_time = None):
+		""" return the indices of the samples on a thread that match, in start order
+		     - start_time and finish_time narrow the query's time window, i.e. to the part of the profile that is visible """
+
+		function_indices = self._get_function_indices(thread_data)
+		if not function_indices:
+			return []
+
+		if (start_time == None) or ((self._start_time != None) and (self._start_time > start_time)):
+			start_time = self._start_time
+		if (finish_time == None) or ((self._finish_time != None) and (self._finish_time < finish_time)):
+			finish_time = self._finish_time
+
+		call_index = thread_data.get_function_call_index()
+		indices = []
+		for function_index in function_indices:
+			indices.extend(call_index.find_calls(function_index, start_time, finish_time, self._min_duration, self._max_duration))
+
+		if len(function_indices) > 1:
+			indices.sort()
+		return indices
+
+	def find_samples(self, profile_data):
+		""" return the samples that match on every thread, as SampleData, in start order """
+
+		samples = []
+		for thread_index in xrange(profile_data.get_num_threads()):
+			thread_data = profile_data.get_thread(thread_index)
+			samples.extend(thread_data.get_sample(index) for index in self.find_thread_sample_indices(thread_data))
+
+		samples.sort(key=lambda sample: sample.get_start_time())
+		return samples
+
+def print_samples(samples, max_samples = None):
+	""" print the thread, function, start time and duration of each sample """
+
+	print "%12s %12s  %s" % ("start", "duration", "thread;function")
+	for sample in samples[:max_samples]:
+		print "%12d %12d  %s;%s" % (sample.get_start_time(), sample.get_duration(), sample.get_thread().get_label(), sample.get_function().get_label())
+	print "%d calls" % len(samples)
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Print the calls of the functions in a profile that match a search, in start order")
+	parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file, or a binary profile file')
+	parser.add_argument('--function', '-n', metavar='PATTERN', help='regular expression that matches the labels of the functions to find')
+	parser.add_argument('--thread', metavar='PATTERN', help='regular expression that matches the labels of the threads to search')
+	parser.add_argument('--min-duration', type=int, help='only find calls that took at least this long')
+	parser.add_argument('--max-duration', type=int, help='only find calls that took at most this long')
+	parser.add_argument('--range', '-r', type=int, nargs=2, metavar=('START_TIME', 'FINISH_TIME'), help='only find calls that overlap two clock times')
+	parser.add_argument('--top', '-t', type=int, default=None, help='only print this many calls')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	# Note: imported here, because profiledata imports this module
+	from profiledata import ProfileData
+	from profileparser import ProfileParser
+	from profilebinary import ProfileBinaryLoader, is_binary_profile
+
+	args = parse_args()
+
+	profile_data = ProfileData()
+	if is_binary_profile(args.filename):
+		ProfileBinaryLoader(profile_data).load_file(args.filename)
+	else:
+		ProfileParser(profile_data).load_file(args.filename)
+
+	(start_time, finish_time) = args.range or (None, None)
+	sample_query = SampleQuery(args.function, args.thread, args.min_duration, args.max_duration, start_time, finish_time)
+	print_samples(sample_query.find_samples(profile_data), args.top)
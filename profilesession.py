@@ -0,0 +1,342 @@
+import argparse
+import heapq
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+from bisect import bisect_right
+from itertools import izip
+
+from profileparser import ProfileParser, paused_gc, finalize_consumer
+from profilebinary import ProfileBinaryLoader, ProfileBinaryWriter, is_binary_profile
+
+# Note: the streams that each file of a session is split into - registrations, and one stream of timed records for each record type,
+#        because ProfileParser passes each block's sample, event emit and counter value records on separately, so each is only in time order by itself
+SESSION_STREAMS = ['registrations', 'samples', 'event_emits', 'counter_values']
+
+# Note: maximum number of merged records that are passed to the session's consumer in one batch
+MERGED_BATCH_SIZE = 64 * 1024
+
+class _SessionFileWriter:
+	""" consumer that writes a profile's records to one ProfileBinaryWriter for each of SESSION_STREAMS,
+	    and finds the time of the first emit of the events with a label """
+
+	def __init__(self, writers, sync_event_label):
+		(self._registrations, self._samples, self._event_emits, self._counter_values) = writers
+		self._sync_event_label = sync_event_label
+		# the (thread id, event id) of the events with the sync event's label
+		self._sync_events = set()
+		self._sync_time = None
+
+	def get_sync_time(self):
+		return self._sync_time
+
+	def _on_emit(self, thread_id, event_id, time):
+		if ((thread_id, event_id) in self._sync_events) and ((self._sync_time == None) or (time < self._sync_time)):
+			self._sync_time = time
+
+	def on_thread(self, thread_id, thread_label):
+		self._registrations.on_thread(thread_id, thread_label)
+
+	def on_function(self, thread_id, function_id, function_label):
+		self._registrations.on_function(thread_id, function_id, function_label)
+
+	def on_sample_start(self, thread_id, function_id, start_time):
+		self._samples.on_sample_start(thread_id, function_id, start_time)
+
+	def on_sample_finish(self, thread_id, function_id, finish_time):
+		self._samples.on_sample_finish(thread_id, function_id, finish_time)
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		self._samples.on_samples_batch(record_types, thread_ids, function_ids, times)
+
+	def on_event(self, thread_id, event_id, event_label):
+		if event_label == self._sync_event_label:
+			self._sync_events.add((thread_id, event_id))
+		self._registrations.on_event(thread_id, event_id, event_label)
+
+	def on_event_emit(self, thread_id, event_id, time):
+		self._on_emit(thread_id, event_id, time)
+		self._event_emits.on_event_emit(thread_id, event_id, time)
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		if self._sync_events:
+			for thread_id, event_id, time in izip(thread_ids, event_ids, times):
+				self._on_emit(thread_id, event_id, time)
+		self._event_emits.on_event_emits_batch(thread_ids, event_ids, times)
+
+	def on_counter(self, counter_id, counter_label):
+		self._registrations.on_counter(counter_id, counter_label)
+
+	def on_counter_value(self, counter_id, time, counter_value):
+		self._counter_values.on_counter_value(counter_id, time, counter_value)
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		self._counter_values.on_counter_values_batch(counter_ids, times, counter_values)
+
+def get_stream_filenames(binary_filename):
+	""" return the filenames of the binary profile files that convert_file() splits a file into, in the order of SESSION_STREAMS """
+	return ['%s.%s' % (binary_filename, stream) for stream in SESSION_STREAMS]
+
+def convert_file(filename, binary_filename, sync_event_label = None):
+	""" split a profile.txt file or binary profile file into binary profile files for each of SESSION_STREAMS (see get_stream_filenames()),
+	    which can be merged one run of records at a time
+	     - returns the time of the first emit of the sync event, or None if there isn't one """
+
+	stream_files = [open(stream_filename, "wb") for stream_filename in get_stream_filenames(binary_filename)]
+	try:
+		writers = [ProfileBinaryWriter(stream_file) for stream_file in stream_files]
+		session_file_writer = _SessionFileWriter(writers, sync_event_label)
+		if is_binary_profile(filename):
+			ProfileBinaryLoader(session_file_writer).load_file(filename)
+		else:
+			ProfileParser(session_file_writer).load_file(filename)
+		for writer in writers:
+			writer.finish()
+	finally:
+		for stream_file in stream_files:
+			stream_file.close()
+
+	return session_file_writer.get_sync_time()
+
+def _convert_file_task(args):
+	# multiprocessing can only call functions at the top level of a module
+	return convert_file(*args)
+
+class _SessionFile:
+	""" consumer for the registrations of one file of a session, that passes them on with the thread and counter ids numbered
+	    after the ones that were registered before them, and labels that start with the file's label """
+
+	def __init__(self, consumer, label, session_ids):
+		self._consumer = consumer
+		self._label = label
+		# the number of threads and counters registered in the session so far, as [threads, counters]
+		self._session_ids = session_ids
+
+		self._thread_ids = {}
+		self._counter_ids = {}
+
+	def get_thread_ids(self):
+		""" return a dictionary of the session thread id of each of the file's thread ids """
+		return self._thread_ids
+
+	def get_counter_ids(self):
+		return self._counter_ids
+
+	def on_thread(self, thread_id, thread_label):
+		session_thread_id = self._thread_ids[thread_id] = self._session_ids[0]
+		self._session_ids[0] += 1
+		self._consumer.on_thread(session_thread_id, "%s: %s" % (self._label, thread_label))
+
+	def on_function(self, thread_id, function_id, function_label):
+		self._consumer.on_function(self._thread_ids[thread_id], function_id, function_label)
+
+	def on_event(self, thread_id, event_id, event_label):
+		self._consumer.on_event(self._thread_ids[thread_id], event_id, event_label)
+
+	def on_counter(self, counter_id, counter_label):
+		session_counter_id = self._counter_ids[counter_id] = self._session_ids[1]
+		self._session_ids[1] += 1
+		self._consumer.on_counter(session_counter_id, "%s: %s" % (self._label, counter_label))
+
+class _SessionStream:
+	""" the runs of timed records in one stream of one file of a session, which are loaded one run at a time
+	     - a consumer for the stream's ProfileBinaryLoader, that keeps the run it was last passed, with the thread and counter ids
+	       mapped into the session and the file's clock offset applied """
+
+	def __init__(self, buffer, session_file, clock_offset):
+		self._session_file = session_file
+		self._clock_offset = clock_offset
+		self._runs = ProfileBinaryLoader(self).load_runs(buffer)
+
+		# the current run, as the name of the consumer method, and the arguments to pass it
+		self._method = None
+		self._columns = None
+		self._times = None
+		# the number of records of the current run that have been passed on
+		self._position = 0
+
+	def next_run(self):
+		""" load the next run of records, and return False if there are no more """
+		self._position = 0
+		try:
+			next(self._runs)
+		except StopIteration:
+			return False
+		return True
+
+	def get_time(self):
+		""" return the time of the next record to pass on """
+		return self._times[self._position]
+
+	def _offset_times(self, times):
+		if not self._clock_offset:
+			return times
+		clock_offset = self._clock_offset
+		return [time + clock_offset for time in times]
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		session_thread_ids = self._session_file.get_thread_ids()
+		self._method = 'on_samples_batch'
+		self._times = self._offset_times(times)
+		self._columns = (record_types, [session_thread_ids[thread_id] for thread_id in thread_ids], function_ids, self._times)
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		session_thread_ids = self._session_file.get_thread_ids()
+		self._method = 'on_event_emits_batch'
+		self._times = self._offset_times(times)
+		self._columns = ([session_thread_ids[thread_id] for thread_id in thread_ids], event_ids, self._times)
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		session_counter_ids = self._session_file.get_counter_ids()
+		self._method = 'on_counter_values_batch'
+		self._times = self._offset_times(times)
+		self._columns = ([session_counter_ids[counter_id] for counter_id in counter_ids], self._times, counter_values)
+
+	def pass_records(self, merged_batches, max_time):
+		""" add the records of the current run whose times are up to max_time (or all of them if max_time is None) to merged_batches,
+		    and return True if the whole run has been passed on
+		     - at least one record is passed on, so the merge always makes progress """
+
+		times = self._times
+		first = self._position
+		if max_time == None:
+			last = len(times)
+		else:
+			last = max(first + 1, bisect_right(times, max_time, first))
+
+		for batch_column, column in izip(merged_batches.get_columns(self._method), self._columns):
+			batch_column.extend(column[first:last])
+
+		self._position = last
+		return last == len(times)
+
+class _MergedBatches:
+	""" collects the runs of records that a merge passes on, into batches of up to MERGED_BATCH_SIZE records for the session's consumer
+	     - files that were written at the same time interleave closely, so the merge passes on runs of only a few records,
+	       which would make the consumer's overhead per batch dominate the load """
+
+	def __init__(self, consumer):
+		self._consumer = consumer
+		# the consumer method of the batch being collected, and the list of each of its arguments
+		self._method = None
+		self._columns = None
+
+	def get_columns(self, method):
+		""" return the lists of the arguments of the batch for a consumer method, to add records to """
+		if (method != self._method) or (len(self._columns[0]) >= MERGED_BATCH_SIZE):
+			self.flush()
+			self._method = method
+			self._columns = ([], [], [], []) if (method == 'on_samples_batch') else ([], [], [])
+		return self._columns
+
+	def flush(self):
+		""" pass the batch that is being collected on to the consumer """
+		if self._method:
+			getattr(self._consumer, self._method)(*self._columns)
+			self._method = None
+
+def merge_files(binary_filenames, labels, clock_offsets, consumer):
+	""" load the files that convert_file() split several profiles into, into consumer as a single session
+	     - the registrations of every file are passed on first, and then the timed records are merged in time order with a k-way merge,
+	       which passes on runs of records from the stream with the earliest next record, up to the time of the next record in any other stream.
+	       The records of each stream stay in file order, so a stream that isn't in time order is still loaded correctly
+	     - the threads and counters of each file are numbered after the ones of the files before it, and labelled "<file label>: <label>" """
+
+	buffers = []
+	try:
+		session_ids = [0, 0]
+		streams = []
+
+		with paused_gc():
+			for binary_filename, label, clock_offset in izip(binary_filenames, labels, clock_offsets):
+				for stream_filename in get_stream_filenames(binary_filename):
+					with open(stream_filename, "rb") as stream_file:
+						buffers.append(mmap.mmap(stream_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+				session_file = _SessionFile(consumer, label, session_ids)
+				ProfileBinaryLoader(session_file).load_buffer(buffers[-len(SESSION_STREAMS)])
+				streams.extend(_SessionStream(buffer, session_file, clock_offset) for buffer in buffers[-len(SESSION_STREAMS) + 1:])
+
+			# a heap of (time of next record, stream index) for the streams with records left
+			heap = [(stream.get_time(), index) for index, stream in enumerate(streams) if stream.next_run()]
+			heapq.heapify(heap)
+
+			merged_batches = _MergedBatches(consumer)
+			while heap:
+				index = heap[0][1]
+				stream = streams[index]
+				# the next record in any other stream is at the top of one of the root's children
+				max_time = min(heap[1:3])[0] if (len(heap) > 1) else None
+
+				if stream.pass_records(merged_batches, max_time) and not stream.next_run():
+					heapq.heappop(heap)
+				else:
+					heapq.heapreplace(heap, (stream.get_time(), index))
+
+			merged_batches.flush()
+			finalize_consumer(consumer)
+	finally:
+		for buffer in buffers:
+			buffer.close()
+
+def get_sync_clock_offsets(sync_times, filenames):
+	""" return the clock offset of each file that aligns the first emit of the sync event in each file with the one in the first file """
+
+	for sync_time, filename in izip(sync_times, filenames):
+		if sync_time == None:
+			raise ValueError("the sync event isn't emitted in %s" % filename)
+	return [sync_times[0] - sync_time for sync_time in sync_times]
+
+def load_session(filenames, consumer, clock_offsets = None, sync_event_label = None, num_processes = None, labels = None):
+	""" load several profile.txt files or binary profile files (i.e. written by the processes of one product) into consumer as a single session
+	     - the files are parsed concurrently, with one process per file (up to num_processes), and then merged in time order by merge_files()
+	     - clock_offsets are added to the times in each file, or if sync_event_label is given, the clocks are aligned
+	       on the first emit of the event with that label in each file
+	     - the labels of each file's threads and counters start with the file's label, which is its filename by default """
+
+	labels = labels or filenames
+	scratch_dir = tempfile.mkdtemp(prefix='session-')
+	try:
+		binary_filenames = [os.path.join(scratch_dir, '%d.bin' % index) for index in xrange(len(filenames))]
+		tasks = [(filename, binary_filename, sync_event_label) for filename, binary_filename in izip(filenames, binary_filenames)]
+
+		num_processes = min(num_processes or multiprocessing.cpu_count(), len(filenames))
+		if num_processes > 1:
+			pool = multiprocessing.Pool(num_processes)
+			try:
+				sync_times = pool.map(_convert_file_task, tasks)
+			finally:
+				pool.terminate()
+				pool.join()
+		else:
+			sync_times = map(_convert_file_task, tasks)
+
+		if sync_event_label != None:
+			clock_offsets = get_sync_clock_offsets(sync_times, filenames)
+
+		merge_files(binary_filenames, labels, clock_offsets or ([0] * len(filenames)), consumer)
+	finally:
+		shutil.rmtree(scratch_dir, ignore_errors=True)
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Merge profile.txt files written by the processes of one product into a single binary profile file, with their clocks aligned")
+	parser.add_argument('--filename', '-f', required=True, nargs='+', help='file paths to the profile.txt files, or binary profile files')
+	parser.add_argument('--output', '-o', default='session.bin', help='file path to write the binary profile file to')
+	clock_group = parser.add_mutually_exclusive_group()
+	clock_group.add_argument('--clock-offsets', type=int, nargs='+', metavar='OFFSET', help='time to add to the clock of each file')
+	clock_group.add_argument('--sync-event', metavar='LABEL', help='label of an event that every process emits at the same moment, to align the clocks of the files on its first emit')
+	parser.add_argument('--processes', '-p', type=int, default=0, help='number of processes to parse the files with, or 0 to use one per file (up to one per cpu)')
+	args = parser.parse_args()
+	if args.clock_offsets and (len(args.clock_offsets) != len(args.filename)):
+		parser.error("--clock-offsets needs one offset for each file")
+	return args
+
+if __name__ == "__main__":
+	args = parse_args()
+
+	with open(args.output, "wb") as output_file:
+		writer = ProfileBinaryWriter(output_file)
+		load_session(args.filename, writer, args.clock_offsets, args.sync_event, args.processes)
+		writer.finish()
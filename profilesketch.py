@@ -0,0 +1,142 @@
+import math
+from bisect import bisect_left
+from collections import Counter
+
+# Note: relative accuracy of the durations returned by a DurationSketch's percentiles, i.e. 0.01 is within 1% of the exact duration
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+# Note: maximum number of buckets in a DurationSketch - when there are more, the shortest buckets are merged,
+#        so only the lowest percentiles lose accuracy. 2048 buckets at 1% accuracy cover durations from 1 to 10^17
+SKETCH_MAX_BUCKETS = 2048
+
+_SKETCH_GAMMA = (1.0 + SKETCH_RELATIVE_ACCURACY) / (1.0 - SKETCH_RELATIVE_ACCURACY)
+_SKETCH_MULTIPLIER = 1.0 / math.log(_SKETCH_GAMMA)
+
+class DurationSketch:
+	""" a mergeable sketch of the distribution of a function's call durations, for estimating percentiles (i.e. p99)
+	     - in the style of DDSketch: each duration is counted in a bucket whose width is a fixed fraction of the duration,
+	       so the size of the sketch depends on the range of the durations, not on the number of calls
+	     - sketches of the same function on different threads, or in different profiles, are merged by adding their bucket counts """
+
+	def __init__(self):
+		self._bucket_counts = {}
+		self._zero_count = 0
+		self._count = 0
+		self._min_duration = None
+		self._max_duration = None
+
+		# the sorted bucket indices, and the number of durations up to the end of each bucket, which are built by the first percentile query
+		self._sorted_buckets = None
+		self._cumulative_counts = None
+
+	def add(self, duration):
+		if duration > 0:
+			bucket = int(math.ceil(math.log(duration) * _SKETCH_MULTIPLIER))
+			bucket_counts = self._bucket_counts
+			bucket_counts[bucket] = bucket_counts.get(bucket, 0) + 1
+			if len(bucket_counts) > SKETCH_MAX_BUCKETS:
+				self._collapse_shortest_buckets()
+		else:
+			self._zero_count += 1
+
+		self._count += 1
+		if (self._min_duration == None) or (duration < self._min_duration):
+			self._min_duration = duration
+		if (self._max_duration == None) or (duration > self._max_duration):
+			self._max_duration = duration
+		self._sorted_buckets = None
+
+	def add_durations(self, durations):
+		""" add a list of durations, which is much faster than adding them one at a time, because equal durations share one bucket lookup """
+
+		if not durations:
+			return
+
+		bucket_counts = self._bucket_counts
+		log = math.log
+		ceil = math.ceil
+		for duration, count in Counter(durations).iteritems():
+			if duration > 0:
+				bucket = int(ceil(log(duration) * _SKETCH_MULTIPLIER))
+				bucket_counts[bucket] = bucket_counts.get(bucket, 0) + count
+			else:
+				self._zero_count += count
+		if len(bucket_counts) > SKETCH_MAX_BUCKETS:
+			self._collapse_shortest_buckets()
+
+		self._count += len(durations)
+		min_duration = min(durations)
+		max_duration = max(durations)
+		if (self._min_duration == None) or (min_duration < self._min_duration):
+			self._min_duration = min_duration
+		if (self._max_duration == None) or (max_duration > self._max_duration):
+			self._max_duration = max_duration
+		self._sorted_buckets = None
+
+	def merge(self, other):
+		""" add the durations counted by another sketch """
+
+		if not other._count:
+			return
+
+		bucket_counts = self._bucket_counts
+		for bucket, count in other._bucket_counts.iteritems():
+			bucket_counts[bucket] = bucket_counts.get(bucket, 0) + count
+		if len(bucket_counts) > SKETCH_MAX_BUCKETS:
+			self._collapse_shortest_buckets()
+
+		self._zero_count += other._zero_count
+		self._count += other._count
+		if (self._min_duration == None) or (other._min_duration < self._min_duration):
+			self._min_duration = other._min_duration
+		if (self._max_duration == None) or (other._max_duration > self._max_duration):
+			self._max_duration = other._max_duration
+		self._sorted_buckets = None
+
+	def _collapse_shortest_buckets(self):
+		# merge the shortest buckets into one, so that there are SKETCH_MAX_BUCKETS left
+		bucket_counts = self._bucket_counts
+		buckets = sorted(bucket_counts)
+		num_collapsed = len(buckets) - SKETCH_MAX_BUCKETS + 1
+		collapsed_bucket = buckets[num_collapsed - 1]
+		for bucket in buckets[:num_collapsed - 1]:
+			bucket_counts[collapsed_bucket] += bucket_counts.pop(bucket)
+
+	def get_count(self):
+		return self._count
+
+	def get_min_duration(self):
+		return self._min_duration
+
+	def get_max_duration(self):
+		return self._max_duration
+
+	def get_num_buckets(self):
+		return len(self._bucket_counts)
+
+	def get_percentile(self, percentile):
+		""" return an estimate of the duration that percentile% of the calls are no slower than, or None if there are no durations
+		     - the estimate is within SKETCH_RELATIVE_ACCURACY of the exact duration, and the fastest and slowest durations are exact """
+
+		if not self._count:
+			return None
+
+		rank = int(round((percentile / 100.0) * (self._count - 1)))
+		if rank <= 0:
+			return self._min_duration
+		elif rank >= self._count - 1:
+			return self._max_duration
+		elif rank < self._zero_count:
+			return 0
+
+		if self._sorted_buckets == None:
+			self._sorted_buckets = sorted(self._bucket_counts)
+			self._cumulative_counts = []
+			cumulative_count = self._zero_count
+			for bucket in self._sorted_buckets:
+				cumulative_count += self._bucket_counts[bucket]
+				self._cumulative_counts.append(cumulative_count)
+
+		bucket = self._sorted_buckets[bisect_left(self._cumulative_counts, rank + 1)]
+		duration = 2.0 * math.pow(_SKETCH_GAMMA, bucket) / (_SKETCH_GAMMA + 1.0)
+		return min(max(duration, self._min_duration), self._max_duration)
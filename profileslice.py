@@ -0,0 +1,418 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import izip
+
+from profiledata import SampleData, SampleList, EventSampleList, CounterData, TIME_TYPECODE
+from profilelod import ProfileLevelOfDetail
+from profilestats import ProfileThreadStats
+from profilecalltree import ProfileThreadCallTree
+from profileframes import ProfileFrames
+from profilesearch import ProfileFunctionCallIndex
+from profilesketch import DurationSketch
+from profileutilization import ProfileUtilization
+
+class ThreadDataSlice:
+	""" view of the samples and events on a ThreadData that overlap a time window [start_time, finish_time]
+	     - the view's samples are the samples that were running at the start of the window (one for each call stack depth),
+	       followed by the samples that start in the window, so the samples are still in start order
+	     - sample times are clipped to the window, and samples that finish after the window finish with it
+	     - the samples are read from the ThreadData's arrays, and the view's own arrays are only built when
+	       a summary (i.e. the function stats) needs them """
+
+	def __init__(self, thread_data, start_time, finish_time):
+		self._thread_data = thread_data
+		self._window_start_time = start_time
+		self._window_finish_time = finish_time
+
+		# the samples that start in the window are a range of indices in the thread
+		start_times = thread_data.get_sample_start_times()
+		self._first = bisect_left(start_times, start_time)
+		self._end = max(self._first, bisect_right(start_times, finish_time))
+
+		# the samples that were running at the start of the window are the sample before the range, and its callers
+		running_samples = []
+		index = self._first - 1
+		while index >= 0:
+			sample_finish_time = thread_data.get_sample_finish_time(index)
+			if (sample_finish_time == None) or (sample_finish_time >= start_time) or running_samples:
+				running_samples.append(index)
+			index = thread_data.get_sample_parent_index(index)
+			if index == None:
+				break
+		running_samples.reverse()
+		self._running_samples = running_samples
+
+		# view index = thread index - offset, for the samples in the range
+		self._offset = self._first - len(running_samples)
+		self._num_samples = len(running_samples) + (self._end - self._first)
+
+		max_stack_depth = len(running_samples)
+		while max_stack_depth < thread_data.get_max_stack_depth():
+			depth_samples = thread_data.get_depth_sample_indices(max_stack_depth)
+			if bisect_left(depth_samples, self._first) == bisect_left(depth_samples, self._end):
+				break
+			max_stack_depth += 1
+		self._max_stack_depth = max_stack_depth
+
+		(self._first_event_sample, self._end_event_sample) = thread_data.get_event_sample_index_range(start_time, finish_time)
+
+		self._sample_arrays = None
+		self._duration_sketches = None
+		self._summaries = {}
+
+	def _get_thread_index(self, index):
+		""" return the index in the ThreadData of a sample in this view """
+		if index < len(self._running_samples):
+			return self._running_samples[index]
+		return index + self._offset
+
+	def _get_view_index(self, thread_index):
+		""" return the index in this view of a sample in the ThreadData, that overlaps the window """
+		if thread_index < self._first:
+			# the samples that were running at the start of the window are in call stack depth order
+			return self._thread_data.get_sample_call_stack_depth(thread_index)
+		return thread_index - self._offset
+
+	def get_thread_data(self):
+		return self._thread_data
+
+	def get_window(self):
+		""" return the (start_time, finish_time) of the window """
+		return (self._window_start_time, self._window_finish_time)
+
+	def get_id(self):
+		return self._thread_data.get_id()
+
+	def get_label(self):
+		return self._thread_data.get_label()
+
+	def get_num_functions(self):
+		return self._thread_data.get_num_functions()
+
+	def get_function(self, index):
+		return self._thread_data.get_function(index)
+
+	def get_function_duration_sketch(self, index):
+		""" return the DurationSketch of the durations of a function's finished samples in the view, which are clipped to the window """
+
+		if self._duration_sketches == None:
+			(start_times, finish_times, function_indices, depths, parents, ends) = self._get_sample_arrays()
+			function_durations = [[] for function_index in xrange(self.get_num_functions())]
+			for start_time, finish_time, function_index, end in izip(start_times, finish_times, function_indices, ends):
+				if end:
+					function_durations[function_index].append(finish_time - start_time)
+
+			self._duration_sketches = []
+			for durations in function_durations:
+				duration_sketch = DurationSketch()
+				duration_sketch.add_durations(durations)
+				self._duration_sketches.append(duration_sketch)
+
+		return self._duration_sketches[index]
+
+	def get_samples(self):
+		""" return the samples on the bottom of the call stack """
+		return SampleList(self, self.get_root_sample_indices())
+
+	def get_root_sample_indices(self):
+		return self.get_depth_sample_indices(0)
+
+	def get_num_samples(self):
+		return self._num_samples
+
+	def get_sample(self, index):
+		return SampleData(self, index)
+
+	def get_sample_start_time(self, index):
+		return max(self._window_start_time, self._thread_data.get_sample_start_time(self._get_thread_index(index)))
+
+	def get_sample_finish_time(self, index):
+		""" return the finish time of a sample, or None if it has not finished yet """
+		finish_time = self._thread_data.get_sample_finish_time(self._get_thread_index(index))
+		if finish_time == None:
+			return None
+		return min(self._window_finish_time, finish_time)
+
+	def get_sample_duration(self, index):
+		finish_time = self.get_sample_finish_time(index)
+		if finish_time == None:
+			return 0
+		return finish_time - self.get_sample_start_time(index)
+
+	def get_sample_function(self, index):
+		return self._thread_data.get_sample_function(self._get_thread_index(index))
+
+	def get_sample_call_stack_depth(self, index):
+		return self._thread_data.get_sample_call_stack_depth(self._get_thread_index(index))
+
+	def get_sample_child_call_stack_depth(self, index):
+		""" return the child call stack depth of a sample, which includes the samples outside of the window """
+		return self._thread_data.get_sample_child_call_stack_depth(self._get_thread_index(index))
+
+	def get_sample_parent_index(self, index):
+		""" return the index of the sample that called a sample, or None """
+		parent_index = self._thread_data.get_sample_parent_index(self._get_thread_index(index))
+		if parent_index == None:
+			return None
+		return self._get_view_index(parent_index)
+
+	def get_sample_end_index(self, index):
+		""" return the index after the last descendant of a sample """
+		end = self._thread_data.get_sample_end_index(self._get_thread_index(index))
+		return min(end, self._end) - self._offset
+
+	def get_sample_child_indices(self, index):
+		end = self.get_sample_end_index(index)
+
+		child_indices = []
+		child_index = index + 1
+		while child_index < end:
+			child_indices.append(child_index)
+			child_index = self.get_sample_end_index(child_index)
+		return child_indices
+
+	def _get_sample_arrays(self):
+		""" return (start times, finish times, function indices, call stack depths, parent indices, ends) arrays for the view
+		     - the arrays of the samples in the range are copied, and the indices in them are offset to the view's indices """
+
+		if self._sample_arrays != None:
+			return self._sample_arrays
+
+		thread_data = self._thread_data
+		running_samples = self._running_samples
+		first = self._first
+		end = self._end
+		offset = self._offset
+
+		thread_start_times = thread_data.get_sample_start_times()
+		thread_finish_times = thread_data.get_sample_finish_times()
+		thread_function_indices = thread_data.get_sample_function_indices()
+		thread_depths = thread_data.get_sample_call_stack_depths()
+		thread_parents = thread_data.get_sample_parent_indices()
+		thread_ends = thread_data.get_sample_ends()
+
+		start_times = array(TIME_TYPECODE, [max(self._window_start_time, thread_start_times[index]) for index in running_samples])
+		start_times.extend(thread_start_times[first:end])
+		finish_times = array(TIME_TYPECODE, [thread_finish_times[index] for index in running_samples])
+		finish_times.extend(thread_finish_times[first:end])
+		function_indices = array('i', [thread_function_indices[index] for index in running_samples])
+		function_indices.extend(thread_function_indices[first:end])
+		depths = array('H', xrange(len(running_samples)))
+		depths.extend(thread_depths[first:end])
+
+		# a parent before the range is the sample that was running at the start of the window, at the depth above
+		parents = array('i', xrange(-1, len(running_samples) - 1))
+		parents.extend(array('i', [(parent - offset) if (parent >= first) else (depth - 1) for parent, depth in izip(thread_parents[first:end], thread_depths[first:end])]))
+
+		ends = array('i', [(min(thread_ends[index], end) - offset) if thread_ends[index] else 0 for index in running_samples])
+		ends.extend(array('i', [(min(sample_end, end) - offset) if sample_end else 0 for sample_end in thread_ends[first:end]]))
+
+		# the samples that finish after the window were all running at the end of it, so they're the last sample and its callers
+		index = len(finish_times) - 1
+		while index >= 0:
+			if ends[index] and (finish_times[index] > self._window_finish_time):
+				finish_times[index] = self._window_finish_time
+			index = parents[index]
+
+		self._sample_arrays = (start_times, finish_times, function_indices, depths, parents, ends)
+		return self._sample_arrays
+
+	def get_sample_start_times(self):
+		return self._get_sample_arrays()[0]
+
+	def get_sample_finish_times(self):
+		return self._get_sample_arrays()[1]
+
+	def get_sample_function_indices(self):
+		return self._get_sample_arrays()[2]
+
+	def get_sample_call_stack_depths(self):
+		return self._get_sample_arrays()[3]
+
+	def get_sample_parent_indices(self):
+		return self._get_sample_arrays()[4]
+
+	def get_sample_ends(self):
+		return self._get_sample_arrays()[5]
+
+	def _get_summary(self, summary_class, *args):
+		""" return summary_class(self, *args), which is built once, because a view doesn't change """
+
+		key = (summary_class,) + args
+		summary = self._summaries.get(key)
+		if summary == None:
+			summary = summary_class(self, *args)
+			self._summaries[key] = summary
+		return summary
+
+	def get_level_of_detail(self):
+		if self.get_finish_time() == None:
+			return None
+		return self._get_summary(ProfileLevelOfDetail)
+
+	def get_function_stats(self):
+		return self._get_summary(ProfileThreadStats)
+
+	def get_call_tree(self):
+		return self._get_summary(ProfileThreadCallTree)
+
+	def get_function_call_index(self):
+		return self._get_summary(ProfileFunctionCallIndex)
+
+	def get_depth_sample_indices(self, depth):
+		""" return the indices of the samples at a call stack depth, in time order """
+
+		indices = array('i', [depth]) if (depth < len(self._running_samples)) else array('i')
+		if depth < self._thread_data.get_max_stack_depth():
+			depth_samples = self._thread_data.get_depth_sample_indices(depth)
+			offset = self._offset
+			indices.extend(array('i', [index - offset for index in depth_samples[bisect_left(depth_samples, self._first):bisect_left(depth_samples, self._end)]]))
+		return indices
+
+	def get_sample_indices_in_range(self, depth, start_time, finish_time, parent_index = None):
+		""" return the indices of the samples at a call stack depth that overlap [start_time, finish_time], and the window """
+
+		start_time = max(start_time, self._window_start_time)
+		finish_time = min(finish_time, self._window_finish_time)
+		if start_time > finish_time:
+			return []
+
+		thread_parent_index = self._get_thread_index(parent_index) if (parent_index != None) else None
+		thread_indices = self._thread_data.get_sample_indices_in_range(depth, start_time, finish_time, thread_parent_index)
+		return [self._get_view_index(index) for index in thread_indices]
+
+	def get_max_stack_depth(self):
+		return self._max_stack_depth
+
+	def get_open_sample_start_time(self):
+		""" return the start time of the outermost sample that has not finished yet, or None """
+		start_time = self._thread_data.get_open_sample_start_time()
+		if (start_time == None) or (start_time > self._window_finish_time):
+			return None
+		return max(start_time, self._window_start_time)
+
+	def get_start_time(self):
+		if not self._num_samples:
+			return None
+		return self.get_sample_start_time(0)
+
+	def get_finish_time(self):
+		""" return the finish time of the last sample that finished in the window, or None """
+		finish_time = self._thread_data.get_finish_time()
+		if (not self._num_samples) or (finish_time == None) or (finish_time < self._window_start_time):
+			return None
+		return min(finish_time, self._window_finish_time)
+
+	def get_num_events(self):
+		return self._thread_data.get_num_events()
+
+	def get_event(self, index):
+		return self._thread_data.get_event(index)
+
+	def get_event_index(self, label):
+		return self._thread_data.get_event_index(label)
+
+	def get_num_event_samples(self):
+		return self._end_event_sample - self._first_event_sample
+
+	def get_event_sample(self, index):
+		return self._thread_data.get_event_sample(index + self._first_event_sample)
+
+	def get_event_samples(self):
+		return EventSampleList(self)
+
+	def get_event_sample_index_range(self, start_time, finish_time):
+		(first, end) = self._thread_data.get_event_sample_index_range(start_time, finish_time)
+		first = min(max(first, self._first_event_sample), self._end_event_sample)
+		end = min(max(end, first), self._end_event_sample)
+		return (first - self._first_event_sample, end - self._first_event_sample)
+
+	def get_event_emit_times(self, event_index):
+		emit_times = self._thread_data.get_event_emit_times(event_index)
+		return emit_times[bisect_left(emit_times, self._window_start_time):bisect_right(emit_times, self._window_finish_time)]
+
+	def get_frames(self, event_index):
+		return self._get_summary(ProfileFrames, event_index)
+
+class CounterDataSlice(CounterData):
+	""" the values of a counter in a time window, starting with the value that was in effect at the start of the window """
+
+	def __init__(self, counter_data, start_time, finish_time):
+		CounterData.__init__(self, counter_data.get_id(), counter_data.get_label())
+
+		(first, end) = counter_data.get_sample_index_range(start_time, finish_time)
+		self._sample_times = counter_data.get_sample_times()[first:end]
+		self._sample_values = counter_data.get_sample_values()[first:end]
+		if self._sample_times and (self._sample_times[0] < start_time):
+			self._sample_times[0] = start_time
+		self.finalize()
+
+class ProfileDataSlice:
+	""" view of the threads, samples, events and counters of a ProfileData in a time window [start_time, finish_time]
+	     - has the same interface as ProfileData for reading, so it can be rendered, or used for stats and exports
+	     - creating a view only costs a few binary searches for each thread, because nothing is copied until it's needed """
+
+	def __init__(self, profile_data, start_time, finish_time):
+		self._profile_data = profile_data
+		self._window_start_time = start_time
+		self._window_finish_time = finish_time
+
+		self._threads = [ThreadDataSlice(profile_data.get_thread(index), start_time, finish_time) for index in xrange(profile_data.get_num_threads())]
+		self._counters = [CounterDataSlice(profile_data.get_counter(index), start_time, finish_time) for index in xrange(profile_data.get_num_counters())]
+
+		self._start_time = None
+		self._finish_time = None
+		if (profile_data.get_start_time() != None) and (profile_data.get_finish_time() != None):
+			self._start_time = max(start_time, profile_data.get_start_time())
+			self._finish_time = min(finish_time, profile_data.get_finish_time())
+			if self._start_time > self._finish_time:
+				self._start_time = None
+				self._finish_time = None
+
+		# built when it is first needed
+		self._utilization = None
+
+	def get_profile_data(self):
+		return self._profile_data
+
+	def get_window(self):
+		""" return the (start_time, finish_time) of the window """
+		return (self._window_start_time, self._window_finish_time)
+
+	def get_num_threads(self):
+		return len(self._threads)
+
+	def get_thread(self, index):
+		return self._threads[index]
+
+	def get_num_counters(self):
+		return len(self._counters)
+
+	def get_counter(self, index):
+		return self._counters[index]
+
+	def get_start_time(self):
+		return self._start_time
+
+	def get_finish_time(self):
+		return self._finish_time
+
+	def get_open_sample_start_time(self):
+		""" return the start time of the earliest sample, on any thread, that has not finished yet, or None """
+		start_times = [thread.get_open_sample_start_time() for thread in self._threads]
+		start_times = [start_time for start_time in start_times if start_time != None]
+		return min(start_times) if start_times else None
+
+	def get_array_store(self):
+		""" return the MappedArrayStore of the profile data that this is a view of, or None if its arrays are in memory """
+		return self._profile_data.get_array_store()
+
+	def get_utilization(self):
+		""" return the ProfileUtilization of the threads in the window, which is built once, because a view doesn't change """
+		if self._utilization == None:
+			self._utilization = ProfileUtilization(self)
+		return self._utilization
+
+	def slice(self, start_time, finish_time):
+		""" return a view of the part of this view in [start_time, finish_time] """
+		return ProfileDataSlice(self._profile_data, max(start_time, self._window_start_time), min(finish_time, self._window_finish_time))
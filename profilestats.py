@@ -0,0 +1,190 @@
+import argparse
+from itertools import izip
+
+# the columns that a report can be sorted by
+SORT_KEYS = ['inclusive', 'exclusive', 'calls', 'mean', 'max', 'p99']
+
+# the percentiles of the sample durations that are printed
+STATS_PERCENTILES = [50, 95, 99, 99.9]
+
+class FunctionStats:
+	""" the time spent in one function on a thread, over all of its finished samples
+	     - inclusive time only counts the outermost sample of a recursive function,
+	       so that time isn't counted more than once """
+
+	def __init__(self, function_data, call_count, total_time, inclusive_time, exclusive_time, min_time, max_time, duration_sketch):
+		self._function_data = function_data
+		self._call_count = call_count
+		self._total_time = total_time
+		self._inclusive_time = inclusive_time
+		self._exclusive_time = exclusive_time
+		self._min_time = min_time
+		self._max_time = max_time
+		self._duration_sketch = duration_sketch
+
+	def get_function(self):
+		return self._function_data
+
+	def get_call_count(self):
+		return self._call_count
+
+	def get_total_time(self):
+		""" return the sum of the durations of every sample, including recursive samples """
+		return self._total_time
+
+	def get_inclusive_time(self):
+		return self._inclusive_time
+
+	def get_exclusive_time(self):
+		""" return the time spent in the function, excluding the time spent in the functions that it called """
+		return self._exclusive_time
+
+	def get_min_time(self):
+		""" return the duration of the shortest sample """
+		return self._min_time
+
+	def get_max_time(self):
+		""" return the duration of the longest sample """
+		return self._max_time
+
+	def get_mean_time(self):
+		""" return the mean duration of a sample """
+		if not self._call_count:
+			return 0.0
+		return float(self._total_time) / self._call_count
+
+	def get_percentile_time(self, percentile):
+		""" return an estimate of the duration that percentile% of the samples are no slower than, or None if there are no samples """
+		return self._duration_sketch.get_percentile(percentile)
+
+class ProfileThreadStats:
+	""" inclusive and exclusive time statistics for each function on a thread
+	     - built with a single pass over the sample arrays, in start order """
+
+	def __init__(self, thread_data):
+		num_functions = thread_data.get_num_functions()
+		call_counts = [0] * num_functions
+		inclusive_times = [0] * num_functions
+		total_times = [0] * num_functions
+		exclusive_times = [0] * num_functions
+		min_times = [None] * num_functions
+		max_times = [0] * num_functions
+
+		start_times = thread_data.get_sample_start_times()
+		finish_times = thread_data.get_sample_finish_times()
+		function_indices = thread_data.get_sample_function_indices()
+		depths = thread_data.get_sample_call_stack_depths()
+		parent_indices = thread_data.get_sample_parent_indices()
+		ends = thread_data.get_sample_ends()
+
+		# the functions of the samples that called the current sample, and how many times each function is in it
+		call_stack = []
+		call_stack_counts = [0] * num_functions
+		thread_total_time = 0
+
+		for function_index, depth, parent_index, start_time, finish_time, end in izip(function_indices, depths, parent_indices, start_times, finish_times, ends):
+			while len(call_stack) > depth:
+				call_stack_counts[call_stack.pop()] -= 1
+
+			if end:
+				duration = finish_time - start_time
+				call_counts[function_index] += 1
+				total_times[function_index] += duration
+				exclusive_times[function_index] += duration
+				if not call_stack_counts[function_index]:
+					inclusive_times[function_index] += duration
+				if (min_times[function_index] == None) or (duration < min_times[function_index]):
+					min_times[function_index] = duration
+				if duration > max_times[function_index]:
+					max_times[function_index] = duration
+
+				if parent_index < 0:
+					thread_total_time += duration
+				elif ends[parent_index]:
+					# the time spent in this sample isn't part of its caller's exclusive time
+					#  - a caller that hasn't finished yet has no duration, so there's nothing to remove
+					exclusive_times[function_indices[parent_index]] -= duration
+
+			call_stack.append(function_index)
+			call_stack_counts[function_index] += 1
+
+		self._total_time = thread_total_time
+		self._function_stats = [FunctionStats(thread_data.get_function(function_index), call_counts[function_index], total_times[function_index], inclusive_times[function_index], exclusive_times[function_index], min_times[function_index], max_times[function_index], thread_data.get_function_duration_sketch(function_index)) for function_index in xrange(num_functions)]
+
+	def get_total_time(self):
+		""" return the total duration of the finished samples on the bottom of the call stack """
+		return self._total_time
+
+	def get_num_functions(self):
+		return len(self._function_stats)
+
+	def get_function_stats(self, function_index):
+		return self._function_stats[function_index]
+
+	def get_all_function_stats(self):
+		""" return the FunctionStats for each function that has at least one finished sample """
+		return [function_stats for function_stats in self._function_stats if function_stats.get_call_count()]
+
+def _get_sort_value(function_stats, sort_key):
+	if sort_key == 'inclusive':
+		return function_stats.get_inclusive_time()
+	elif sort_key == 'exclusive':
+		return function_stats.get_exclusive_time()
+	elif sort_key == 'calls':
+		return function_stats.get_call_count()
+	elif sort_key == 'mean':
+		return function_stats.get_mean_time()
+	elif sort_key == 'p99':
+		return function_stats.get_percentile_time(99)
+	else:
+		return function_stats.get_max_time()
+
+def print_stats(profile_data, sort_key = 'exclusive', max_functions = None):
+	""" print a table of the function statistics for each thread """
+
+	for thread_index in xrange(profile_data.get_num_threads()):
+		thread_data = profile_data.get_thread(thread_index)
+		thread_stats = thread_data.get_function_stats()
+		all_function_stats = sorted(thread_stats.get_all_function_stats(), key=lambda function_stats: _get_sort_value(function_stats, sort_key), reverse=True)
+
+		print "Thread %d: %s (total %d)" % (thread_data.get_id(), thread_data.get_label(), thread_stats.get_total_time())
+		print "%10s %12s %12s %12s %10s %10s %s  %s" % ("calls", "inclusive", "exclusive", "mean", "min", "max", " ".join("%10s" % ("p%g" % percentile) for percentile in STATS_PERCENTILES), "function")
+		for function_stats in all_function_stats[:max_functions]:
+			percentiles = " ".join("%10.1f" % function_stats.get_percentile_time(percentile) for percentile in STATS_PERCENTILES)
+			print "%10d %12d %12d %12.1f %10d %10d %s  %s" % (function_stats.get_call_count(), function_stats.get_inclusive_time(), function_stats.get_exclusive_time(), function_stats.get_mean_time(), function_stats.get_min_time(), function_stats.get_max_time(), percentiles, function_stats.get_function().get_label())
+		print
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Print inclusive and exclusive time statistics for each function in a profile")
+	parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file, or a binary profile file')
+	parser.add_argument('--sort', '-s', default='exclusive', choices=SORT_KEYS, help='column to sort the functions on each thread by')
+	parser.add_argument('--top', '-t', type=int, default=None, help='only print this many functions for each thread')
+	parser.add_argument('--range', '-r', type=int, nargs=2, metavar=('START_TIME', 'FINISH_TIME'), help='only include the samples, events and counter values between two clock times')
+	parser.add_argument('--out-of-core', '-o', nargs='?', const='', metavar='SCRATCH_DIR', help='keep the samples, events and counter values in a memory mapped scratch file (in SCRATCH_DIR, or the temporary directory), for profiles that are too large to load into memory')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	# Note: imported here, because profiledata imports this module
+	from profiledata import ProfileData
+	from profileparser import ProfileParser
+	from profilebinary import ProfileBinaryLoader, is_binary_profile
+	from profilemapped import MappedArrayStore, get_resident_memory
+
+	args = parse_args()
+
+	array_store = MappedArrayStore(args.out_of_core or None) if (args.out_of_core != None) else None
+	profile_data = ProfileData(array_store)
+	if is_binary_profile(args.filename):
+		ProfileBinaryLoader(profile_data).load_file(args.filename)
+	else:
+		ProfileParser(profile_data).load_file(args.filename)
+
+	if args.range:
+		profile_data = profile_data.slice(*args.range)
+
+	print_stats(profile_data, args.sort, args.top)
+
+	if array_store:
+		print "Resident memory: %.1fMB, scratch file: %.1fMB" % (get_resident_memory() / 1e6, array_store.get_mapped_size() / 1e6)
+		array_store.close()
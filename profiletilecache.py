@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+# Note: width and height of a tile in pixels, the tiles at the bottom of a row are cut to its height
+#  - rows of deep call stacks are many tiles high, so each tile is within cairo's largest image size (32767 pixels)
+TILE_WIDTH = 256
+TILE_HEIGHT = 256
+
+# Note: most bytes of tiles that are kept, the least recently used tiles are dropped past this
+TILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Note: times per pixel that are closer than this fraction are the same zoom level
+#  - the times at the edges of the window are floats, so panning can change the time per pixel by a rounding error
+ZOOM_LEVEL_TOLERANCE = 1e-6
+
+class TileCache:
+	""" tiles of the rows of a timeline that have been drawn, so that panning and redrawing only copies them
+	     - a tile is keyed by (row index, zoom level, tile x, tile y). The zoom level is the time per pixel that it was drawn at,
+	       tile x is which TILE_WIDTH pixels it covers, counting from time 0 at that zoom level, and tile y is which
+	       TILE_HEIGHT pixels it covers, counting from the top of the row
+	     - the least recently used tiles are dropped once they take more than max_bytes
+	     - the tiles can be any object, so this doesn't depend on cairo """
+
+	def __init__(self, max_bytes = TILE_CACHE_MAX_BYTES):
+		self._max_bytes = max_bytes
+
+		# (tile, number of bytes, finish time) of each key, least recently used first
+		self._tiles = OrderedDict()
+		self._num_bytes = 0
+
+		# the number of tiles at each zoom level
+		self._zoom_levels = {}
+
+	def get_zoom_level(self, time_per_pixel):
+		""" return the zoom level of the tiles that is within ZOOM_LEVEL_TOLERANCE of time_per_pixel, or time_per_pixel if there isn't one """
+		for zoom_level in self._zoom_levels:
+			if abs(zoom_level - time_per_pixel) <= (zoom_level * ZOOM_LEVEL_TOLERANCE):
+				return zoom_level
+		return time_per_pixel
+
+	def get_tile(self, row_index, zoom_level, tile_x, tile_y):
+		""" return a tile, or None if it isn't cached """
+		key = (row_index, zoom_level, tile_x, tile_y)
+		entry = self._tiles.pop(key, None)
+		if entry == None:
+			return None
+		# move to the most recently used end
+		self._tiles[key] = entry
+		return entry[0]
+
+	def add_tile(self, row_index, zoom_level, tile_x, tile_y, tile, num_bytes):
+		""" add a tile that takes num_bytes, and drop the least recently used tiles until the tiles fit in max_bytes
+		     - the tile that was added is always kept, so that it can be drawn """
+		key = (row_index, zoom_level, tile_x, tile_y)
+		if key in self._tiles:
+			self._remove(key)
+
+		self._tiles[key] = (tile, num_bytes, (tile_x + 1) * TILE_WIDTH * zoom_level)
+		self._num_bytes += num_bytes
+		self._zoom_levels[zoom_level] = self._zoom_levels.get(zoom_level, 0) + 1
+
+		while (self._num_bytes > self._max_bytes) and (len(self._tiles) > 1):
+			self._remove(next(iter(self._tiles)))
+
+	def invalidate_after(self, time):
+		""" drop the tiles that can show anything at or after time, i.e. after more samples are added to the profile
+		     - a pixel column is drawn from everything in it, so tiles that finish less than a pixel before time are dropped too """
+		for key, (tile, num_bytes, finish_time) in self._tiles.items():
+			if (finish_time + key[1]) > time:
+				self._remove(key)
+
+	def clear(self):
+		self._tiles.clear()
+		self._num_bytes = 0
+		self._zoom_levels.clear()
+
+	def get_num_tiles(self):
+		return len(self._tiles)
+
+	def get_num_bytes(self):
+		return self._num_bytes
+
+	def _remove(self, key):
+		(tile, num_bytes, finish_time) = self._tiles.pop(key)
+		self._num_bytes -= num_bytes
+
+		zoom_level = key[1]
+		self._zoom_levels[zoom_level] -= 1
+		if not self._zoom_levels[zoom_level]:
+			del self._zoom_levels[zoom_level]
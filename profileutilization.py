@@ -0,0 +1,172 @@
+import argparse
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import izip, repeat
+
+from profiledata import CounterData, TIME_TYPECODE
+
+# Note: label of the counter of the number of active threads
+UTILIZATION_COUNTER_LABEL = "Active threads"
+
+class ProfileUtilization:
+	""" the number of threads that are busy over time, to find where work is serialised
+	     - a thread is busy while it has a finished sample on the bottom of its call stack
+	     - the start and finish times of every thread's root samples are swept in one pass, in time order, to build a step function
+	       of the number of active threads. This is kept as a CounterData, so that it's drawn like the other counters,
+	       and summarised at several resolutions by its CounterLevelOfDetail
+	     - the busy time of each thread is accumulated over its root samples, so the busy ratio of a thread
+	       in any time range only needs two bisects """
+
+	def __init__(self, profile_data):
+		self._counter_data = CounterData(-1, UTILIZATION_COUNTER_LABEL)
+
+		# for each thread, the start and finish times of its finished root samples, and the busy time before each of them
+		self._thread_start_times = []
+		self._thread_finish_times = []
+		self._thread_busy_times = []
+
+		for index in xrange(profile_data.get_num_threads()):
+			thread_data = profile_data.get_thread(index)
+			sample_start_times = thread_data.get_sample_start_times()
+			sample_finish_times = thread_data.get_sample_finish_times()
+
+			roots = thread_data.get_root_sample_indices()
+			if roots and not thread_data.get_sample_ends()[roots[-1]]:
+				# only the last root sample can be open, and it isn't counted until it finishes
+				roots = roots[:-1]
+
+			start_times = array(TIME_TYPECODE, [sample_start_times[root] for root in roots])
+			finish_times = array(TIME_TYPECODE, [sample_finish_times[root] for root in roots])
+			busy_times = array(TIME_TYPECODE, [0])
+			busy_time = 0
+			for start_time, finish_time in izip(start_times, finish_times):
+				busy_time += finish_time - start_time
+				busy_times.append(busy_time)
+
+			self._thread_start_times.append(start_times)
+			self._thread_finish_times.append(finish_times)
+			self._thread_busy_times.append(busy_times)
+
+		# each thread's root samples are in time order, so the endpoints of every thread are merged rather than sorted,
+		#  with finishes before starts at the same time, so that back to back samples don't count as two active threads
+		endpoints = heapq.merge(*([izip(finish_times, repeat(-1)) for finish_times in self._thread_finish_times] +
+		                          [izip(start_times, repeat(1)) for start_times in self._thread_start_times]))
+
+		# the times that the number of active threads changes, and the number from then on
+		step_times = []
+		step_values = []
+		active_threads = 0
+		step_time = None
+		for (time, change) in endpoints:
+			if time != step_time:
+				if (step_time != None) and ((not step_values) or (active_threads != step_values[-1])):
+					step_times.append(step_time)
+					step_values.append(active_threads)
+				step_time = time
+			active_threads += change
+		if (step_time != None) and ((not step_values) or (active_threads != step_values[-1])):
+			step_times.append(step_time)
+			step_values.append(active_threads)
+
+		self._counter_data.add_values(step_times, step_values)
+		self._counter_data.finalize()
+
+	def get_counter_data(self):
+		""" return the CounterData of the number of active threads, which has a sample each time the number changes """
+		return self._counter_data
+
+	def get_active_threads_at_time(self, time):
+		""" return the number of threads that are active at a time """
+		index = self._counter_data.get_sample_index_at_time(time)
+		if index < 0:
+			return 0
+		return self._counter_data.get_sample_values()[index]
+
+	def get_active_time_histogram(self):
+		""" return a list of the total time that exactly n threads were active, for each n from 0 to the most active threads """
+
+		histogram = [0] * (self._counter_data.get_max_value() + 1)
+		times = self._counter_data.get_sample_times()
+		values = self._counter_data.get_sample_values()
+		for (time, next_time, active_threads) in izip(times, times[1:], values):
+			histogram[active_threads] += next_time - time
+		return histogram
+
+	def get_mean_active_threads(self):
+		""" return the mean number of active threads, between the first sample starting and the last sample finishing """
+
+		histogram = self.get_active_time_histogram()
+		total_time = sum(histogram)
+		if not total_time:
+			return 0.0
+		return float(sum(active_threads * duration for active_threads, duration in enumerate(histogram))) / total_time
+
+	def get_thread_busy_time(self, thread_index, start_time, finish_time):
+		""" return the time that a thread was busy during [start_time, finish_time] """
+
+		start_times = self._thread_start_times[thread_index]
+		finish_times = self._thread_finish_times[thread_index]
+		# the root samples that overlap the range
+		first = bisect_right(finish_times, start_time)
+		end = bisect_left(start_times, finish_time)
+		if first >= end:
+			return 0
+
+		busy_times = self._thread_busy_times[thread_index]
+		busy_time = busy_times[end] - busy_times[first]
+		# only count the parts of the first and last samples that are in the range
+		busy_time -= max(0, start_time - start_times[first])
+		busy_time -= max(0, finish_times[end - 1] - finish_time)
+		return busy_time
+
+	def get_thread_busy_ratio(self, thread_index, start_time, finish_time):
+		""" return the fraction of [start_time, finish_time] that a thread was busy """
+		if finish_time <= start_time:
+			return 0.0
+		return float(self.get_thread_busy_time(thread_index, start_time, finish_time)) / (finish_time - start_time)
+
+	def get_thread_busy_ratios(self, thread_index, start_time, finish_time, num_buckets):
+		""" return the busy ratio of a thread in each of num_buckets equal parts of [start_time, finish_time] """
+		bucket_duration = float(finish_time - start_time) / num_buckets
+		return [self.get_thread_busy_ratio(thread_index, start_time + (bucket * bucket_duration), start_time + ((bucket + 1) * bucket_duration)) for bucket in xrange(num_buckets)]
+
+def print_utilization(profile_data, utilization, num_buckets):
+	""" print the time that each number of threads was active for, and the busy ratio of each thread over the profile """
+
+	histogram = utilization.get_active_time_histogram()
+	total_time = sum(histogram)
+	print "%14s %12s %8s" % ("active threads", "time", "percent")
+	for active_threads, duration in enumerate(histogram):
+		print "%14d %12d %7.1f%%" % (active_threads, duration, (100.0 * duration / total_time) if total_time else 0.0)
+	print "mean active threads: %.2f" % utilization.get_mean_active_threads()
+	print
+
+	start_time = profile_data.get_start_time()
+	finish_time = profile_data.get_finish_time()
+	print "%8s %s  %s" % ("busy", "busy in each part of the profile".ljust(num_buckets * 4), "thread")
+	for index in xrange(profile_data.get_num_threads()):
+		ratios = utilization.get_thread_busy_ratios(index, start_time, finish_time, num_buckets)
+		print "%7.1f%% %s  %s" % (100.0 * utilization.get_thread_busy_ratio(index, start_time, finish_time), "".join("%4d" % int(round(100.0 * ratio)) for ratio in ratios), profile_data.get_thread(index).get_label())
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Print how many threads were active over time, and how busy each thread was, to find where work is serialised")
+	parser.add_argument('--filename', '-f', default='profile.txt', help='file path to profile.txt file, or a binary profile file')
+	parser.add_argument('--buckets', '-b', type=int, default=10, help='number of parts of the profile to print the busy percentage of each thread in')
+	args = parser.parse_args()
+	return args
+
+if __name__ == "__main__":
+	from profiledata import ProfileData
+	from profileparser import ProfileParser
+	from profilebinary import ProfileBinaryLoader, is_binary_profile
+
+	args = parse_args()
+
+	profile_data = ProfileData()
+	if is_binary_profile(args.filename):
+		ProfileBinaryLoader(profile_data).load_file(args.filename)
+	else:
+		ProfileParser(profile_data).load_file(args.filename)
+
+	print_utilization(profile_data, profile_data.get_utilization(), args.buckets)
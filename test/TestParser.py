@@ -147,4 +147,65 @@ class TestParser(PyMockTestCase):
 		self.expectAndReturn(mock_consumer.on_counter_value(132, 22, 44), None)
 		self.replay()
 		parser.parse("D 132 22 44")
-		self.verify()
\ No newline at end of file
+		self.verify()
+
+	def test_should_parse_sample_records_in_batches(self):
+		mock_consumer = self.mock()
+		parser = ProfileParser(mock_consumer)
+
+		self.expectAndReturn(mock_consumer.on_samples_batch(['S','S','E','E'], [0,0,0,0], [1,2,2,1], [10,11,12,13]), None)
+		self.replay()
+		parser.feed("S 0 1 10\nS 0 2 11\nE 0 2 12\nE 0 1 13\n")
+		parser.flush()
+		self.verify()
+
+	def test_should_parse_registrations_between_batches(self):
+		mock_consumer = self.mock()
+		parser = ProfileParser(mock_consumer)
+
+		self.expectAndReturn(mock_consumer.on_thread(0, "My Thread Name"), None)
+		self.expectAndReturn(mock_consumer.on_function(0, 0, "My function name"), None)
+		self.expectAndReturn(mock_consumer.on_samples_batch(['S','E'], [0,0], [0,0], [10,20]), None)
+		self.expectAndReturn(mock_consumer.on_function(0, 1, "Another function"), None)
+		self.expectAndReturn(mock_consumer.on_samples_batch(['S','E'], [0,0], [1,1], [30,40]), None)
+		self.replay()
+		parser.feed("T 0 My Thread Name\nF 0 0 My function name\nS 0 0 10\nE 0 0 20\n# a comment\nF 0 1 Another function\nS 0 1 30\nE 0 1 40\n")
+		parser.flush()
+		self.verify()
+
+	def test_should_buffer_incomplete_lines_between_feeds(self):
+		mock_consumer = self.mock()
+		parser = ProfileParser(mock_consumer)
+
+		self.expectAndReturn(mock_consumer.on_samples_batch(['S'], [2], [1], [444]), None)
+		self.expectAndReturn(mock_consumer.on_samples_batch(['E'], [2], [1], [555]), None)
+		self.replay()
+		parser.feed("S 2 1 4")
+		parser.feed("44\nE 2 1 55")
+		parser.feed("5")
+		parser.flush()
+		self.verify()
+
+	def test_should_parse_event_emits_and_counter_values_in_batches(self):
+		mock_consumer = self.mock()
+		parser = ProfileParser(mock_consumer)
+
+		# each run of records is one batch, in file order
+		self.expectAndReturn(mock_consumer.on_samples_batch(['S'], [0], [1], [10]), None)
+		self.expectAndReturn(mock_consumer.on_counter_values_batch([132], [12], [-44]), None)
+		self.expectAndReturn(mock_consumer.on_event_emits_batch([0,0], [113,113], [15,16]), None)
+		self.expectAndReturn(mock_consumer.on_counter_values_batch([132], [22], [44]), None)
+		self.expectAndReturn(mock_consumer.on_samples_batch(['E'], [0], [1], [20]), None)
+		self.replay()
+		parser.feed("S 0 1 10\nD 132 12 -44\nY 0 113 15\nY 0 113 16\nD 132 22 44\nE 0 1 20\n")
+		parser.flush()
+		self.verify()
+
+	def test_should_only_accept_integer_fields_in_batches(self):
+		mock_consumer = self.mock()
+		parser = ProfileParser(mock_consumer)
+
+		self.replay()
+		for line in ["S 0 1 1e5\n", "E 0 1 true\n", "Y 0 1 NaN\n"]:
+			self.assertRaises(ValueError, parser.feed, line)
+		self.verify()
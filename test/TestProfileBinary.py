@@ -0,0 +1,113 @@
+import nose
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profileparser import ProfileParser
+from profilebinary import ProfileBinaryLoader, convert_text_to_binary, is_binary_profile
+from nose.tools import *
+
+EXAMPLE_PROFILE = os.path.join(os.path.dirname(__file__), 'data', 'example_profile.txt')
+
+class TestProfileBinary:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+
+	def teardown(self):
+		shutil.rmtree(self._temp_dir)
+
+	def _write_text_profile(self, lines):
+		filename = os.path.join(self._temp_dir, 'profile.txt')
+		with open(filename, 'w') as file:
+			file.write('\n'.join(lines))
+		return filename
+
+	def _convert(self, text_filename):
+		binary_filename = os.path.join(self._temp_dir, 'profile.bin')
+		convert_text_to_binary(text_filename, binary_filename)
+		return binary_filename
+
+	def test_should_detect_binary_profile(self):
+		binary_filename = self._convert(EXAMPLE_PROFILE)
+
+		assert_true(is_binary_profile(binary_filename))
+		assert_false(is_binary_profile(EXAMPLE_PROFILE))
+
+	def test_should_load_samples_from_converted_profile(self):
+		profile_data = ProfileData()
+		ProfileBinaryLoader(profile_data).load_file(self._convert(EXAMPLE_PROFILE))
+
+		assert_equals(3, profile_data.get_num_threads())
+		thread_data = profile_data.get_thread(0)
+		assert_equals("My First Thread", thread_data.get_label())
+		assert_equals(3, thread_data.get_num_functions())
+		assert_equals("Third Function on First Thread", thread_data.get_function(2).get_label())
+
+		samples = thread_data.get_samples()
+		assert_equals(2, len(samples))
+		assert_equals(0, samples[0].get_start_time())
+		assert_equals(1000, samples[0].get_finish_time())
+		assert_equals(1100, samples[1].get_start_time())
+		assert_equals(3000, samples[1].get_finish_time())
+		children = samples[1].get_children()
+		assert_equals(1, len(children))
+		assert_equals(thread_data.get_function(2), children[0].get_function())
+		assert_equals(1400, children[0].get_start_time())
+		assert_equals(2000, children[0].get_finish_time())
+		assert_equals(2, thread_data.get_max_stack_depth())
+
+		thread_data = profile_data.get_thread(1)
+		assert_equals("My Second Thread", thread_data.get_label())
+		assert_equals(2, len(thread_data.get_samples()))
+
+		assert_equals(0, profile_data.get_start_time())
+		assert_equals(2900, profile_data.get_finish_time())
+
+	def test_should_load_events_and_counters_from_converted_profile(self):
+		text_filename = self._write_text_profile([
+			"T 0 my thread",
+			"V 0 0 my event",
+			"C 0 my counter",
+			"Y 0 0 100",
+			"D 0 110 -5",
+			"D 0 120 7",
+			"Y 0 0 200"])
+
+		profile_data = ProfileData()
+		ProfileBinaryLoader(profile_data).load_file(self._convert(text_filename))
+
+		thread_data = profile_data.get_thread(0)
+		assert_equals("my event", thread_data.get_event(0).get_label())
+		assert_equals(2, thread_data.get_num_event_samples())
+		assert_equals(100, thread_data.get_event_sample(0).get_time())
+		assert_equals(200, thread_data.get_event_sample(1).get_time())
+
+		counter_data = profile_data.get_counter(0)
+		assert_equals("my counter", counter_data.get_label())
+		samples = counter_data.get_samples()
+		assert_equals(2, len(samples))
+		assert_equals(110, samples[0].get_time())
+		assert_equals(-5, samples[0].get_value())
+		assert_equals(120, samples[1].get_time())
+		assert_equals(7, samples[1].get_value())
+
+	def test_should_load_counter_values_past_32_bits_from_converted_profile(self):
+		text_filename = self._write_text_profile([
+			"C 0 memory",
+			"D 0 10 3000000000",
+			"D 0 20 -3000000000"])
+
+		profile_data = ProfileData()
+		ProfileBinaryLoader(profile_data).load_file(self._convert(text_filename))
+
+		samples = profile_data.get_counter(0).get_samples()
+		assert_equals([(10, 3000000000), (20, -3000000000)], [(sample.get_time(), sample.get_value()) for sample in samples])
+
+	@raises(ValueError)
+	def test_should_fail_to_load_text_profile(self):
+		ProfileBinaryLoader(ProfileData()).load_file(EXAMPLE_PROFILE)
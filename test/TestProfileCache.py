@@ -0,0 +1,134 @@
+import nose
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profileparser import ProfileParser
+from profilecache import ProfileCache
+from nose.tools import *
+
+EXAMPLE_PROFILE = os.path.join(os.path.dirname(__file__), 'data', 'example_profile.txt')
+
+class TestProfileCache:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+		self._cache_dir = os.path.join(self._temp_dir, 'cache')
+
+	def teardown(self):
+		shutil.rmtree(self._temp_dir)
+
+	def _write_text_profile(self, name, lines):
+		filename = os.path.join(self._temp_dir, name)
+		with open(filename, 'w') as file:
+			file.write('\n'.join(lines))
+		return filename
+
+	def _load(self, filename):
+		profile_data = ProfileData()
+		ProfileParser(profile_data).load_file(filename)
+		return profile_data
+
+	def test_should_miss_empty_cache(self):
+		assert_equals(None, ProfileCache(self._cache_dir).load(EXAMPLE_PROFILE))
+
+	def test_should_load_saved_profile_data(self):
+		profile_cache = ProfileCache(self._cache_dir)
+		profile_cache.save(EXAMPLE_PROFILE, self._load(EXAMPLE_PROFILE))
+
+		profile_data = profile_cache.load(EXAMPLE_PROFILE)
+
+		assert_equals(3, profile_data.get_num_threads())
+		thread_data = profile_data.get_thread(0)
+		assert_equals("My First Thread", thread_data.get_label())
+		samples = thread_data.get_samples()
+		assert_equals(2, len(samples))
+		assert_equals(1100, samples[1].get_start_time())
+		assert_equals(3000, samples[1].get_finish_time())
+		child = samples[1].get_children()[0]
+		assert_equals(samples[1], child.get_parent())
+		assert_equals(thread_data.get_function(2), child.get_function())
+		assert_equals(2, thread_data.get_max_stack_depth())
+		assert_equals(2900, profile_data.get_finish_time())
+
+	def test_should_miss_when_options_change(self):
+		profile_cache = ProfileCache(self._cache_dir)
+		profile_cache.save(EXAMPLE_PROFILE, self._load(EXAMPLE_PROFILE), (None, False))
+
+		assert_not_equals(None, profile_cache.load(EXAMPLE_PROFILE, (None, False)))
+		assert_equals(None, profile_cache.load(EXAMPLE_PROFILE, (None, True)))
+
+	def test_should_miss_when_file_changes(self):
+		filename = self._write_text_profile('profile.txt', ["T 0 my thread"])
+		profile_cache = ProfileCache(self._cache_dir)
+		profile_cache.save(filename, self._load(filename))
+
+		self._write_text_profile('profile.txt', ["T 0 my other thread"])
+
+		assert_equals(None, profile_cache.load(filename))
+
+	def test_should_rebuild_damaged_cache_file(self):
+		profile_cache = ProfileCache(self._cache_dir)
+		cache_filename = profile_cache.get_cache_filename(EXAMPLE_PROFILE)
+		os.makedirs(self._cache_dir)
+		with open(cache_filename, 'wb') as cache_file:
+			cache_file.write('not a cache file')
+
+		assert_equals(None, profile_cache.load(EXAMPLE_PROFILE))
+		assert_false(os.path.exists(cache_filename))
+
+	def test_should_evict_least_recently_used(self):
+		filenames = [self._write_text_profile('profile%d.txt' % i, ["T 0 thread %d" % i]) for i in range(3)]
+
+		profile_cache = ProfileCache(self._cache_dir)
+		for filename in filenames[:2]:
+			profile_cache.save(filename, self._load(filename))
+
+		cache_filenames = [profile_cache.get_cache_filename(filename) for filename in filenames]
+		cache_file_size = os.path.getsize(cache_filenames[0])
+
+		# make the first cache file the most recently used
+		os.utime(cache_filenames[0], (2000000000, 2000000000))
+		os.utime(cache_filenames[1], (1000000000, 1000000000))
+
+		profile_cache = ProfileCache(self._cache_dir, max_size = (2 * cache_file_size) + 1)
+		profile_cache.save(filenames[2], self._load(filenames[2]))
+
+		assert_true(os.path.exists(cache_filenames[0]))
+		assert_false(os.path.exists(cache_filenames[1]))
+
+	def test_should_load_open_samples_events_and_counters(self):
+		filename = self._write_text_profile('profile.txt', [
+			"T 0 my thread",
+			"F 0 0 my function",
+			"V 0 0 my event",
+			"C 0 my counter",
+			"S 0 0 100",
+			"Y 0 0 110",
+			"D 0 120 -5",
+			"S 0 0 130"])
+
+		profile_cache = ProfileCache(self._cache_dir)
+		profile_cache.save(filename, self._load(filename))
+		profile_data = profile_cache.load(filename)
+
+		assert_equals(100, profile_data.get_open_sample_start_time())
+		thread_data = profile_data.get_thread(0)
+		assert_equals(1, thread_data.get_num_event_samples())
+		assert_equals(thread_data.get_event(0), thread_data.get_event_sample(0).get_event())
+		assert_equals(110, thread_data.get_event_sample(0).get_time())
+
+		# parsing can carry on from the open samples
+		thread_data.on_sample_finish(0, 140)
+		thread_data.on_sample_finish(0, 150)
+		sample = thread_data.get_samples()[0]
+		assert_equals(50, sample.get_duration())
+		assert_equals(10, sample.get_children()[0].get_duration())
+
+		samples = profile_data.get_counter(0).get_samples()
+		assert_equals(1, len(samples))
+		assert_equals(-5, samples[0].get_value())
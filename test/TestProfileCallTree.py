@@ -0,0 +1,107 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from StringIO import StringIO
+
+from profiledata import ProfileData
+from profilecalltree import build_call_tree
+from nose.tools import *
+
+class TestProfileCallTree:
+
+	def create_profile_data(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "main")
+		profile_data.on_function(0, 1, "update")
+		profile_data.on_function(0, 2, "draw")
+
+		# main -> update, update -> draw, draw
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_start(0, 1, 10)
+		profile_data.on_sample_finish(0, 1, 20)
+		profile_data.on_sample_start(0, 1, 20)
+		profile_data.on_sample_start(0, 2, 25)
+		profile_data.on_sample_finish(0, 2, 35)
+		profile_data.on_sample_finish(0, 1, 40)
+		profile_data.on_sample_start(0, 2, 50)
+		profile_data.on_sample_finish(0, 2, 60)
+		profile_data.on_sample_finish(0, 0, 100)
+		return profile_data
+
+	def test_should_merge_identical_call_paths(self):
+		profile_data = self.create_profile_data()
+		call_tree = profile_data.get_thread(0).get_call_tree()
+
+		assert_equals(5, call_tree.get_num_nodes())
+		assert_equals(None, call_tree.get_node_parent(0))
+		assert_equals(100, call_tree.get_node_inclusive_time(0))
+
+		main = call_tree.get_node_child(0, "main")
+		assert_equals(["main"], call_tree.get_node_path(main))
+		assert_equals(1, call_tree.get_node_call_count(main))
+		assert_equals(100, call_tree.get_node_inclusive_time(main))
+		assert_equals(60, call_tree.get_node_exclusive_time(main))
+
+		update = call_tree.get_node_child(main, "update")
+		assert_equals(2, call_tree.get_node_call_count(update))
+		assert_equals(30, call_tree.get_node_inclusive_time(update))
+		assert_equals(20, call_tree.get_node_exclusive_time(update))
+
+		update_draw = call_tree.get_node_child(update, "draw")
+		main_draw = call_tree.get_node_child(main, "draw")
+		assert_equals(["main", "update", "draw"], call_tree.get_node_path(update_draw))
+		assert_equals(10, call_tree.get_node_inclusive_time(update_draw))
+		assert_equals(10, call_tree.get_node_inclusive_time(main_draw))
+		assert_equals([main_draw, update], call_tree.get_node_children(main))
+
+	def test_should_merge_threads(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_thread(1, "my thread")
+		profile_data.on_function(1, 0, "main")
+		profile_data.on_sample_start(1, 0, 0)
+		profile_data.on_sample_finish(1, 0, 50)
+
+		call_tree = build_call_tree(profile_data)
+		assert_equals(150, call_tree.get_node_inclusive_time(0))
+		thread = call_tree.get_node_child(0, "my thread")
+		assert_equals(150, call_tree.get_node_inclusive_time(thread))
+		main = call_tree.get_node_child(thread, "main")
+		assert_equals(2, call_tree.get_node_call_count(main))
+		assert_equals(110, call_tree.get_node_exclusive_time(main))
+
+		call_tree = build_call_tree(profile_data, merge_threads=True)
+		assert_equals(["main"], call_tree.get_node_path(call_tree.get_node_children(0)[0]))
+
+	def test_should_ignore_open_samples(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "main")
+		profile_data.on_function(0, 1, "update")
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_start(0, 1, 10)
+		profile_data.on_sample_finish(0, 1, 30)
+
+		call_tree = profile_data.get_thread(0).get_call_tree()
+		main = call_tree.get_node_child(0, "main")
+		assert_equals(0, call_tree.get_node_call_count(main))
+		assert_equals(0, call_tree.get_node_inclusive_time(main))
+		assert_equals(20, call_tree.get_node_inclusive_time(call_tree.get_node_child(main, "update")))
+
+	def test_should_write_folded_stacks(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_function(0, 3, "a;b")
+		profile_data.on_sample_start(0, 3, 100)
+		profile_data.on_sample_finish(0, 3, 105)
+
+		output = StringIO()
+		build_call_tree(profile_data).write_folded_stacks(output)
+		assert_equals([
+			"my thread;main 60",
+			"my thread;main;update 20",
+			"my thread;main;update;draw 10",
+			"my thread;main;draw 10",
+			"my thread;a:b 5"
+		], output.getvalue().splitlines())
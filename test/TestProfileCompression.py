@@ -0,0 +1,124 @@
+import nose
+
+import bz2
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import threading
+sys.path.insert(0,'..')
+
+import profilecompression
+from profiledata import ProfileData
+from profileparser import ProfileParser
+from profilecompression import get_compression, read_blocks
+from nose.plugins.skip import SkipTest
+from nose.tools import *
+
+EXAMPLE_PROFILE = os.path.join(os.path.dirname(__file__), 'data', 'example_profile.txt')
+
+class LineConsumer:
+	""" consumer that only implements the per-record interface """
+
+	def __init__(self):
+		self.threads = []
+
+	def on_thread(self, thread_id, thread_label):
+		self.threads.append(thread_label)
+
+	def on_function(self, thread_id, function_id, function_label):
+		pass
+
+	def on_sample_start(self, thread_id, function_id, start_time):
+		pass
+
+	def on_sample_finish(self, thread_id, function_id, finish_time):
+		pass
+
+class TestProfileCompression:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+		with open(EXAMPLE_PROFILE, 'rb') as file:
+			self._content = file.read()
+
+	def teardown(self):
+		shutil.rmtree(self._temp_dir)
+
+	def _write_gzip(self, contents):
+		filename = os.path.join(self._temp_dir, 'profile.txt.gz')
+		with open(filename, 'wb') as file:
+			for content in contents:
+				gzip_file = gzip.GzipFile(fileobj=file, mode='wb')
+				gzip_file.write(content)
+				gzip_file.close()
+		return filename
+
+	def _write_bz2(self, content):
+		filename = os.path.join(self._temp_dir, 'profile.txt.bz2')
+		with open(filename, 'wb') as file:
+			file.write(bz2.compress(content))
+		return filename
+
+	def _load(self, filename):
+		profile_data = ProfileData()
+		ProfileParser(profile_data).load_file(filename)
+		return profile_data
+
+	def _assert_example_profile(self, profile_data):
+		assert_equals(3, profile_data.get_num_threads())
+		thread_data = profile_data.get_thread(0)
+		assert_equals("My First Thread", thread_data.get_label())
+		samples = thread_data.get_samples()
+		assert_equals(2, len(samples))
+		assert_equals(1100, samples[1].get_start_time())
+		assert_equals(3000, samples[1].get_finish_time())
+		assert_equals(2900, profile_data.get_finish_time())
+
+	def test_should_detect_compression(self):
+		assert_equals(None, get_compression(EXAMPLE_PROFILE))
+		assert_equals('gzip', get_compression(self._write_gzip([self._content])))
+		assert_equals('bz2', get_compression(self._write_bz2(self._content)))
+
+	def test_should_load_gzip_profile(self):
+		self._assert_example_profile(self._load(self._write_gzip([self._content])))
+
+	def test_should_load_bz2_profile(self):
+		self._assert_example_profile(self._load(self._write_bz2(self._content)))
+
+	def test_should_load_concatenated_gzip_profile(self):
+		middle = self._content.index('\n', len(self._content) / 2) + 1
+		filename = self._write_gzip([self._content[:middle], self._content[middle:]])
+
+		self._assert_example_profile(self._load(filename))
+
+	def test_should_load_xz_profile(self):
+		if not profilecompression.lzma:
+			raise SkipTest("lzma module is not installed")
+
+		filename = os.path.join(self._temp_dir, 'profile.txt.xz')
+		with open(filename, 'wb') as file:
+			file.write(profilecompression.lzma.compress(self._content))
+
+		self._assert_example_profile(self._load(filename))
+
+	def test_should_load_compressed_profile_one_line_at_a_time(self):
+		consumer = LineConsumer()
+		ProfileParser(consumer).load_file(self._write_gzip([self._content]))
+
+		assert_equals(["My First Thread", "My Second Thread", "A Third Thread"], consumer.threads)
+
+	def test_should_stop_decompressing_when_reader_stops(self):
+		filename = self._write_gzip([self._content * 1000])
+
+		old_block_size = profilecompression.COMPRESSED_BLOCK_SIZE
+		profilecompression.COMPRESSED_BLOCK_SIZE = 64
+		try:
+			blocks = read_blocks(filename, 0)
+			blocks.next()
+			blocks.close()
+		finally:
+			profilecompression.COMPRESSED_BLOCK_SIZE = old_block_size
+
+		assert_false("ProfileDecompressor" in [thread.name for thread in threading.enumerate()])
@@ -81,6 +81,7 @@ class TestProfileData:
 		assert_equals(None, sample.get_parent())
 		assert_equals(function_data, sample.get_function())
 
+		profile_data.finalize()
 		assert_equals(1, thread_data.get_max_stack_depth())
 
 		profile_data.on_sample_finish(0,0,12)
@@ -123,6 +124,7 @@ class TestProfileData:
 		profile_data.on_sample_finish(1,0,400)
 		profile_data.on_sample_finish(1,0,500)
 		profile_data.on_sample_finish(1,0,600)
+		profile_data.finalize()
 
 		thread_data_1 = profile_data.get_thread(0)
 		thread_data_2 = profile_data.get_thread(1)
@@ -185,6 +187,86 @@ class TestProfileData:
 		assert_equals(5, profile_data.get_start_time())
 		assert_equals(600, profile_data.get_finish_time())
 
+	def test_should_consume_sample_data_in_batches(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_thread(1, "another thread")
+		profile_data.on_function(0, 0, "my first function")
+		profile_data.on_function(0, 1, "my second function")
+		profile_data.on_function(1, 0, "2nd thread first function")
+
+		profile_data.on_samples_batch(['S','S','S','E','E','E'], [0,1,0,0,1,0], [0,0,1,1,0,0], [5,6,7,8,9,10])
+		profile_data.on_samples_batch(['S','E'], [0,0], [1,1], [20,30])
+		profile_data.finalize()
+
+		thread_data_1 = profile_data.get_thread(0)
+		thread_data_2 = profile_data.get_thread(1)
+
+		samples = thread_data_1.get_samples()
+		assert_equals(2, len(samples))
+		assert_equals(thread_data_1.get_function(0), samples[0].get_function())
+		assert_equals(5, samples[0].get_start_time())
+		assert_equals(10, samples[0].get_finish_time())
+		children = samples[0].get_children()
+		assert_equals(1, len(children))
+		assert_equals(thread_data_1.get_function(1), children[0].get_function())
+		assert_equals(7, children[0].get_start_time())
+		assert_equals(8, children[0].get_finish_time())
+		assert_equals(20, samples[1].get_start_time())
+		assert_equals(30, samples[1].get_finish_time())
+		assert_equals(2, thread_data_1.get_max_stack_depth())
+
+		samples = thread_data_2.get_samples()
+		assert_equals(1, len(samples))
+		assert_equals(6, samples[0].get_start_time())
+		assert_equals(9, samples[0].get_finish_time())
+
+		assert_equals(5, profile_data.get_start_time())
+		assert_equals(30, profile_data.get_finish_time())
+
+	def test_should_consume_event_emits_and_counter_values_in_batches(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_event(0, 0, "my first event")
+		profile_data.on_counter(0, "my counter")
+
+		profile_data.on_event_emits_batch([0,0], [0,0], [100,200])
+		profile_data.on_counter_values_batch([0,0,0], [1,200,3000], [3,-2,1])
+		profile_data.finalize()
+
+		thread = profile_data.get_thread(0)
+		assert_equals(2, thread.get_num_event_samples())
+		assert_equals(100, thread.get_event_sample(0).get_time())
+		assert_equals(200, thread.get_event_sample(1).get_time())
+
+		counter_0 = profile_data.get_counter(0)
+		samples = counter_0.get_samples()
+		assert_equals(3, len(samples))
+		assert_equals(200, samples[1].get_time())
+		assert_equals(-2, samples[1].get_value())
+		assert_equals(3, counter_0.get_max_value())
+		assert_equals(-2, counter_0.get_min_value())
+
+	def test_should_report_open_sample_start_time(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_thread(1, "another thread")
+		profile_data.on_function(0, 0, "my first function")
+		profile_data.on_function(1, 0, "2nd thread first function")
+		assert_equals(None, profile_data.get_open_sample_start_time())
+
+		profile_data.on_sample_start(0,0,10)
+		profile_data.on_sample_start(0,0,20)
+		profile_data.on_sample_start(1,0,15)
+		assert_equals(10, profile_data.get_thread(0).get_open_sample_start_time())
+		assert_equals(15, profile_data.get_thread(1).get_open_sample_start_time())
+		assert_equals(10, profile_data.get_open_sample_start_time())
+
+		profile_data.on_sample_finish(0,0,25)
+		profile_data.on_sample_finish(0,0,30)
+		assert_equals(None, profile_data.get_thread(0).get_open_sample_start_time())
+		assert_equals(15, profile_data.get_open_sample_start_time())
+
 	def test_should_merge_restarted_threads(self):
 		profile_data = ProfileData()
 		profile_data.on_thread(0, "my duplicate thread")
@@ -228,6 +310,7 @@ class TestProfileData:
 		assert_equals(6, profile_data.get_num_threads())
 
 		# test number of threads after merge
+		profile_data.finalize()
 		profile_data.merge_restarted_threads()
 		assert_equals(4, profile_data.get_num_threads())
 
@@ -282,6 +365,7 @@ class TestProfileData:
 		profile_data.on_sample_finish(0,0,346)
 		profile_data.on_sample_finish(0,0,350)
 		profile_data.on_sample_finish(0,0,400)
+		profile_data.finalize()
 
 		thread_data_1 = profile_data.get_thread(0)
 
@@ -308,6 +392,179 @@ class TestProfileData:
 
 		assert_equals(3, thread_data_1.get_max_stack_depth())
 
+	def test_should_finalize_samples_added_since_last_finalize(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "my recursive function")
+		profile_data.on_counter(0, "my counter")
+
+		profile_data.on_samples_batch(['S', 'S', 'S', 'E'], [0]*4, [0]*4, [10, 20, 30, 40])
+		profile_data.on_counter_value(0, 10, 5)
+		profile_data.finalize()
+
+		thread_data = profile_data.get_thread(0)
+		assert_equals([2, 1, 0], [thread_data.get_sample_child_call_stack_depth(index) for index in xrange(3)])
+		assert_equals(3, thread_data.get_max_stack_depth())
+		assert_equals(10, thread_data.get_start_time())
+		assert_equals(40, thread_data.get_finish_time())
+		assert_equals(5, profile_data.get_counter(0).get_max_value())
+
+		# the samples that were open at the last finalize get deeper, and finish
+		profile_data.on_samples_batch(['S', 'S', 'S', 'E', 'E', 'E', 'E', 'E'], [0]*8, [0]*8, [50, 60, 70, 80, 90, 100, 110, 120])
+		profile_data.on_counter_value(0, 20, -5)
+		profile_data.finalize()
+
+		assert_equals([4, 3, 0, 2, 1, 0], [thread_data.get_sample_child_call_stack_depth(index) for index in xrange(6)])
+		assert_equals(5, thread_data.get_max_stack_depth())
+		assert_equals(120, thread_data.get_finish_time())
+		assert_equals(-5, profile_data.get_counter(0).get_min_value())
+		assert_equals(5, profile_data.get_counter(0).get_max_value())
+
+	def test_should_index_samples_in_start_order(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "my first function")
+		profile_data.on_function(0, 1, "my second function")
+
+		profile_data.on_samples_batch(['S', 'S', 'E', 'S', 'S', 'E', 'E', 'E', 'S'], [0]*9, [0, 1, 1, 1, 0, 0, 1, 0, 1], [10, 20, 30, 40, 50, 60, 70, 80, 90])
+		profile_data.finalize()
+
+		thread_data = profile_data.get_thread(0)
+		assert_equals(5, thread_data.get_num_samples())
+		assert_equals([0, 4], list(thread_data.get_root_sample_indices()))
+		assert_equals([1, 2], thread_data.get_sample_child_indices(0))
+		assert_equals([3], thread_data.get_sample_child_indices(2))
+		assert_equals(4, thread_data.get_sample_end_index(0))
+		assert_equals(2, thread_data.get_sample_parent_index(3))
+		assert_equals(None, thread_data.get_sample_parent_index(0))
+		assert_equals(40, thread_data.get_sample_start_time(2))
+		assert_equals(70, thread_data.get_sample_finish_time(2))
+		assert_equals(30, thread_data.get_sample_duration(2))
+		assert_equals("my first function", thread_data.get_sample_function(3).get_label())
+		assert_equals(2, thread_data.get_sample_child_call_stack_depth(0))
+
+		# the last sample hasn't finished yet
+		assert_equals(None, thread_data.get_sample_finish_time(4))
+		assert_equals(0, thread_data.get_sample_duration(4))
+		assert_equals(5, thread_data.get_sample_end_index(4))
+		assert_equals(90, thread_data.get_open_sample_start_time())
+
+	def test_should_find_samples_in_time_range(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "my function")
+
+		# samples 0, 1, 2 at depth 0, with 3 children each at depth 1
+		for i in range(3):
+			profile_data.on_sample_start(0, 0, i*100)
+			for j in range(3):
+				profile_data.on_sample_start(0, 0, (i*100) + (j*20) + 10)
+				profile_data.on_sample_finish(0, 0, (i*100) + (j*20) + 20)
+			profile_data.on_sample_finish(0, 0, (i*100) + 90)
+
+		thread_data = profile_data.get_thread(0)
+		assert_equals([0, 4, 8], list(thread_data.get_depth_sample_indices(0)))
+
+		assert_equals([0, 4, 8], list(thread_data.get_sample_indices_in_range(0, 0, 300)))
+		assert_equals([4], list(thread_data.get_sample_indices_in_range(0, 95, 150)))
+		assert_equals([4, 8], list(thread_data.get_sample_indices_in_range(0, 190, 200)))
+		assert_equals([], list(thread_data.get_sample_indices_in_range(0, 91, 99)))
+
+		assert_equals([3, 5], list(thread_data.get_sample_indices_in_range(1, 55, 115)))
+		assert_equals([5], list(thread_data.get_sample_indices_in_range(1, 55, 115, 4)))
+		assert_equals([5, 6, 7], list(thread_data.get_sample_indices_in_range(1, 0, 300, 4)))
+		assert_equals([], list(thread_data.get_sample_indices_in_range(2, 0, 300)))
+
+	def test_should_compare_sample_views(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "my function")
+		profile_data.on_sample_start(0, 0, 10)
+		profile_data.on_sample_start(0, 0, 20)
+
+		thread_data = profile_data.get_thread(0)
+		sample = thread_data.get_samples()[0]
+		child = sample.get_children()[0]
+		assert_equals(sample, child.get_parent())
+		assert_equals(thread_data.get_sample(1), child)
+		assert_not_equals(sample, child)
+		assert_equals(1, len(set([sample, child.get_parent()])))
+
+	def test_should_merge_sample_arrays(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "first thread function")
+		profile_data.on_sample_start(0, 0, 10)
+		profile_data.on_sample_finish(0, 0, 20)
+		profile_data.on_thread(1, "my thread")
+		profile_data.on_function(1, 0, "second thread function")
+		profile_data.on_sample_start(1, 0, 30)
+		profile_data.on_sample_start(1, 0, 40)
+		profile_data.on_sample_finish(1, 0, 50)
+		profile_data.on_sample_finish(1, 0, 60)
+
+		profile_data.finalize()
+		profile_data.merge_restarted_threads()
+
+		assert_equals(1, profile_data.get_num_threads())
+		thread_data = profile_data.get_thread(0)
+		samples = thread_data.get_samples()
+		assert_equals(2, len(samples))
+		assert_equals("second thread function", samples[1].get_function().get_label())
+		assert_equals(30, samples[1].get_start_time())
+		children = samples[1].get_children()
+		assert_equals(1, len(children))
+		assert_equals(samples[1], children[0].get_parent())
+		assert_equals(40, children[0].get_start_time())
+		assert_equals(50, children[0].get_finish_time())
+
+	def test_should_share_functions_and_events_of_merged_threads(self):
+		profile_data = ProfileData()
+		for thread_id in xrange(3):
+			profile_data.on_thread(thread_id, "worker")
+			profile_data.on_function(thread_id, 0, "job")
+			profile_data.on_function(thread_id, 1, "thread %d function" % thread_id)
+			profile_data.on_event(thread_id, 0, "job done")
+			profile_data.on_sample_start(thread_id, 0, thread_id * 100)
+			profile_data.on_sample_start(thread_id, 1, (thread_id * 100) + 10)
+			profile_data.on_sample_finish(thread_id, 1, (thread_id * 100) + 20)
+			profile_data.on_sample_finish(thread_id, 0, (thread_id * 100) + 50)
+
+		# the event on thread 0 is emitted after thread 1 starts
+		profile_data.on_event_emit(0, 0, 150)
+		profile_data.on_event_emit(1, 0, 140)
+		profile_data.on_event_emit(2, 0, 250)
+
+		profile_data.finalize()
+		profile_data.merge_restarted_threads()
+
+		assert_equals(1, profile_data.get_num_threads())
+		thread_data = profile_data.get_thread(0)
+		assert_equals(["job", "thread 0 function", "thread 1 function", "thread 2 function"], [thread_data.get_function(index).get_label() for index in xrange(thread_data.get_num_functions())])
+		assert_equals(["job", "job", "job"], [sample.get_function().get_label() for sample in thread_data.get_samples()])
+		assert_equals("thread 2 function", thread_data.get_samples()[2].get_children()[0].get_function().get_label())
+
+		assert_equals(1, thread_data.get_num_events())
+		assert_equals([140, 150, 250], [event_sample.get_time() for event_sample in thread_data.get_event_samples()])
+		assert_equals([140, 150, 250], list(thread_data.get_event_emit_times(0)))
+		assert_equals(3, thread_data.get_function_stats().get_function_stats(0).get_call_count())
+
+	def test_should_merge_restarted_threads_into_the_first_finished_run(self):
+		profile_data = ProfileData()
+		for thread_id, (start_time, finish_time) in enumerate([(0, 100), (50, 60), (60, 200), (100, 110)]):
+			profile_data.on_thread(thread_id, "worker")
+			profile_data.on_function(thread_id, 0, "job")
+			profile_data.on_sample_start(thread_id, 0, start_time)
+			profile_data.on_sample_finish(thread_id, 0, finish_time)
+
+		profile_data.finalize()
+		profile_data.merge_restarted_threads()
+
+		# 60-200 follows 50-60, and 100-110 follows 0-100
+		assert_equals(2, profile_data.get_num_threads())
+		assert_equals([0, 100], [sample.get_start_time() for sample in profile_data.get_thread(0).get_samples()])
+		assert_equals([50, 60], [sample.get_start_time() for sample in profile_data.get_thread(1).get_samples()])
+
 	def test_should_register_event(self):
 		profile_data = ProfileData()
 		profile_data.on_thread(0, "my thread")
@@ -378,6 +635,30 @@ class TestProfileData:
 		assert_equals(3, thread_1.get_num_event_samples())
 		assert_equals(1, thread_2.get_num_event_samples())
 
+	def test_should_keep_event_samples_in_time_order(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_event(0, 0, "frame")
+		profile_data.on_event(0, 1, "other")
+		profile_data.on_event_emit(0, 0, 10)
+		profile_data.on_event_emit(0, 1, 30)
+		profile_data.on_event_emit(0, 0, 20)
+		profile_data.on_event_emit(0, 0, 40)
+
+		thread = profile_data.get_thread(0)
+		assert_equals([10, 20, 30, 40], [event_sample.get_time() for event_sample in thread.get_event_samples()])
+		assert_equals(["frame", "frame", "other", "frame"], [event_sample.get_event().get_label() for event_sample in thread.get_event_samples()])
+		assert_equals([10, 20, 40], list(thread.get_event_emit_times(0)))
+		assert_equals([30], list(thread.get_event_emit_times(1)))
+
+		assert_equals(0, thread.get_event_index("frame"))
+		assert_equals(1, thread.get_event_index("other"))
+		assert_equals(None, thread.get_event_index("missing"))
+
+		assert_equals((1, 3), thread.get_event_sample_index_range(15, 30))
+		assert_equals((0, 4), thread.get_event_sample_index_range(0, 100))
+		assert_equals((4, 4), thread.get_event_sample_index_range(50, 100))
+
 	def test_should_report_num_counters(self):
 		profile_data = ProfileData()
 		assert_equals(0, profile_data.get_num_counters())
@@ -453,6 +734,32 @@ class TestProfileData:
 		assert_equals(200, samples_1[0].get_time())
 		assert_equals(2, samples_1[0].get_value())
 
+	def test_should_find_counter_samples_in_a_time_range(self):
+		profile_data = ProfileData()
+		profile_data.on_counter(0, "my counter")
+		profile_data.on_counter_values_batch([0, 0, 0], [10, 20, 30], [1, 2, 3])
+		counter_data = profile_data.get_counter(0)
+
+		assert_equals(3, counter_data.get_num_samples())
+		assert_equals(-1, counter_data.get_sample_index_at_time(5))
+		assert_equals(1, counter_data.get_sample_index_at_time(25))
+		assert_equals((1, 2), counter_data.get_sample_index_range(20, 29))
+		assert_equals((0, 3), counter_data.get_sample_index_range(0, 100))
+		assert_equals([2, 3], [sample.get_value() for sample in counter_data.get_samples()[1:]])
+
+	def test_should_handle_counter_values_past_32_bits(self):
+		profile_data = ProfileData()
+		profile_data.on_counter(0, "memory")
+		profile_data.on_counter_value(0, 10, 3000000000)
+		profile_data.on_counter_value(0, 20, -3000000000)
+		counter_data = profile_data.get_counter(0)
+		counter_data.finalize()
+
+		assert_equals([3000000000, -3000000000], [sample.get_value() for sample in counter_data.get_samples()])
+		assert_equals(3000000000, counter_data.get_max_value())
+		assert_equals(-3000000000, counter_data.get_min_value())
+		assert_equals([(10, 26, -3000000000, 3000000000, -3000000000)], list(counter_data.get_level_of_detail().get_buckets(0, 0, 20)))
+
 	# @todo fail to consume out of order thread
 	# @todo fail to consume function for unknown thread
 	# @todo fail to consume out of order function for thread
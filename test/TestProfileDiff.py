@@ -0,0 +1,106 @@
+import nose
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'..')
+
+from profilediff import ProfileSummary, FunctionAggregate, diff_profiles, load_summary
+from nose.tools import *
+
+class TestProfileDiff:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+
+	def teardown(self):
+		shutil.rmtree(self._temp_dir)
+
+	def create_summary(self, update_duration, draw_duration):
+		profile_summary = ProfileSummary()
+		profile_summary.on_thread(0, "main thread")
+		profile_summary.on_function(0, 0, "update")
+		profile_summary.on_function(0, 1, "draw")
+
+		# update -> draw, update
+		time = 0
+		for frame in xrange(2):
+			profile_summary.on_sample_start(0, 0, time)
+			profile_summary.on_sample_start(0, 1, time + 1)
+			profile_summary.on_sample_finish(0, 1, time + 1 + draw_duration)
+			profile_summary.on_sample_finish(0, 0, time + update_duration)
+			time += update_duration
+		profile_summary.on_samples_batch(['S', 'E'], [0, 0], [0, 0], [time, time + update_duration])
+		return profile_summary
+
+	def test_should_aggregate_calls_while_loading(self):
+		profile_summary = self.create_summary(10, 4)
+		update_aggregate = profile_summary.get_function_aggregate(("main thread", "update"))
+
+		assert_equals(3, update_aggregate.get_call_count())
+		assert_equals(30, update_aggregate.get_inclusive_time())
+		assert_equals(22, update_aggregate.get_exclusive_time())
+		assert_equals(8, profile_summary.get_function_aggregate(("main thread", "draw")).get_inclusive_time())
+		assert_equals(None, profile_summary.get_function_aggregate(("main thread", "missing")))
+
+	def test_should_count_outermost_recursive_call_in_inclusive_time(self):
+		profile_summary = ProfileSummary()
+		profile_summary.on_thread(0, "main thread")
+		profile_summary.on_function(0, 0, "recurse")
+		profile_summary.on_samples_batch(['S', 'S', 'E', 'E'], [0]*4, [0]*4, [0, 2, 5, 10])
+		recurse_aggregate = profile_summary.get_function_aggregate(("main thread", "recurse"))
+
+		assert_equals(2, recurse_aggregate.get_call_count())
+		assert_equals(13, recurse_aggregate.get_total_time())
+		assert_equals(10, recurse_aggregate.get_inclusive_time())
+		assert_equals(10, recurse_aggregate.get_exclusive_time())
+
+	def test_should_estimate_percentiles(self):
+		function_aggregate = FunctionAggregate()
+		for duration in xrange(1, 1001):
+			function_aggregate.add_call(duration, duration, True)
+
+		assert_almost_equals(500, function_aggregate.get_percentile(50), delta=500 * 0.01)
+		assert_almost_equals(990, function_aggregate.get_percentile(99), delta=990 * 0.01)
+		assert_equals(1, function_aggregate.get_percentile(0))
+		assert_equals(1000, function_aggregate.get_percentile(100))
+		assert_equals(None, FunctionAggregate().get_percentile(50))
+
+	def test_should_diff_functions_by_thread_and_function_label(self):
+		function_diffs = diff_profiles(self.create_summary(10, 4), self.create_summary(12, 7))
+
+		assert_equals([("main thread", "draw"), ("main thread", "update")], [(function_diff.get_thread_label(), function_diff.get_function_label()) for function_diff in function_diffs])
+		(draw_diff, update_diff) = function_diffs
+		assert_equals(0, update_diff.get_call_count_delta())
+		assert_equals(6, update_diff.get_inclusive_time_delta())
+		assert_equals(0, update_diff.get_exclusive_time_delta())
+		assert_equals(6, draw_diff.get_exclusive_time_delta())
+		assert_true(draw_diff.get_percentile_delta(50) > 0)
+
+	def test_should_diff_functions_in_one_profile_only(self):
+		candidate_summary = self.create_summary(10, 4)
+		candidate_summary.on_function(0, 2, "load")
+		candidate_summary.on_sample_start(0, 2, 100)
+		candidate_summary.on_sample_finish(0, 2, 150)
+		load_diff = [function_diff for function_diff in diff_profiles(self.create_summary(10, 4), candidate_summary) if function_diff.get_function_label() == "load"][0]
+
+		assert_equals(1, load_diff.get_call_count_delta())
+		assert_equals(50, load_diff.get_inclusive_time_delta())
+		assert_equals(0, load_diff.get_baseline().get_call_count())
+		assert_equals(None, load_diff.get_percentile_delta(50))
+
+	def test_should_load_summary_from_files(self):
+		filename = os.path.join(self._temp_dir, 'profile.txt')
+		with open(filename, 'w') as file:
+			file.write('\n'.join([
+				"T 0 main thread",
+				"F 0 0 update",
+				"V 0 0 my event",
+				"S 0 0 100",
+				"Y 0 0 105",
+				"E 0 0 130"]))
+
+		update_aggregate = load_summary([filename, filename]).get_function_aggregate(("main thread", "update"))
+		assert_equals(2, update_aggregate.get_call_count())
+		assert_equals(60, update_aggregate.get_inclusive_time())
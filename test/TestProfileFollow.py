@@ -0,0 +1,80 @@
+import nose
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profilefollow import ProfileFollower
+from nose.tools import *
+
+# Note: seconds to wait for the follower to parse appended data
+TIMEOUT = 5.0
+
+class TestProfileFollow:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+		self._filename = os.path.join(self._temp_dir, 'profile.txt')
+		self._profile_data = ProfileData()
+		self._lock = threading.Lock()
+		open(self._filename, 'w').close()
+
+		self._follower = ProfileFollower(self._filename, self._profile_data, self._lock)
+		self._follower.start()
+
+	def teardown(self):
+		self._follower.stop()
+		shutil.rmtree(self._temp_dir)
+
+	def _append(self, data):
+		with open(self._filename, 'a') as file:
+			file.write(data)
+
+	def _wait_for_new_data(self):
+		timeout = time.time() + TIMEOUT
+		while time.time() < timeout:
+			with self._lock:
+				if self._follower.has_new_data():
+					return True
+			time.sleep(0.01)
+		return False
+
+	def test_should_parse_appended_lines(self):
+		self._append("T 0 my thread\nF 0 0 my function\nS 0 0 10\n")
+		assert_true(self._wait_for_new_data())
+
+		with self._lock:
+			assert_equals(1, self._profile_data.get_num_threads())
+			samples = self._profile_data.get_thread(0).get_samples()
+			assert_equals(1, len(samples))
+			assert_equals(None, samples[0].get_finish_time())
+			assert_equals(10, self._profile_data.get_open_sample_start_time())
+
+		self._append("E 0 0 20\nS 0 0 30\n")
+		assert_true(self._wait_for_new_data())
+
+		with self._lock:
+			samples = self._profile_data.get_thread(0).get_samples()
+			assert_equals(2, len(samples))
+			assert_equals(20, samples[0].get_finish_time())
+			assert_equals(30, self._profile_data.get_open_sample_start_time())
+
+	def test_should_wait_for_incomplete_lines(self):
+		self._append("T 0 my thread\nF 0 0 my function\nS 0 0 1")
+		assert_true(self._wait_for_new_data())
+
+		with self._lock:
+			assert_equals(0, len(self._profile_data.get_thread(0).get_samples()))
+
+		self._append("5\n")
+		assert_true(self._wait_for_new_data())
+
+		with self._lock:
+			samples = self._profile_data.get_thread(0).get_samples()
+			assert_equals(1, len(samples))
+			assert_equals(15, samples[0].get_start_time())
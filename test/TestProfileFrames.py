@@ -0,0 +1,73 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from nose.tools import *
+
+class TestProfileFrames:
+
+	def create_frames(self, emit_times):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_event(0, 0, "Frame Start")
+		for emit_time in emit_times:
+			profile_data.on_event_emit(0, 0, emit_time)
+		return profile_data.get_thread(0).get_frames(0)
+
+	def test_should_segment_frames_between_emits(self):
+		frames = self.create_frames([0, 10, 40, 50, 100])
+
+		assert_equals("Frame Start", frames.get_event().get_label())
+		assert_equals(4, frames.get_num_frames())
+		assert_equals([10, 30, 10, 50], [frames.get_frame_duration(index) for index in xrange(4)])
+		assert_equals(40, frames.get_frame_start_time(2))
+		assert_equals(50, frames.get_frame_finish_time(2))
+
+	def test_should_find_frame_at_time(self):
+		frames = self.create_frames([0, 10, 40, 50, 100])
+
+		assert_equals(0, frames.get_frame_at_time(0))
+		assert_equals(1, frames.get_frame_at_time(10))
+		assert_equals(1, frames.get_frame_at_time(39))
+		assert_equals(3, frames.get_frame_at_time(99))
+		assert_equals(None, frames.get_frame_at_time(-1))
+		assert_equals(None, frames.get_frame_at_time(100))
+		assert_equals((1, 3), frames.get_frame_index_range(20, 45))
+
+	def test_should_sort_slowest_frames(self):
+		frames = self.create_frames([0, 10, 40, 50, 100])
+
+		assert_equals([3, 1], list(frames.get_slowest_frame_indices(2)))
+		assert_equals(10, frames.get_duration_percentile(0))
+		assert_equals(50, frames.get_duration_percentile(100))
+
+	def test_should_bin_frame_durations(self):
+		frames = self.create_frames([0, 10, 40, 50, 100])
+
+		histogram = frames.get_duration_histogram(4)
+		assert_equals(4, len(histogram))
+		assert_equals([2, 0, 1, 1], [num_frames for (min_duration, max_duration, num_frames) in histogram])
+		assert_equals(10, histogram[0][0])
+		assert_equals(50, histogram[-1][1])
+
+	def test_should_rebuild_frames_after_more_emits(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_event(0, 0, "Frame Start")
+		profile_data.on_event_emit(0, 0, 0)
+		profile_data.on_event_emit(0, 0, 10)
+		thread = profile_data.get_thread(0)
+		assert_equals(1, thread.get_frames(0).get_num_frames())
+
+		profile_data.on_event_emit(0, 0, 30)
+		assert_equals(2, thread.get_frames(0).get_num_frames())
+		assert_equals(20, thread.get_frames(0).get_frame_duration(1))
+
+	def test_should_report_no_frames_for_single_emit(self):
+		frames = self.create_frames([5])
+
+		assert_equals(0, frames.get_num_frames())
+		assert_equals(None, frames.get_duration_percentile(50))
+		assert_equals([], frames.get_duration_histogram())
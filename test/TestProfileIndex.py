@@ -0,0 +1,173 @@
+import nose
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'..')
+
+import profileindex
+from profiledata import ProfileData
+from profileindex import build_index, load_index, load_range, get_index_filename
+from nose.tools import *
+
+# a main function that runs for the whole profile, calling a function every 100us
+PROFILE_LINES = [
+	"T 0 main",
+	"F 0 0 main",
+	"F 0 1 update",
+	"C 0 my counter",
+	"V 0 0 my event",
+	"S 0 0 0"] + [
+	line for i in range(1, 20) for line in (
+		"S 0 1 %d" % (i * 100),
+		"D 0 %d %d" % ((i * 100) + 10, i),
+		"Y 0 0 %d" % ((i * 100) + 20),
+		"E 0 1 %d" % ((i * 100) + 50))] + [
+	"E 0 0 2000"]
+
+class TestProfileIndex:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+		self._filename = os.path.join(self._temp_dir, 'profile.txt')
+		with open(self._filename, 'w') as file:
+			file.write('\n'.join(PROFILE_LINES))
+
+		# use small blocks, so that the test profile has several checkpoints
+		self._index_block_size = profileindex.INDEX_BLOCK_SIZE
+		profileindex.INDEX_BLOCK_SIZE = 64
+		self._range_time_margin = profileindex.RANGE_TIME_MARGIN
+
+	def teardown(self):
+		profileindex.INDEX_BLOCK_SIZE = self._index_block_size
+		profileindex.RANGE_TIME_MARGIN = self._range_time_margin
+		shutil.rmtree(self._temp_dir)
+
+	def test_should_save_index_alongside_file(self):
+		index = build_index(self._filename, 4)
+
+		assert_true(os.path.exists(get_index_filename(self._filename)))
+		assert_equals(index['checkpoints'], load_index(self._filename)['checkpoints'])
+		assert_true(len(index['checkpoints']) > 2)
+
+		# every checkpoint after the first is inside the main function
+		for checkpoint in index['checkpoints'][1:]:
+			assert_equals(0, checkpoint['stacks'][0][0])
+			assert_equals([0, 0], checkpoint['stacks'][0][1][0])
+
+	def test_should_ignore_out_of_date_index(self):
+		build_index(self._filename, 4)
+		with open(self._filename, 'a') as file:
+			file.write('\n')
+
+		assert_equals(None, load_index(self._filename))
+
+	def test_should_load_range(self):
+		build_index(self._filename, 4)
+
+		profile_data = ProfileData()
+		load_range(self._filename, 1230, 1420, profile_data)
+
+		assert_equals(1, profile_data.get_num_threads())
+		thread_data = profile_data.get_thread(0)
+		assert_equals("main", thread_data.get_label())
+
+		# main is clipped to the end of the window
+		samples = thread_data.get_samples()
+		assert_equals(1, len(samples))
+		assert_equals(0, samples[0].get_start_time())
+		assert_equals(1420, samples[0].get_finish_time())
+
+		# only the calls to update that overlap the window
+		children = samples[0].get_children()
+		assert_equals(3, len(children))
+		assert_equals("update", children[0].get_function().get_label())
+		assert_equals(1200, children[0].get_start_time())
+		assert_equals(1250, children[0].get_finish_time())
+		assert_equals(1300, children[1].get_start_time())
+		assert_equals(1350, children[1].get_finish_time())
+		assert_equals(1400, children[2].get_start_time())
+		assert_equals(1420, children[2].get_finish_time())
+
+		# only the events inside the window
+		assert_equals(2, thread_data.get_num_event_samples())
+		assert_equals(1320, thread_data.get_event_sample(0).get_time())
+		assert_equals(1420, thread_data.get_event_sample(1).get_time())
+
+		# the counter value from before the window is kept
+		counter_samples = profile_data.get_counter(0).get_samples()
+		assert_equals([(1210, 12), (1310, 13), (1410, 14)], [(sample.get_time(), sample.get_value()) for sample in counter_samples])
+
+	def test_should_load_range_from_first_checkpoint_after_start(self):
+		index = build_index(self._filename, 4)
+		checkpoint_times = [checkpoint['time'] for checkpoint in index['checkpoints'][1:3]]
+		start_time = checkpoint_times[0] + 1
+		assert_true(start_time < checkpoint_times[1])
+
+		profile_data = ProfileData()
+		load_range(self._filename, start_time, start_time + 100, profile_data)
+
+		thread_data = profile_data.get_thread(0)
+		assert_equals("main", thread_data.get_label())
+		assert_equals("update", thread_data.get_samples()[0].get_children()[0].get_function().get_label())
+		assert_equals("my counter", profile_data.get_counter(0).get_label())
+
+	def test_should_replay_functions_registered_after_first_checkpoint(self):
+		# render is registered part way through the file, and called once
+		lines = list(PROFILE_LINES)
+		render_line = lines.index("S 0 1 1500")
+		lines[render_line:render_line + 4] = ["F 0 2 render", "S 0 2 1500", "D 0 1510 15", "Y 0 0 1520", "E 0 2 1550"]
+		with open(self._filename, 'w') as file:
+			file.write('\n'.join(lines))
+
+		index = build_index(self._filename, 4)
+		assert_true(index['registrations'][-1][0] > 1)
+
+		# the window starts after the checkpoint that render is registered before, with the call to it still open
+		profile_data = ProfileData()
+		load_range(self._filename, 1530, 1560, profile_data)
+
+		children = profile_data.get_thread(0).get_samples()[0].get_children()
+		assert_equals(["render"], [child.get_function().get_label() for child in children])
+		assert_equals(1500, children[0].get_start_time())
+
+	def _write_late_worker_profile(self, late_line):
+		# a worker thread calls a job during the window, but its finish is written after records of main that are past the window
+		lines = list(PROFILE_LINES)
+		lines[lines.index("S 0 0 0"):lines.index("S 0 0 0")] = ["T 1 worker", "F 1 0 job"]
+		lines.insert(lines.index("S 0 1 1300") + 1, "S 1 0 1310")
+		lines.insert(lines.index(late_line) + 1, "E 1 0 1410")
+		with open(self._filename, 'w') as file:
+			file.write('\n'.join(lines))
+
+	def test_should_load_records_written_late_by_another_thread(self):
+		self._write_late_worker_profile("E 0 1 1750")
+
+		profile_data = ProfileData()
+		load_range(self._filename, 1230, 1420, profile_data)
+
+		samples = profile_data.get_thread(1).get_samples()
+		assert_equals("worker", profile_data.get_thread(1).get_label())
+		assert_equals([(1310, 1410)], [(sample.get_start_time(), sample.get_finish_time()) for sample in samples])
+
+	def test_should_stop_loading_range_past_margin(self):
+		profileindex.RANGE_TIME_MARGIN = 50
+		self._write_late_worker_profile("E 0 1 1750")
+
+		profile_data = ProfileData()
+		load_range(self._filename, 1230, 1420, profile_data)
+
+		# the finish of the job is too late, so the job is clipped to the end of the window
+		samples = profile_data.get_thread(1).get_samples()
+		assert_equals([(1310, 1420)], [(sample.get_start_time(), sample.get_finish_time()) for sample in samples])
+
+	def test_should_build_index_when_loading_range(self):
+		profile_data = ProfileData()
+		load_range(self._filename, 0, 120, profile_data)
+
+		assert_true(os.path.exists(get_index_filename(self._filename)))
+		samples = profile_data.get_thread(0).get_samples()
+		assert_equals(1, len(samples))
+		assert_equals(1, len(samples[0].get_children()))
+		assert_equals(100, samples[0].get_children()[0].get_start_time())
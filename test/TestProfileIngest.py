@@ -0,0 +1,118 @@
+import nose
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profileingest import ProfileIngestServer, parse_address, send_file
+from nose.plugins.skip import SkipTest
+from nose.tools import *
+
+EXAMPLE_PROFILE = os.path.join(os.path.dirname(__file__), 'data', 'example_profile.txt')
+
+# Note: seconds to wait for the server to parse streamed data
+TIMEOUT = 5.0
+
+class TestProfileIngest:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+		self._profile_data = ProfileData()
+		self._lock = threading.Lock()
+		self._server = None
+
+	def teardown(self):
+		if self._server:
+			self._server.stop()
+		shutil.rmtree(self._temp_dir)
+
+	def _start_server(self, address):
+		self._server = ProfileIngestServer(address, self._profile_data, self._lock)
+		self._server.start()
+		return self._server.get_address()
+
+	def _wait_for(self, condition):
+		timeout = time.time() + TIMEOUT
+		while time.time() < timeout:
+			with self._lock:
+				if condition():
+					return True
+			time.sleep(0.01)
+		return False
+
+	def _assert_example_thread(self, thread_data):
+		assert_equals("My First Thread", thread_data.get_label())
+		samples = thread_data.get_samples()
+		assert_equals(2, len(samples))
+		assert_equals(1100, samples[1].get_start_time())
+		assert_equals(3000, samples[1].get_finish_time())
+		assert_equals(1, samples[1].get_num_children())
+
+	def test_should_parse_address(self):
+		assert_equals(('localhost', 7878), parse_address('localhost:7878'))
+		assert_equals(('localhost', 7878), parse_address(':7878'))
+		assert_equals('/tmp/profile.sock', parse_address('/tmp/profile.sock'))
+
+	def test_should_ingest_file_over_tcp(self):
+		address = self._start_server(('127.0.0.1', 0))
+		send_file(EXAMPLE_PROFILE, address)
+
+		assert_true(self._wait_for(lambda: (self._profile_data.get_num_threads() == 3) and (self._profile_data.get_finish_time() == 2900)))
+		with self._lock:
+			assert_true(self._server.has_new_data())
+			self._assert_example_thread(self._profile_data.get_thread(0))
+
+	def test_should_ingest_file_over_unix_socket(self):
+		if not hasattr(socket, 'AF_UNIX'):
+			raise SkipTest("UNIX domain sockets are not supported")
+
+		address = self._start_server(os.path.join(self._temp_dir, 'profile.sock'))
+		send_file(EXAMPLE_PROFILE, address)
+
+		assert_true(self._wait_for(lambda: self._profile_data.get_finish_time() == 2900))
+		with self._lock:
+			self._assert_example_thread(self._profile_data.get_thread(0))
+
+	def test_should_give_each_producer_its_own_threads(self):
+		address = self._start_server(('127.0.0.1', 0))
+		send_file(EXAMPLE_PROFILE, address)
+		send_file(EXAMPLE_PROFILE, address)
+
+		assert_true(self._wait_for(lambda: self._profile_data.get_num_threads() == 6))
+		assert_true(self._wait_for(lambda: self._profile_data.get_thread(3).get_num_functions() == 3))
+		assert_true(self._wait_for(lambda: len(self._profile_data.get_thread(3).get_samples()) == 2))
+		with self._lock:
+			self._assert_example_thread(self._profile_data.get_thread(0))
+			self._assert_example_thread(self._profile_data.get_thread(3))
+
+	def test_should_ingest_records_streamed_at_high_rate(self):
+		num_repeats = 2000
+		filename = os.path.join(self._temp_dir, 'profile.txt')
+		with open(filename, 'w') as file:
+			file.write("T 0 my thread\nF 0 0 my function\n")
+			file.write("".join("S 0 0 %d\nE 0 0 %d\n" % (2*i, (2*i)+1) for i in range(num_repeats)))
+
+		address = self._start_server(('127.0.0.1', 0))
+		send_file(filename, address, 7)
+
+		assert_true(self._wait_for(lambda: self._profile_data.get_finish_time() == (2*num_repeats)-1))
+		with self._lock:
+			assert_equals(num_repeats, len(self._profile_data.get_thread(0).get_samples()))
+
+	def test_should_stop_reading_while_lock_is_held(self):
+		address = self._start_server(('127.0.0.1', 0))
+
+		with self._lock:
+			sender = threading.Thread(target=send_file, args=(EXAMPLE_PROFILE, address))
+			sender.start()
+			time.sleep(0.1)
+			assert_equals(0, self._profile_data.get_num_threads())
+
+		sender.join()
+		assert_true(self._wait_for(lambda: self._profile_data.get_num_threads() == 3))
@@ -0,0 +1,178 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profilelod import ProfileLevelOfDetail, get_finest_bucket_duration, LOD_MAX_BUCKETS, COUNTER_LOD_SAMPLES_PER_BUCKET
+from nose.tools import *
+
+class TestProfileLod:
+
+	def create_profile_data(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "function 0")
+		profile_data.on_function(0, 1, "function 1")
+		return profile_data
+
+	def test_should_choose_power_of_two_bucket_duration(self):
+		assert_equals(1, get_finest_bucket_duration(1))
+		assert_equals(1, get_finest_bucket_duration(LOD_MAX_BUCKETS))
+		assert_equals(2, get_finest_bucket_duration(LOD_MAX_BUCKETS + 1))
+		assert_equals(1024, get_finest_bucket_duration(LOD_MAX_BUCKETS * 1000))
+
+	def test_should_summarise_buckets(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_start(0, 1, 1)
+		profile_data.on_sample_finish(0, 1, 3)
+		profile_data.on_sample_finish(0, 0, 4)
+		profile_data.on_sample_start(0, 1, 6)
+		profile_data.on_sample_finish(0, 1, 8)
+
+		profile_data.finalize()
+		lod = profile_data.get_thread(0).get_level_of_detail()
+		assert_equals(4, lod.get_num_levels())
+		assert_equals(2, lod.get_num_depths())
+		assert_equals(1, lod.get_bucket_duration(0))
+		assert_equals(8, lod.get_bucket_duration(3))
+
+		assert_equals((1.0, 0, 1), lod.get_bucket(0, 0, 0))
+		assert_equals((0.0, -1, 0), lod.get_bucket(0, 0, 4))
+		assert_equals((1.0, 1, 1), lod.get_bucket(0, 0, 6))
+		assert_equals((0.0, -1, 0), lod.get_bucket(0, 1, 0))
+		assert_equals((1.0, 1, 1), lod.get_bucket(0, 1, 1))
+
+		# level 2 has buckets [0,4) and [4,8), level 3 has the bucket [0,8)
+		assert_equals((1.0, 0, 1), lod.get_bucket(2, 0, 0))
+		assert_equals((0.5, 1, 1), lod.get_bucket(2, 0, 1))
+		assert_equals((0.75, 0, 2), lod.get_bucket(3, 0, 0))
+
+	def test_should_find_occupied_time_ranges(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_finish(0, 0, 4)
+		profile_data.on_sample_start(0, 1, 6)
+		profile_data.on_sample_finish(0, 1, 8)
+
+		profile_data.finalize()
+		lod = profile_data.get_thread(0).get_level_of_detail()
+		assert_equals([(0, 4), (6, 8)], lod.get_occupied_time_ranges(0, 0, 0, 8))
+		assert_equals([(6, 8)], lod.get_occupied_time_ranges(0, 0, 5, 8))
+		assert_equals([], lod.get_occupied_time_ranges(0, 0, 4, 5))
+		assert_equals([(0, 8)], lod.get_occupied_time_ranges(2, 0, 0, 8))
+
+	def test_should_list_wide_samples(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_finish(0, 0, 8)
+		profile_data.on_sample_start(0, 1, 10)
+		profile_data.on_sample_finish(0, 1, 11)
+		profile_data.on_sample_start(0, 1, 16)
+		profile_data.on_sample_finish(0, 1, 20)
+
+		profile_data.finalize()
+		lod = profile_data.get_thread(0).get_level_of_detail()
+		assert_equals([0, 2], list(lod.get_wide_sample_indices(0, 0, 0, 20)))
+		assert_equals([2], list(lod.get_wide_sample_indices(0, 0, 9, 20)))
+		assert_equals([0], list(lod.get_wide_sample_indices(1, 0, 0, 20)))
+		assert_equals([], list(lod.get_wide_sample_indices(2, 0, 0, 20)))
+
+	def test_should_ignore_open_samples(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_start(0, 1, 1)
+		profile_data.on_sample_finish(0, 1, 2)
+
+		profile_data.finalize()
+		lod = profile_data.get_thread(0).get_level_of_detail()
+		assert_equals((0.0, -1, 0), lod.get_bucket(0, 0, 0))
+		assert_equals([], lod.get_occupied_time_ranges(0, 0, 0, 2))
+		assert_equals([(1, 2)], lod.get_occupied_time_ranges(0, 1, 0, 2))
+
+	def test_should_put_sample_at_finish_of_thread_in_last_bucket(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_finish(0, 0, 100)
+		profile_data.on_sample_start(0, 1, 100)
+		profile_data.on_sample_finish(0, 1, 100)
+
+		profile_data.finalize()
+		lod = profile_data.get_thread(0).get_level_of_detail()
+		# the zero length sample starts in the last bucket
+		assert_equals((1.0, 0, 1), lod.get_bucket(0, 0, 99))
+
+	def test_should_rebuild_when_samples_change(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_finish(0, 0, 2)
+		profile_data.finalize()
+		thread_data = profile_data.get_thread(0)
+
+		lod = thread_data.get_level_of_detail()
+		assert_true(lod is thread_data.get_level_of_detail())
+
+		profile_data.on_sample_start(0, 1, 4)
+		profile_data.on_sample_finish(0, 1, 6)
+		profile_data.finalize()
+		assert_false(lod is thread_data.get_level_of_detail())
+
+	def test_should_choose_level_for_time_per_pixel(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_finish(0, 0, 8)
+
+		profile_data.finalize()
+		lod = profile_data.get_thread(0).get_level_of_detail()
+		assert_equals(None, lod.get_level_for_time_per_pixel(0.5))
+		assert_equals(0, lod.get_level_for_time_per_pixel(1.0))
+		assert_equals(1, lod.get_level_for_time_per_pixel(3.0))
+		assert_equals(3, lod.get_level_for_time_per_pixel(100.0))
+
+	def create_counter_data(self, values):
+		profile_data = ProfileData()
+		profile_data.on_counter(0, "my counter")
+		for time, value in enumerate(values):
+			profile_data.on_counter_value(0, time, value)
+		return profile_data.get_counter(0)
+
+	def test_should_build_counter_envelopes(self):
+		values = [0] * (COUNTER_LOD_SAMPLES_PER_BUCKET * 64)
+		values[100] = 50
+		values[101] = -20
+		values[-1] = 7
+		counter_data = self.create_counter_data(values)
+
+		lod = counter_data.get_level_of_detail()
+		assert_equals(len(values), lod.get_num_samples())
+		assert_equals(16, lod.get_bucket_duration(0))
+		assert_equals(7, lod.get_num_levels())
+
+		assert_equals([(96, 112, -20, 50, 0)], list(lod.get_buckets(0, 96, 100)))
+		assert_equals([(0, 1024, -20, 50, 7)], list(lod.get_buckets(6, 0, len(values))))
+		assert_equals([(0, 512, -20, 50, 0), (512, 1024, 0, 7, 7)], list(lod.get_buckets(5, 0, 2000)))
+		assert_equals([(512, 1024, 0, 7, 7)], list(lod.get_buckets(5, 600, 2000)))
+
+	def test_should_choose_counter_level_for_time_per_pixel(self):
+		counter_data = self.create_counter_data([0] * (COUNTER_LOD_SAMPLES_PER_BUCKET * 64))
+
+		lod = counter_data.get_level_of_detail()
+		assert_equals(None, lod.get_level_for_time_per_pixel(8.0))
+		assert_equals(0, lod.get_level_for_time_per_pixel(16.0))
+		assert_equals(2, lod.get_level_for_time_per_pixel(100.0))
+		assert_equals(6, lod.get_level_for_time_per_pixel(100000.0))
+
+	def test_should_rebuild_counter_envelopes_when_samples_change(self):
+		profile_data = ProfileData()
+		profile_data.on_counter(0, "my counter")
+		counter_data = profile_data.get_counter(0)
+		assert_equals(None, counter_data.get_level_of_detail())
+
+		profile_data.on_counter_value(0, 0, 5)
+		lod = counter_data.get_level_of_detail()
+		assert_true(lod is counter_data.get_level_of_detail())
+		assert_equals([(0, 1, 5, 5, 5)], list(lod.get_buckets(0, 0, 0)))
+
+		profile_data.on_counter_value(0, 10, 8)
+		assert_equals(2, counter_data.get_level_of_detail().get_num_samples())
@@ -0,0 +1,131 @@
+import nose
+
+import cPickle
+import os
+import shutil
+import sys
+import tempfile
+from array import array
+sys.path.insert(0,'..')
+
+import profiledata
+import profilemapped
+from profiledata import ProfileData, TIME_TYPECODE
+from profileparser import ProfileParser
+from profilemapped import MappedArray, MappedArrayStore, get_resident_memory
+from nose.tools import *
+
+EXAMPLE_PROFILE = os.path.join(os.path.dirname(__file__), 'data', 'example_profile.txt')
+
+class TestProfileMapped:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+		# small chunks, so that the arrays in the tests span several chunks
+		self._chunk_size = profilemapped.MAPPED_CHUNK_SIZE
+		profilemapped.MAPPED_CHUNK_SIZE = 64
+		self._read_chunk_items = profiledata.ARRAY_READ_CHUNK_ITEMS
+		profiledata.ARRAY_READ_CHUNK_ITEMS = 16
+		self._array_store = MappedArrayStore(self._temp_dir)
+
+	def teardown(self):
+		self._array_store.close()
+		profilemapped.MAPPED_CHUNK_SIZE = self._chunk_size
+		profiledata.ARRAY_READ_CHUNK_ITEMS = self._read_chunk_items
+		shutil.rmtree(self._temp_dir)
+
+	def test_should_behave_like_an_array(self):
+		mapped_array = self._array_store.new_array('i')
+		expected_array = array('i')
+		for value in xrange(100):
+			mapped_array.append(value * 3)
+			expected_array.append(value * 3)
+		mapped_array.extend(xrange(50))
+		expected_array.extend(xrange(50))
+		mapped_array[5] = -1
+		expected_array[5] = -1
+		mapped_array[-2] = -2
+		expected_array[-2] = -2
+
+		assert_equals(len(expected_array), len(mapped_array))
+		assert_equals(list(expected_array), list(mapped_array))
+		assert_equals(expected_array[10:90], mapped_array[10:90])
+		assert_equals(expected_array[::7], mapped_array[::7])
+		assert_equals(expected_array[-1], mapped_array[-1])
+		assert_equals(expected_array.tostring(), mapped_array.tostring())
+		assert_raises(IndexError, lambda: mapped_array[len(expected_array)])
+		assert_true(self._array_store.get_mapped_size() > 0)
+
+	def test_should_insert_into_written_chunks(self):
+		mapped_array = self._array_store.new_array(TIME_TYPECODE)
+		mapped_array.extend(xrange(0, 100, 2))
+		mapped_array.insert(3, 5)
+		mapped_array.insert(len(mapped_array), 1000)
+
+		assert_equals([0, 2, 4, 5, 6, 8], list(mapped_array[:6]))
+		assert_equals(52, len(mapped_array))
+		assert_equals(1000, mapped_array[-1])
+
+	def test_should_load_the_same_profile_data_out_of_core(self):
+		profile_data = ProfileData()
+		ProfileParser(profile_data).load_file(EXAMPLE_PROFILE)
+		mapped_profile_data = ProfileData(self._array_store)
+		ProfileParser(mapped_profile_data).load_file(EXAMPLE_PROFILE)
+
+		assert_equals(self._array_store, mapped_profile_data.get_array_store())
+		assert_equals(profile_data.get_finish_time(), mapped_profile_data.get_finish_time())
+		for index in xrange(profile_data.get_num_threads()):
+			thread_data = profile_data.get_thread(index)
+			mapped_thread_data = mapped_profile_data.get_thread(index)
+			assert_equals(thread_data.get_num_samples(), mapped_thread_data.get_num_samples())
+			assert_equals(thread_data.get_max_stack_depth(), mapped_thread_data.get_max_stack_depth())
+			assert_equals([thread_data.get_sample_finish_time(sample) for sample in xrange(thread_data.get_num_samples())], [mapped_thread_data.get_sample_finish_time(sample) for sample in xrange(mapped_thread_data.get_num_samples())])
+
+	def test_should_pickle_mapped_profile_data_in_memory(self):
+		mapped_profile_data = ProfileData(self._array_store)
+		ProfileParser(mapped_profile_data).load_file(EXAMPLE_PROFILE)
+		profile_data = cPickle.loads(cPickle.dumps(mapped_profile_data, cPickle.HIGHEST_PROTOCOL))
+
+		assert_equals(None, profile_data.get_array_store())
+		assert_equals(array, type(profile_data.get_thread(0)._sample_start_times))
+		assert_equals(mapped_profile_data.get_thread(0).get_num_samples(), profile_data.get_thread(0).get_num_samples())
+
+	def test_should_merge_and_finalize_mapped_arrays_a_chunk_at_a_time(self):
+		profile_data = ProfileData(self._array_store)
+		for thread_id in xrange(2):
+			profile_data.on_thread(thread_id, "worker")
+			profile_data.on_function(thread_id, 0, "job")
+			profile_data.on_event(thread_id, 0, "frame")
+			times = range(thread_id * 1000, (thread_id * 1000) + 200)
+			profile_data.on_samples_batch(['S', 'E'] * 100, [thread_id] * 200, [0] * 200, times)
+			profile_data.on_event_emits_batch([thread_id] * 100, [0] * 100, times[::2])
+		profile_data.finalize()
+		profile_data.on_counter(0, "my counter")
+		profile_data.on_counter_values_batch([0] * 200, range(200), range(200))
+
+		# record the most items that are read from a mapped array, or kept in memory at the end of one, at a time
+		max_items = [0]
+		def read_range(mapped_array, start, stop):
+			max_items[0] = max(max_items[0], stop - start)
+			return original_read_range(mapped_array, start, stop)
+		def write_tail(mapped_array):
+			max_items[0] = max(max_items[0], len(mapped_array._tail))
+			original_write_tail(mapped_array)
+
+		(original_read_range, original_write_tail) = (MappedArray._read_range, MappedArray._write_tail)
+		(MappedArray._read_range, MappedArray._write_tail) = (read_range, write_tail)
+		try:
+			profile_data.merge_restarted_threads()
+			profile_data.finalize()
+		finally:
+			(MappedArray._read_range, MappedArray._write_tail) = (original_read_range, original_write_tail)
+
+		assert_equals(1, profile_data.get_num_threads())
+		assert_equals(200, profile_data.get_thread(0).get_num_samples())
+		assert_equals(200, profile_data.get_thread(0).get_num_event_samples())
+		assert_equals(199, profile_data.get_counter(0).get_max_value())
+		# at most a chunk read from the other thread, on top of a tail that is less than a chunk of 'H' items
+		assert_true(0 < max_items[0] <= (16 + (64 // 2)))
+
+	def test_should_report_resident_memory(self):
+		assert_true(get_resident_memory() > 0)
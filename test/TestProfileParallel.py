@@ -0,0 +1,87 @@
+import nose
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profileparser import ProfileParser
+from profileparallel import load_file_parallel, split_file_into_ranges
+from nose.tools import *
+
+EXAMPLE_PROFILE = os.path.join(os.path.dirname(__file__), 'data', 'example_profile.txt')
+
+class TestProfileParallel:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+
+	def teardown(self):
+		shutil.rmtree(self._temp_dir)
+
+	def _write_text_profile(self, lines):
+		filename = os.path.join(self._temp_dir, 'profile.txt')
+		with open(filename, 'w') as file:
+			file.write('\n'.join(lines))
+		return filename
+
+	def _get_samples(self, samples):
+		return [(sample.get_function().get_label(), sample.get_start_time(), sample.get_finish_time(), self._get_samples(sample.get_children())) for sample in samples]
+
+	def test_should_split_file_at_the_start_of_lines(self):
+		ranges = split_file_into_ranges(EXAMPLE_PROFILE, 50)
+
+		with open(EXAMPLE_PROFILE, 'rb') as file:
+			content = file.read()
+
+		assert_true(len(ranges) > 1)
+		assert_equals(0, ranges[0][0])
+		assert_equals(len(content), ranges[-1][1])
+		for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+			assert_equals(end, next_start)
+			assert_equals('\n', content[start-1] if start > 0 else '\n')
+
+	def test_should_load_same_data_as_parser(self):
+		expected = ProfileData()
+		ProfileParser(expected).load_file(EXAMPLE_PROFILE)
+
+		# small ranges, so that registrations and samples are split across ranges
+		profile_data = ProfileData()
+		load_file_parallel(EXAMPLE_PROFILE, profile_data, 2, 50)
+
+		assert_equals(expected.get_num_threads(), profile_data.get_num_threads())
+		for thread_id in range(expected.get_num_threads()):
+			expected_thread = expected.get_thread(thread_id)
+			thread_data = profile_data.get_thread(thread_id)
+			assert_equals(expected_thread.get_label(), thread_data.get_label())
+			assert_equals(expected_thread.get_max_stack_depth(), thread_data.get_max_stack_depth())
+			assert_equals(self._get_samples(expected_thread.get_samples()), self._get_samples(thread_data.get_samples()))
+
+		assert_equals(expected.get_start_time(), profile_data.get_start_time())
+		assert_equals(expected.get_finish_time(), profile_data.get_finish_time())
+
+	def test_should_load_events_and_counters(self):
+		filename = self._write_text_profile([
+			"T 0 my thread",
+			"V 0 0 my event",
+			"C 0 my counter",
+			"Y 0 0 100",
+			"D 0 110 -5",
+			"D 0 120 7",
+			"Y 0 0 200",
+			"D 0 210 3000000000"])
+
+		profile_data = ProfileData()
+		load_file_parallel(filename, profile_data, 2, 16)
+
+		thread_data = profile_data.get_thread(0)
+		assert_equals(2, thread_data.get_num_event_samples())
+		assert_equals(200, thread_data.get_event_sample(1).get_time())
+
+		samples = profile_data.get_counter(0).get_samples()
+		assert_equals(3, len(samples))
+		assert_equals(-5, samples[0].get_value())
+		assert_equals(7, samples[1].get_value())
+		assert_equals(3000000000, samples[2].get_value())
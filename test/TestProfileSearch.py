@@ -0,0 +1,83 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profilesearch import SampleQuery
+from nose.tools import *
+
+class TestProfileSearch:
+
+	def create_profile_data(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "main thread")
+		profile_data.on_function(0, 0, "update")
+		profile_data.on_function(0, 1, "draw")
+		profile_data.on_function(0, 2, "recurse")
+		profile_data.on_thread(1, "worker thread")
+		profile_data.on_function(1, 0, "update")
+
+		# update -> draw, update -> draw, recurse -> recurse, update (not finished)
+		profile_data.on_samples_batch(['S', 'S', 'E', 'E', 'S', 'S', 'E', 'E', 'S', 'S', 'E', 'E', 'S'], [0]*13,
+			[0, 1, 1, 0, 0, 1, 1, 0, 2, 2, 2, 2, 0],
+			[0, 5, 10, 20, 20, 21, 29, 30, 40, 41, 42, 100, 110])
+		profile_data.on_samples_batch(['S', 'E', 'S', 'E'], [1]*4, [0]*4, [3, 8, 50, 90])
+		profile_data.finalize()
+		return profile_data
+
+	def test_should_index_calls_of_each_function(self):
+		call_index = self.create_profile_data().get_thread(0).get_function_call_index()
+
+		assert_equals(2, call_index.get_num_calls(0))
+		assert_equals([0, 2], list(call_index.get_call_indices(0)))
+		assert_equals([3, 1], list(call_index.get_slowest_call_indices(1)))
+		assert_equals([3], list(call_index.get_slowest_call_indices(1, 1)))
+
+	def test_should_find_calls_by_duration(self):
+		call_index = self.create_profile_data().get_thread(0).get_function_call_index()
+
+		assert_equals([1, 3], call_index.find_calls(1))
+		assert_equals([3], call_index.find_calls(1, min_duration=6))
+		assert_equals([1], call_index.find_calls(1, max_duration=5))
+		assert_equals([], call_index.find_calls(1, min_duration=9))
+
+	def test_should_find_calls_in_time_window(self):
+		call_index = self.create_profile_data().get_thread(0).get_function_call_index()
+
+		assert_equals([0, 2], call_index.find_calls(0, 20, 20))
+		assert_equals([2], call_index.find_calls(0, 25, 1000))
+		assert_equals([3], call_index.find_calls(1, 0, 1000, min_duration=6))
+		assert_equals([], call_index.find_calls(1, 11, 20))
+
+	def test_should_skip_recursive_calls_before_time_window(self):
+		call_index = self.create_profile_data().get_thread(0).get_function_call_index()
+
+		assert_equals([4, 5], call_index.find_calls(2, 41, 41))
+		assert_equals([4], call_index.find_calls(2, 50, 60))
+
+	def test_should_find_samples_by_function_and_thread_label(self):
+		profile_data = self.create_profile_data()
+
+		samples = SampleQuery("^upd").find_samples(profile_data)
+		assert_equals([("main thread", 0), ("worker thread", 3), ("main thread", 20), ("worker thread", 50)], [(sample.get_thread().get_label(), sample.get_start_time()) for sample in samples])
+
+		samples = SampleQuery("update|draw", "main", min_duration=9).find_samples(profile_data)
+		assert_equals([0, 20], [sample.get_start_time() for sample in samples])
+
+		samples = SampleQuery(start_time=15, finish_time=22).find_samples(profile_data)
+		assert_equals(["update", "update", "draw"], [sample.get_function().get_label() for sample in samples])
+
+	def test_should_narrow_time_window_of_query(self):
+		thread_data = self.create_profile_data().get_thread(0)
+		sample_query = SampleQuery("update", start_time=0, finish_time=15)
+
+		assert_equals([0], sample_query.find_thread_sample_indices(thread_data))
+		assert_equals([0], sample_query.find_thread_sample_indices(thread_data, 10, 1000))
+		assert_equals([], sample_query.find_thread_sample_indices(thread_data, 25, 1000))
+
+	def test_should_find_calls_in_a_slice(self):
+		thread_slice = self.create_profile_data().slice(25, 45).get_thread(0)
+		samples = SampleQuery("draw|recurse").find_thread_sample_indices(thread_slice)
+
+		assert_equals(["draw", "recurse", "recurse"], [thread_slice.get_sample_function(index).get_label() for index in samples])
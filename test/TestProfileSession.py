@@ -0,0 +1,125 @@
+import nose
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profilesession import load_session
+from nose.tools import *
+
+class RecordTimes:
+	""" consumer that keeps the time of every record, in the order it was passed """
+
+	def __init__(self):
+		self.times = []
+
+	def on_thread(self, thread_id, thread_label):
+		pass
+
+	def on_function(self, thread_id, function_id, function_label):
+		pass
+
+	def on_samples_batch(self, record_types, thread_ids, function_ids, times):
+		self.times.extend(times)
+
+	def on_event(self, thread_id, event_id, event_label):
+		pass
+
+	def on_event_emits_batch(self, thread_ids, event_ids, times):
+		self.times.extend(times)
+
+	def on_counter(self, counter_id, counter_label):
+		pass
+
+	def on_counter_values_batch(self, counter_ids, times, counter_values):
+		self.times.extend(times)
+
+class TestProfileSession:
+
+	def setup(self):
+		self._temp_dir = tempfile.mkdtemp()
+
+	def teardown(self):
+		shutil.rmtree(self._temp_dir)
+
+	def _write_text_profile(self, name, lines):
+		filename = os.path.join(self._temp_dir, name)
+		with open(filename, 'w') as file:
+			file.write('\n'.join(lines))
+		return filename
+
+	def _write_process_profiles(self):
+		client_filename = self._write_text_profile('client.txt', [
+			"T 0 main thread",
+			"F 0 0 update",
+			"V 0 0 sync",
+			"C 0 memory",
+			"Y 0 0 100",
+			"S 0 0 100",
+			"D 0 110 5",
+			"E 0 0 150",
+			"S 0 0 200",
+			"D 0 210 7",
+			"E 0 0 260"])
+		server_filename = self._write_text_profile('server.txt', [
+			"T 0 network thread",
+			"F 0 0 receive",
+			"T 1 main thread",
+			"F 1 0 handle",
+			"V 1 0 sync",
+			"C 0 memory",
+			"Y 1 0 1000",
+			"S 1 0 1020",
+			"S 0 0 1030",
+			"D 0 1040 9",
+			"E 0 0 1070",
+			"E 1 0 1120"])
+		return (client_filename, server_filename)
+
+	def test_should_namespace_threads_and_counters_of_each_file(self):
+		(client_filename, server_filename) = self._write_process_profiles()
+		profile_data = ProfileData()
+		load_session([client_filename, server_filename], profile_data, num_processes=1, labels=["client", "server"])
+
+		assert_equals(["client: main thread", "server: network thread", "server: main thread"], [profile_data.get_thread(index).get_label() for index in xrange(profile_data.get_num_threads())])
+		assert_equals(["client: memory", "server: memory"], [profile_data.get_counter(index).get_label() for index in xrange(profile_data.get_num_counters())])
+		assert_equals("handle", profile_data.get_thread(2).get_function(0).get_label())
+		assert_equals(1020, profile_data.get_thread(2).get_start_time())
+		assert_equals(100, profile_data.get_start_time())
+		assert_equals(1120, profile_data.get_finish_time())
+
+	def test_should_apply_clock_offsets(self):
+		(client_filename, server_filename) = self._write_process_profiles()
+		profile_data = ProfileData()
+		load_session([client_filename, server_filename], profile_data, clock_offsets=[0, -1000], num_processes=1)
+
+		assert_equals(20, profile_data.get_thread(2).get_start_time())
+		assert_equals(40, profile_data.get_counter(1).get_sample_times()[0])
+		assert_equals(260, profile_data.get_finish_time())
+
+	def test_should_align_clocks_on_sync_event(self):
+		(client_filename, server_filename) = self._write_process_profiles()
+		profile_data = ProfileData()
+		load_session([client_filename, server_filename], profile_data, sync_event_label="sync", num_processes=2)
+
+		# the server's sync event was emitted at 1000, and the client's at 100
+		assert_equals(120, profile_data.get_thread(2).get_start_time())
+		assert_equals(100, profile_data.get_thread(2).get_event_emit_times(0)[0])
+		assert_equals(260, profile_data.get_finish_time())
+
+	def test_should_merge_records_in_time_order(self):
+		(client_filename, server_filename) = self._write_process_profiles()
+		record_times = RecordTimes()
+		load_session([client_filename, server_filename], record_times, clock_offsets=[0, -900], num_processes=1)
+
+		assert_equals(13, len(record_times.times))
+		assert_equals(sorted(record_times.times), record_times.times)
+
+	def test_should_raise_if_sync_event_is_missing(self):
+		(client_filename, server_filename) = self._write_process_profiles()
+		other_filename = self._write_text_profile('other.txt', ["T 0 main thread"])
+
+		assert_raises(ValueError, load_session, [client_filename, other_filename], ProfileData(), None, "sync", 1)
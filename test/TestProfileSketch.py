@@ -0,0 +1,108 @@
+import nose
+
+import random
+import sys
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profilesketch import DurationSketch, SKETCH_RELATIVE_ACCURACY, SKETCH_MAX_BUCKETS
+from nose.tools import *
+
+class TestProfileSketch:
+
+	def create_sketch(self, durations):
+		duration_sketch = DurationSketch()
+		for duration in durations:
+			duration_sketch.add(duration)
+		return duration_sketch
+
+	def get_exact_percentile(self, durations, percentile):
+		sorted_durations = sorted(durations)
+		return sorted_durations[int(round((percentile / 100.0) * (len(sorted_durations) - 1)))]
+
+	def test_should_estimate_percentiles_within_relative_accuracy(self):
+		random.seed(1)
+		durations = [int(random.expovariate(1.0 / 1000)) + 1 for i in xrange(10000)]
+		duration_sketch = self.create_sketch(durations)
+
+		for percentile in [1, 50, 95, 99, 99.9]:
+			exact_duration = self.get_exact_percentile(durations, percentile)
+			assert_almost_equals(exact_duration, duration_sketch.get_percentile(percentile), delta=exact_duration * SKETCH_RELATIVE_ACCURACY)
+		assert_equals(min(durations), duration_sketch.get_percentile(0))
+		assert_equals(max(durations), duration_sketch.get_percentile(100))
+		assert_equals(10000, duration_sketch.get_count())
+
+	def test_should_add_a_list_of_durations(self):
+		durations = [0, 3, 3, 7, 100, 100, 2500]
+		duration_sketch = DurationSketch()
+		duration_sketch.add_durations(durations)
+		other_sketch = self.create_sketch(durations)
+
+		assert_equals(other_sketch.get_count(), duration_sketch.get_count())
+		assert_equals(0, duration_sketch.get_min_duration())
+		assert_equals([other_sketch.get_percentile(percentile) for percentile in xrange(101)], [duration_sketch.get_percentile(percentile) for percentile in xrange(101)])
+
+	def test_should_merge_sketches(self):
+		durations = range(1, 500)
+		other_durations = range(400, 2000)
+		duration_sketch = self.create_sketch(durations)
+		duration_sketch.merge(self.create_sketch(other_durations))
+		merged_sketch = self.create_sketch(durations + other_durations)
+
+		assert_equals(merged_sketch.get_count(), duration_sketch.get_count())
+		assert_equals(1999, duration_sketch.get_max_duration())
+		assert_equals(merged_sketch.get_percentile(50), duration_sketch.get_percentile(50))
+		assert_equals(merged_sketch.get_percentile(99), duration_sketch.get_percentile(99))
+
+	def test_should_bound_number_of_buckets(self):
+		duration_sketch = self.create_sketch(int(1.5 ** exponent) + 1 for exponent in xrange(0, 100))
+		duration_sketch.add_durations([2 ** exponent for exponent in xrange(0, 200)])
+
+		assert_true(duration_sketch.get_num_buckets() <= SKETCH_MAX_BUCKETS)
+		assert_equals(2 ** 199, duration_sketch.get_percentile(100))
+
+	def test_should_update_function_sketches_while_loading(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "update")
+		profile_data.on_function(0, 1, "draw")
+		profile_data.on_samples_batch(['S', 'S', 'E', 'E', 'S'], [0]*5, [0, 1, 1, 0, 0], [0, 10, 15, 100, 110])
+		profile_data.on_sample_finish(0, 0, 150)
+		profile_data.finalize()
+		thread_data = profile_data.get_thread(0)
+
+		update_sketch = thread_data.get_function(0).get_duration_sketch()
+		assert_equals(2, update_sketch.get_count())
+		assert_equals(40, update_sketch.get_min_duration())
+		assert_equals(100, update_sketch.get_max_duration())
+		assert_equals(5, thread_data.get_function_duration_sketch(1).get_percentile(50))
+		assert_equals(100, thread_data.get_function_stats().get_function_stats(0).get_percentile_time(99))
+
+	def test_should_merge_sketches_of_restarted_threads(self):
+		profile_data = ProfileData()
+		for thread_id in xrange(3):
+			profile_data.on_thread(thread_id, "worker")
+			profile_data.on_function(thread_id, 0, "job")
+			profile_data.on_samples_batch(['S', 'E'], [thread_id]*2, [0, 0], [thread_id * 100, (thread_id * 100) + 10 + thread_id])
+		profile_data.finalize()
+		profile_data.merge_restarted_threads()
+
+		assert_equals(1, profile_data.get_num_threads())
+		job_sketch = profile_data.get_thread(0).get_function(0).get_duration_sketch()
+		assert_equals(3, job_sketch.get_count())
+		assert_equals(10, job_sketch.get_min_duration())
+		assert_equals(12, job_sketch.get_max_duration())
+
+	def test_should_sketch_durations_in_a_slice(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "update")
+		profile_data.on_samples_batch(['S', 'E', 'S', 'E', 'S', 'E'], [0]*6, [0]*6, [0, 10, 20, 40, 50, 100])
+		profile_data.finalize()
+		thread_slice = profile_data.slice(30, 60).get_thread(0)
+
+		update_sketch = thread_slice.get_function_duration_sketch(0)
+		assert_equals(2, update_sketch.get_count())
+		assert_equals(10, update_sketch.get_min_duration())
+		assert_equals(10, update_sketch.get_max_duration())
+		assert_equals(3, profile_data.get_thread(0).get_function_duration_sketch(0).get_count())
@@ -0,0 +1,173 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from StringIO import StringIO
+
+from profiledata import ProfileData
+from profilecalltree import build_call_tree
+from nose.plugins.skip import SkipTest
+from nose.tools import *
+
+class TestProfileSlice:
+
+	def create_profile_data(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "init")
+		profile_data.on_function(0, 1, "main")
+		profile_data.on_function(0, 2, "update")
+		profile_data.on_function(0, 3, "draw")
+		profile_data.on_event(0, 0, "frame")
+		profile_data.on_counter(0, "my counter")
+
+		# init, main -> (update -> draw, update -> draw), main
+		profile_data.on_samples_batch(['S', 'E', 'S', 'S', 'S', 'E', 'E', 'S', 'S', 'E', 'E', 'E', 'S', 'E'], [0]*14,
+			[0, 0, 1, 2, 3, 3, 2, 2, 3, 3, 2, 1, 1, 1],
+			[0, 5, 10, 15, 20, 40, 50, 60, 70, 80, 90, 100, 110, 120])
+		profile_data.on_event_emits_batch([0]*4, [0]*4, [5, 35, 70, 110])
+		profile_data.on_counter_values_batch([0]*3, [0, 50, 80], [1, 5, 2])
+		profile_data.finalize()
+		return profile_data
+
+	def test_should_include_samples_running_at_start_of_window(self):
+		profile_slice = self.create_profile_data().slice(30, 75)
+		thread_slice = profile_slice.get_thread(0)
+
+		assert_equals(5, thread_slice.get_num_samples())
+		assert_equals(["main", "update", "draw", "update", "draw"], [thread_slice.get_sample_function(index).get_label() for index in xrange(5)])
+		assert_equals([0, 1, 2, 1, 2], [thread_slice.get_sample_call_stack_depth(index) for index in xrange(5)])
+		assert_equals([None, 0, 1, 0, 3], [thread_slice.get_sample_parent_index(index) for index in xrange(5)])
+		assert_equals([1, 3], thread_slice.get_sample_child_indices(0))
+		assert_equals([4], thread_slice.get_sample_child_indices(3))
+		assert_equals(3, thread_slice.get_max_stack_depth())
+
+		samples = thread_slice.get_samples()
+		assert_equals(1, len(samples))
+		assert_equals(2, len(samples[0].get_children()))
+		assert_equals(samples[0], samples[0].get_children()[1].get_parent())
+
+	def test_should_clip_sample_times_to_window(self):
+		profile_slice = self.create_profile_data().slice(30, 75)
+		thread_slice = profile_slice.get_thread(0)
+
+		assert_equals([30, 30, 30, 60, 70], [thread_slice.get_sample_start_time(index) for index in xrange(5)])
+		assert_equals([75, 50, 40, 75, 75], [thread_slice.get_sample_finish_time(index) for index in xrange(5)])
+		assert_equals(45, thread_slice.get_sample_duration(0))
+		assert_equals(30, thread_slice.get_start_time())
+		assert_equals(75, thread_slice.get_finish_time())
+		assert_equals(30, profile_slice.get_start_time())
+		assert_equals(75, profile_slice.get_finish_time())
+
+	def test_should_build_sample_arrays_for_window(self):
+		thread_slice = self.create_profile_data().slice(30, 75).get_thread(0)
+
+		assert_equals([30, 30, 30, 60, 70], list(thread_slice.get_sample_start_times()))
+		assert_equals([75, 50, 40, 75, 75], list(thread_slice.get_sample_finish_times()))
+		assert_equals([1, 2, 3, 2, 3], list(thread_slice.get_sample_function_indices()))
+		assert_equals([-1, 0, 1, 0, 3], list(thread_slice.get_sample_parent_indices()))
+		assert_equals([5, 3, 3, 5, 5], list(thread_slice.get_sample_ends()))
+		assert_equals([0], list(thread_slice.get_depth_sample_indices(0)))
+		assert_equals([1, 3], list(thread_slice.get_depth_sample_indices(1)))
+
+	def test_should_find_samples_in_time_range(self):
+		thread_slice = self.create_profile_data().slice(30, 75).get_thread(0)
+
+		assert_equals([1, 3], thread_slice.get_sample_indices_in_range(1, 0, 1000))
+		assert_equals([3], thread_slice.get_sample_indices_in_range(1, 55, 1000, 0))
+		assert_equals([4], thread_slice.get_sample_indices_in_range(2, 0, 1000, 3))
+		assert_equals([], thread_slice.get_sample_indices_in_range(0, 80, 1000))
+
+	def test_should_collate_stats_for_window(self):
+		thread_slice = self.create_profile_data().slice(30, 75).get_thread(0)
+		thread_stats = thread_slice.get_function_stats()
+
+		assert_equals(45, thread_stats.get_total_time())
+		assert_equals(0, thread_stats.get_function_stats(0).get_call_count())
+		assert_equals(45, thread_stats.get_function_stats(1).get_inclusive_time())
+		assert_equals(10, thread_stats.get_function_stats(1).get_exclusive_time())
+		assert_equals(35, thread_stats.get_function_stats(2).get_inclusive_time())
+		assert_equals(20, thread_stats.get_function_stats(2).get_exclusive_time())
+		assert_equals(15, thread_stats.get_function_stats(3).get_inclusive_time())
+
+	def test_should_export_call_tree_for_window(self):
+		profile_slice = self.create_profile_data().slice(30, 75)
+
+		output = StringIO()
+		build_call_tree(profile_slice).write_folded_stacks(output)
+		assert_equals(["my thread;main 10", "my thread;main;update 20", "my thread;main;update;draw 15"], output.getvalue().splitlines())
+
+	def test_should_include_events_and_counter_values_in_window(self):
+		profile_slice = self.create_profile_data().slice(30, 75)
+		thread_slice = profile_slice.get_thread(0)
+
+		assert_equals([35, 70], [event_sample.get_time() for event_sample in thread_slice.get_event_samples()])
+		assert_equals((1, 2), thread_slice.get_event_sample_index_range(50, 100))
+		assert_equals([35, 70], list(thread_slice.get_event_emit_times(0)))
+		assert_equals(1, thread_slice.get_frames(0).get_num_frames())
+		assert_equals(35, thread_slice.get_frames(0).get_frame_duration(0))
+
+		counter_slice = profile_slice.get_counter(0)
+		assert_equals([30, 50], list(counter_slice.get_sample_times()))
+		assert_equals([1, 5], list(counter_slice.get_sample_values()))
+		assert_equals(5, counter_slice.get_max_value())
+		assert_equals(0, counter_slice.get_min_value())
+
+	def test_should_slice_a_slice(self):
+		profile_slice = self.create_profile_data().slice(30, 75).slice(65, 1000)
+		thread_slice = profile_slice.get_thread(0)
+
+		assert_equals((65, 75), profile_slice.get_window())
+		assert_equals(["main", "update", "draw"], [thread_slice.get_sample_function(index).get_label() for index in xrange(thread_slice.get_num_samples())])
+		assert_equals(65, thread_slice.get_sample_start_time(0))
+
+	def test_should_build_level_of_detail_for_window(self):
+		thread_slice = self.create_profile_data().slice(30, 75).get_thread(0)
+		lod = thread_slice.get_level_of_detail()
+
+		assert_equals(3, lod.get_num_depths())
+		assert_equals([(30, 75)], lod.get_occupied_time_ranges(0, 0, 0, 1000))
+
+	def test_should_measure_utilization_in_window(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_thread(1, "worker")
+		profile_data.on_function(1, 0, "job")
+		profile_data.on_samples_batch(['S', 'E'], [1, 1], [0, 0], [40, 60])
+		profile_data.finalize()
+
+		profile_slice = profile_data.slice(30, 75)
+		utilization = profile_slice.get_utilization()
+		assert_true(utilization is profile_slice.get_utilization())
+		assert_equals(None, profile_slice.get_array_store())
+
+		# main is clipped to the window
+		counter_data = utilization.get_counter_data()
+		assert_equals([30, 40, 60, 75], list(counter_data.get_sample_times()))
+		assert_equals([1, 2, 1, 0], list(counter_data.get_sample_values()))
+		assert_equals(1.0, utilization.get_thread_busy_ratio(0, 30, 75))
+		assert_equals(0.5, utilization.get_thread_busy_ratio(1, 30, 70))
+
+	def test_should_render_utilization_of_window(self):
+		try:
+			import cairo
+			from profilerender import ProfileRender
+		except ImportError:
+			raise SkipTest("cairo is not installed")
+
+		profile_slice = self.create_profile_data().slice(30, 75)
+		render = ProfileRender(profile_slice)
+		render.resize(800, 600)
+		render.set_show_utilization(True)
+		render.render(cairo.Context(cairo.ImageSurface(cairo.FORMAT_RGB24, 800, 600)))
+
+	def test_should_be_empty_outside_of_profile(self):
+		profile_slice = self.create_profile_data().slice(200, 300)
+		thread_slice = profile_slice.get_thread(0)
+
+		assert_equals(0, thread_slice.get_num_samples())
+		assert_equals(0, len(thread_slice.get_samples()))
+		assert_equals(0, thread_slice.get_max_stack_depth())
+		assert_equals(None, thread_slice.get_finish_time())
+		assert_equals(None, profile_slice.get_start_time())
+		assert_equals(0, thread_slice.get_num_event_samples())
@@ -0,0 +1,92 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from nose.tools import *
+
+class TestProfileStats:
+
+	def create_profile_data(self):
+		profile_data = ProfileData()
+		profile_data.on_thread(0, "my thread")
+		profile_data.on_function(0, 0, "function 0")
+		profile_data.on_function(0, 1, "function 1")
+		profile_data.on_function(0, 2, "function 2")
+		return profile_data
+
+	def test_should_collate_inclusive_and_exclusive_time(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_start(0, 1, 10)
+		profile_data.on_sample_finish(0, 1, 30)
+		profile_data.on_sample_start(0, 1, 40)
+		profile_data.on_sample_start(0, 2, 45)
+		profile_data.on_sample_finish(0, 2, 50)
+		profile_data.on_sample_finish(0, 1, 50)
+		profile_data.on_sample_finish(0, 0, 100)
+
+		thread_stats = profile_data.get_thread(0).get_function_stats()
+		assert_equals(100, thread_stats.get_total_time())
+		assert_equals(3, thread_stats.get_num_functions())
+
+		function_stats_0 = thread_stats.get_function_stats(0)
+		assert_equals("function 0", function_stats_0.get_function().get_label())
+		assert_equals(1, function_stats_0.get_call_count())
+		assert_equals(100, function_stats_0.get_inclusive_time())
+		assert_equals(70, function_stats_0.get_exclusive_time())
+
+		function_stats_1 = thread_stats.get_function_stats(1)
+		assert_equals(2, function_stats_1.get_call_count())
+		assert_equals(30, function_stats_1.get_inclusive_time())
+		assert_equals(25, function_stats_1.get_exclusive_time())
+		assert_equals(10, function_stats_1.get_min_time())
+		assert_equals(20, function_stats_1.get_max_time())
+		assert_equals(15.0, function_stats_1.get_mean_time())
+
+		function_stats_2 = thread_stats.get_function_stats(2)
+		assert_equals(1, function_stats_2.get_call_count())
+		assert_equals(5, function_stats_2.get_inclusive_time())
+		assert_equals(5, function_stats_2.get_exclusive_time())
+
+	def test_should_count_recursive_time_once(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_start(0, 0, 10)
+		profile_data.on_sample_start(0, 1, 20)
+		profile_data.on_sample_finish(0, 1, 30)
+		profile_data.on_sample_finish(0, 0, 40)
+		profile_data.on_sample_finish(0, 0, 100)
+
+		function_stats_0 = profile_data.get_thread(0).get_function_stats().get_function_stats(0)
+		assert_equals(2, function_stats_0.get_call_count())
+		assert_equals(130, function_stats_0.get_total_time())
+		assert_equals(100, function_stats_0.get_inclusive_time())
+		assert_equals(90, function_stats_0.get_exclusive_time())
+
+	def test_should_ignore_open_samples(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_start(0, 1, 10)
+		profile_data.on_sample_finish(0, 1, 30)
+
+		thread_stats = profile_data.get_thread(0).get_function_stats()
+		assert_equals(0, thread_stats.get_total_time())
+		assert_equals(0, thread_stats.get_function_stats(0).get_call_count())
+		assert_equals(0, thread_stats.get_function_stats(0).get_exclusive_time())
+		assert_equals(20, thread_stats.get_function_stats(1).get_exclusive_time())
+		assert_equals(["function 1"], [function_stats.get_function().get_label() for function_stats in thread_stats.get_all_function_stats()])
+
+	def test_should_rebuild_when_samples_change(self):
+		profile_data = self.create_profile_data()
+		profile_data.on_sample_start(0, 0, 0)
+		profile_data.on_sample_finish(0, 0, 10)
+		thread_data = profile_data.get_thread(0)
+
+		thread_stats = thread_data.get_function_stats()
+		assert_true(thread_stats is thread_data.get_function_stats())
+
+		profile_data.on_sample_start(0, 0, 20)
+		profile_data.on_sample_finish(0, 0, 25)
+		assert_equals(2, thread_data.get_function_stats().get_function_stats(0).get_call_count())
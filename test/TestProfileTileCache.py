@@ -0,0 +1,71 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from profiletilecache import TileCache, TILE_WIDTH, ZOOM_LEVEL_TOLERANCE
+from nose.tools import *
+
+class TestProfileTileCache:
+
+	def test_should_return_cached_tiles(self):
+		tile_cache = TileCache()
+		tile_cache.add_tile(0, 10.0, 3, 0, "tile", 100)
+
+		assert_equals("tile", tile_cache.get_tile(0, 10.0, 3, 0))
+		assert_equals(None, tile_cache.get_tile(1, 10.0, 3, 0))
+		assert_equals(None, tile_cache.get_tile(0, 20.0, 3, 0))
+		assert_equals(None, tile_cache.get_tile(0, 10.0, 4, 0))
+		assert_equals(None, tile_cache.get_tile(0, 10.0, 3, 1))
+		assert_equals(100, tile_cache.get_num_bytes())
+
+	def test_should_drop_least_recently_used_tiles(self):
+		tile_cache = TileCache(300)
+		for tile_index in xrange(3):
+			tile_cache.add_tile(0, 10.0, tile_index, 0, tile_index, 100)
+		tile_cache.get_tile(0, 10.0, 0, 0)
+		tile_cache.add_tile(1, 10.0, 0, 0, "new", 100)
+
+		assert_equals(3, tile_cache.get_num_tiles())
+		assert_equals(300, tile_cache.get_num_bytes())
+		assert_equals(0, tile_cache.get_tile(0, 10.0, 0, 0))
+		assert_equals(None, tile_cache.get_tile(0, 10.0, 1, 0))
+		assert_equals(2, tile_cache.get_tile(0, 10.0, 2, 0))
+
+	def test_should_keep_a_tile_that_is_larger_than_the_cache(self):
+		tile_cache = TileCache(300)
+		tile_cache.add_tile(0, 10.0, 0, 0, "small", 100)
+		tile_cache.add_tile(0, 10.0, 1, 0, "large", 1000)
+
+		assert_equals(1, tile_cache.get_num_tiles())
+		assert_equals("large", tile_cache.get_tile(0, 10.0, 1, 0))
+
+	def test_should_match_zoom_levels_within_tolerance(self):
+		tile_cache = TileCache()
+		assert_equals(10.0, tile_cache.get_zoom_level(10.0))
+
+		tile_cache.add_tile(0, 10.0, 0, 0, "tile", 100)
+		assert_equals(10.0, tile_cache.get_zoom_level(10.0 * (1 + (ZOOM_LEVEL_TOLERANCE / 2))))
+		assert_equals(11.0, tile_cache.get_zoom_level(11.0))
+
+		tile_cache.clear()
+		assert_equals(0, tile_cache.get_num_bytes())
+		assert_equals(10.5, tile_cache.get_zoom_level(10.5))
+
+	def test_should_invalidate_tiles_after_a_time(self):
+		tile_cache = TileCache()
+		tile_duration = TILE_WIDTH * 10.0
+		for tile_index in xrange(4):
+			tile_cache.add_tile(0, 10.0, tile_index, 0, tile_index, 100)
+		tile_cache.add_tile(0, 10.0, 3, 1, "lower", 100)
+		tile_cache.add_tile(0, 1.0, 0, 0, "zoomed in", 100)
+
+		# tile 1 finishes within a pixel of the time, so it could have drawn a column from the samples after it
+		tile_cache.invalidate_after((2 * tile_duration) + 5.0)
+
+		assert_equals(0, tile_cache.get_tile(0, 10.0, 0, 0))
+		assert_equals(None, tile_cache.get_tile(0, 10.0, 1, 0))
+		assert_equals(None, tile_cache.get_tile(0, 10.0, 3, 0))
+		assert_equals(None, tile_cache.get_tile(0, 10.0, 3, 1))
+		assert_equals("zoomed in", tile_cache.get_tile(0, 1.0, 0, 0))
+		assert_equals(200, tile_cache.get_num_bytes())
@@ -0,0 +1,66 @@
+import nose
+
+import sys
+sys.path.insert(0,'..')
+
+from profiledata import ProfileData
+from profileutilization import ProfileUtilization, UTILIZATION_COUNTER_LABEL
+from nose.tools import *
+
+class TestProfileUtilization:
+
+	def create_profile_data(self):
+		profile_data = ProfileData()
+		for thread_id in xrange(3):
+			profile_data.on_thread(thread_id, "worker %d" % thread_id)
+			profile_data.on_function(thread_id, 0, "job")
+			profile_data.on_function(thread_id, 1, "step")
+
+		# worker 0: [0, 40] with a nested call, and [40, 60] back to back
+		profile_data.on_samples_batch(['S', 'S', 'E', 'E', 'S', 'E'], [0]*6, [0, 1, 1, 0, 0, 0], [0, 10, 20, 40, 40, 60])
+		# worker 1: [20, 50]
+		profile_data.on_samples_batch(['S', 'E'], [1]*2, [0, 0], [20, 50])
+		# worker 2: [30, 35], and a sample that hasn't finished yet
+		profile_data.on_samples_batch(['S', 'E', 'S'], [2]*3, [0, 0, 0], [30, 35, 55])
+		profile_data.finalize()
+		return profile_data
+
+	def test_should_build_step_function_of_active_threads(self):
+		utilization = ProfileUtilization(self.create_profile_data())
+		counter_data = utilization.get_counter_data()
+
+		assert_equals(UTILIZATION_COUNTER_LABEL, counter_data.get_label())
+		assert_equals([0, 20, 30, 35, 50, 60], list(counter_data.get_sample_times()))
+		assert_equals([1, 2, 3, 2, 1, 0], list(counter_data.get_sample_values()))
+		assert_equals(3, counter_data.get_max_value())
+		assert_equals(0, utilization.get_active_threads_at_time(-5))
+		assert_equals(2, utilization.get_active_threads_at_time(40))
+
+	def test_should_summarise_time_at_each_number_of_active_threads(self):
+		utilization = ProfileUtilization(self.create_profile_data())
+
+		assert_equals([0, 30, 25, 5], utilization.get_active_time_histogram())
+		assert_almost_equals((30 + (2 * 25) + (3 * 5)) / 60.0, utilization.get_mean_active_threads())
+
+	def test_should_compute_thread_busy_ratios(self):
+		utilization = ProfileUtilization(self.create_profile_data())
+
+		assert_equals(60, utilization.get_thread_busy_time(0, 0, 60))
+		assert_equals(15, utilization.get_thread_busy_time(1, 35, 100))
+		assert_equals(0, utilization.get_thread_busy_time(2, 36, 100))
+		assert_equals(5, utilization.get_thread_busy_time(2, 0, 100))
+		assert_almost_equals(0.5, utilization.get_thread_busy_ratio(1, 0, 60))
+		assert_equals([0.0, 1.0, 0.5], utilization.get_thread_busy_ratios(1, 0, 60, 3))
+
+	def test_should_rebuild_cached_utilization_when_samples_are_added(self):
+		profile_data = self.create_profile_data()
+		utilization = profile_data.get_utilization()
+		assert_true(utilization is profile_data.get_utilization())
+
+		profile_data.on_sample_finish(2, 0, 70)
+		profile_data.finalize()
+		counter_data = profile_data.get_utilization().get_counter_data()
+
+		assert_false(utilization is profile_data.get_utilization())
+		assert_equals([55, 60, 70], list(counter_data.get_sample_times())[-3:])
+		assert_equals([2, 1, 0], list(counter_data.get_sample_values())[-3:])